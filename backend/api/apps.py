@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
+from foodgram.db import check_connections
 
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        if settings.DB_HEALTH_CHECKS:
+            request_started.connect(check_connections)
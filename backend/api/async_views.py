@@ -0,0 +1,186 @@
+"""Асинхронные представления чтения для профиля asgi.
+
+GET и HEAD списка и карточки рецепта, тегов и ингредиентов проходят
+те же проверки и сериализацию, что и вьюсеты DRF, но запросы к базе
+выполняются в пуле из ASGI_THREADS потоков, а независимые запросы —
+одновременно: COUNT и страница, затем связанные объекты страницы по
+одному запросу на каждую предвыборку. Теги и ингредиенты отдаются из
+кэша или одним запросом, одновременно выполнять в них нечего. Прочие
+методы выполняются синхронными вьюсетами в том же пуле.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.db.models import prefetch_related_objects
+from django.urls import resolve
+from foodgram.db.routers import route_reads
+from rest_framework.generics import get_object_or_404
+
+READ_METHODS = ('GET', 'HEAD')
+
+executor = ThreadPoolExecutor(
+    settings.ASGI_THREADS, thread_name_prefix='asgi'
+)
+
+
+def run(request, alias, func, *args, **kwargs):
+    """Вызов в потоке пула: чтения идут в базу alias, запросы к базе
+    попадают в замеры PerformanceMiddleware, соединение в конце
+    обслуживается так же, как в конце синхронного запроса."""
+    with ExitStack() as stack:
+        stack.callback(close_old_connections)
+        stack.enter_context(route_reads(alias))
+        sample = getattr(request, 'perf_sample', None)
+        if sample is not None:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(sample.record_query)
+                )
+        return func(*args, **kwargs)
+
+
+async def call(request, alias, func, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, partial(run, request, alias, func, *args, **kwargs)
+    )
+
+
+def get_sync_view(request):
+    return resolve(request.path_info, urlconf=settings.ROOT_URLCONF)
+
+
+def call_sync_view(request):
+    match = get_sync_view(request)
+    return match.func(request, *match.args, **match.kwargs)
+
+
+def start(request):
+    """Вьюсет того же адреса в синхронных urls после проверок dispatch:
+    аутентификации, прав, ограничений и выбора рендерера. Второе
+    значение — ответ об ошибке, если проверки не пройдены."""
+    match = get_sync_view(request)
+    view = match.func.cls(**match.func.initkwargs)
+    view.action_map = match.func.actions
+    view.action_map.setdefault('head', view.action_map['get'])
+    for method, action in view.action_map.items():
+        setattr(view, method, getattr(view, action))
+    view.args, view.kwargs = match.args, match.kwargs
+    view.request = view.initialize_request(
+        request, *match.args, **match.kwargs
+    )
+    view.headers = view.default_response_headers
+    # реплика выбирается здесь, а чтения идут в других потоках пула
+    with ExitStack() as view.read_routing:
+        try:
+            view.initial(view.request, *match.args, **match.kwargs)
+        except Exception as exc:
+            return view, finish(view, exc)
+    return view, None
+
+
+def finish(view, response):
+    if isinstance(response, Exception):
+        response = view.handle_exception(response)
+    return view.finalize_response(
+        view.request, response, *view.args, **view.kwargs
+    )
+
+
+def get_queryset(view):
+    return view.filter_queryset(view.get_queryset())
+
+
+async def prefetch(view, objects, lookups):
+    """Связанные объекты: каждая предвыборка отдельным запросом,
+    все одновременно"""
+    for obj in objects:
+        # общий словарь заранее, иначе потоки создадут его одновременно
+        # и один затрёт предвыборку другого
+        obj._prefetched_objects_cache = {}
+    await asyncio.gather(*(
+        call(view.request, view.read_database, prefetch_related_objects,
+             objects, lookup)
+        for lookup in lookups
+    ))
+
+
+async def read_page(view, request):
+    """Страница рецептов: COUNT и страница выбираются одновременно"""
+    alias = view.read_database
+    queryset = await call(request, alias, get_queryset, view)
+    lookups = queryset._prefetch_related_lookups
+    queryset = queryset.prefetch_related(None)
+    paginator = view.paginator
+    page_queryset = paginator.get_page_queryset(queryset, request)
+    if page_queryset is None:
+        page = await call(
+            request, alias, paginator.paginate_queryset, queryset, request
+        )
+    else:
+        queries = [call(request, alias, list, page_queryset)]
+        if paginator.needs_count(request):
+            queries.append(call(request, alias, queryset.count))
+        objects, *count = await asyncio.gather(*queries)
+        page = paginator.set_page(
+            queryset, request, count[0] if count else None, objects
+        )
+    await prefetch(view, page, lookups)
+    return await call(request, alias, view.page_response, page)
+
+
+def get_object(view, queryset):
+    lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+    instance = get_object_or_404(
+        queryset, **{view.lookup_field: view.kwargs[lookup_url_kwarg]}
+    )
+    view.check_object_permissions(view.request, instance)
+    return instance
+
+
+async def read_object(view, request):
+    alias = view.read_database
+    queryset = await call(request, alias, get_queryset, view)
+    instance = await call(
+        request, alias, get_object, view, queryset.prefetch_related(None)
+    )
+    await prefetch(view, [instance], queryset._prefetch_related_lookups)
+    return await call(request, alias, view.object_response, instance)
+
+
+async def read_action(view, request):
+    return await call(
+        request, view.read_database, getattr(view, view.action), request,
+        *view.args, **view.kwargs
+    )
+
+
+def async_read_view(read):
+    """Асинхронное представление: чтение функцией read, остальные
+    методы — синхронным вьюсетом"""
+
+    async def view(request, *args, **kwargs):
+        if request.method not in READ_METHODS:
+            return await call(request, None, call_sync_view, request)
+        viewset, response = await call(request, None, start, request)
+        if response is not None:
+            return response
+        try:
+            response = await read(viewset, viewset.request)
+        except Exception as exc:
+            response = exc
+        return await call(
+            request, viewset.read_database, finish, viewset, response
+        )
+
+    # как у APIView.as_view: CSRF проверяет аутентификация DRF
+    view.csrf_exempt = True
+    return view
+
+
+recipe_list = async_read_view(read_page)
+recipe_detail = async_read_view(read_object)
+reference_view = async_read_view(read_action)
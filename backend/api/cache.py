@@ -0,0 +1,133 @@
+from contextlib import nullcontext
+from hashlib import md5
+from http import HTTPStatus
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from foodgram.db.routers import route_reads
+from recipes.models import Ingredient, Tag
+from recipes.versions import CHANGED_KEY, get_version
+from rest_framework.response import Response
+
+DATA_KEY = 'reference:data:{}'
+
+
+class VersionedCacheMixin:
+    """Миксина кэширования list/retrieve для справочников.
+
+    Ключ кэша и ETag строятся из версий моделей cache_models и адреса
+    запроса, поэтому после изменения данных старые записи просто
+    перестают использоваться. Сразу после изменения данные читаются
+    с основной базы: отставшая реплика закэшировала бы старые данные
+    под новой версией.
+    """
+    cache_models = ()
+
+    def get_etag(self, request):
+        versions = ':'.join(get_version(model) for model in self.cache_models)
+        return md5(
+            f'{versions}:{request.accepted_renderer.format}:'
+            f'{request.get_full_path()}'.encode()
+        ).hexdigest()
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        quoted_etag = quote_etag(etag)
+        if quoted_etag in parse_etags(
+                request.META.get('HTTP_IF_NONE_MATCH', '')):
+            return Response(
+                status=HTTPStatus.NOT_MODIFIED, headers={'ETag': quoted_etag}
+            )
+        key = DATA_KEY.format(etag)
+        data = cache.get(key)
+        if data is None:
+            changed = cache.get_many([
+                CHANGED_KEY.format(model._meta.label_lower)
+                for model in self.cache_models
+            ])
+            with route_reads(None) if changed else nullcontext():
+                response = handler(request, *args, **kwargs)
+            if response.status_code != HTTPStatus.OK:
+                return response
+            data = response.data
+            cache.set(key, data, settings.REFERENCE_CACHE_TIMEOUT)
+        return Response(data, headers={'ETag': quoted_etag})
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class ConditionalRecipeMixin:
+    """Миксина условных GET-запросов для рецептов.
+
+    Валидатор строится по полям уже выбранных объектов страницы (id,
+    время изменения, счётчики, автор и пользовательские флаги) и общему
+    количеству, поэтому страница и count запрашиваются по одному разу,
+    а при совпадении ETag пропускается только сериализация. Last-Modified
+    не отдаётся: счётчики, флаги и состав страницы меняются без
+    updated_at.
+    """
+    validator_fields = (
+        'id', 'updated_at', 'favorites_count', 'cart_count', 'popularity',
+        'is_favorited', 'is_in_shopping_cart', 'is_subscribed',
+        'author__email', 'author__username', 'author__first_name',
+        'author__last_name'
+    )
+
+    def get_validator(self, recipe):
+        values = []
+        for field in self.validator_fields:
+            value = recipe
+            for name in field.split('__'):
+                value = getattr(value, name)
+            values.append(value)
+        return tuple(values)
+
+    def conditional_response(self, count, recipes, render, request):
+        etag = quote_etag(md5(repr((
+            request.get_full_path(),
+            request.accepted_renderer.format,
+            get_version(Tag),
+            get_version(Ingredient),
+            count,
+            [self.get_validator(recipe) for recipe in recipes],
+        )).encode()).hexdigest())
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = render()
+        if response.status_code in (HTTPStatus.OK, HTTPStatus.NOT_MODIFIED):
+            response['ETag'] = etag
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def page_response(self, page):
+        """Ответ со страницей, уже выбранной пагинатором"""
+        return self.conditional_response(
+            self.paginator.get_count(), page,
+            lambda: self.get_paginated_response(
+                self.get_serializer(page, many=True).data
+            ),
+            self.request
+        )
+
+    def object_response(self, instance):
+        return self.conditional_response(
+            1, [instance],
+            lambda: Response(self.get_serializer(instance).data),
+            self.request
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self.page_response(self.paginate_queryset(
+            self.filter_queryset(self.get_queryset())
+        ))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.object_response(self.get_object())
@@ -0,0 +1,54 @@
+from base64 import b64decode
+from binascii import Error as Base64Error
+from uuid import uuid4
+
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+
+BASE64_MARKER = ';base64,'
+
+
+class StreamingBase64ImageField(serializers.ImageField):
+    """Изображение в base64, которое декодируется частями во временный
+    файл, чтобы не держать в памяти несколько копий картинки. Переносы
+    строк и пробелы внутри base64 пропускаются."""
+    chunk_size = 64 * 1024
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.startswith('http'):
+            raise SkipField()
+        if isinstance(data, str) and data.startswith('data:'):
+            data = self.decode(data)
+        return super().to_internal_value(data)
+
+    def decode(self, data):
+        marker = data.find(BASE64_MARKER)
+        if marker == -1:
+            self.fail('invalid')
+        content_type = data[len('data:'):marker]
+        extension = content_type.split('/')[-1]
+        file = TemporaryUploadedFile(
+            f'{uuid4()}.{extension}', content_type, 0, None
+        )
+        rest = ''
+        try:
+            for start in range(marker + len(BASE64_MARKER), len(data),
+                               self.chunk_size):
+                # часть без пробелов; неполная четвёрка символов
+                # переносится в следующую часть
+                chunk = rest + ''.join(
+                    data[start:start + self.chunk_size].split()
+                )
+                end = len(chunk) - len(chunk) % 4
+                file.write(b64decode(chunk[:end], validate=True))
+                rest = chunk[end:]
+            if rest:
+                rest += '=' * (-len(rest) % 4)
+                file.write(b64decode(rest, validate=True))
+        except Base64Error:
+            file.close()
+            self.fail('invalid')
+        file.size = file.tell()
+        file.seek(0)
+        return file
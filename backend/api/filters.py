@@ -4,6 +4,10 @@ from django_filters.rest_framework import CharFilter, FilterSet, filters
 from django_filters.widgets import BooleanWidget
 from recipes.models import Ingredient, Recipe
 
+from .search import search_recipes
+
+POPULAR = 'popular'
+
 
 class TagsMultipleChoiceField(
         MultipleChoiceField):
@@ -22,9 +26,42 @@ class TagsMultipleChoiceField(
                 )
 
 
-class TagsFilter(filters.AllValuesMultipleFilter):
+class IdsMultipleChoiceField(TagsMultipleChoiceField):
+    def validate(self, value):
+        super().validate(value)
+        for val in value:
+            if not val.isdigit():
+                raise ValidationError(
+                    self.error_messages['invalid_choice'],
+                    code='invalid_choice',
+                    params={'value': val},
+                )
+
+
+class MultipleValuesFilter(filters.MultipleChoiceFilter):
+    """Фильтр по нескольким значениям без выборки вариантов из базы"""
     field_class = TagsMultipleChoiceField
 
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('distinct', False)
+        super().__init__(*args, **kwargs)
+
+
+class TagsFilter(MultipleValuesFilter):
+    """Фильтр по слагам тегов через подзапрос, рецепт попадает в выборку
+    один раз, сколько бы тегов из запроса у него ни было."""
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        return qs.filter(pk__in=Recipe.tags.through.objects.filter(
+            tag__slug__in=value
+        ).values('recipe_id'))
+
+
+class AuthorsFilter(MultipleValuesFilter):
+    field_class = IdsMultipleChoiceField
+
 
 class IngredientSearchFilter(FilterSet):
     name = CharFilter(field_name='name', lookup_expr='icontains')
@@ -35,7 +72,7 @@ class IngredientSearchFilter(FilterSet):
 
 
 class RecipeFilter(FilterSet):
-    author = filters.AllValuesMultipleFilter(
+    author = AuthorsFilter(
         field_name='author__id',
         label='Автор'
     )
@@ -47,8 +84,20 @@ class RecipeFilter(FilterSet):
         widget=BooleanWidget(),
         label='В избранных.'
     )
-    tags = TagsFilter(field_name='tags__slug')
+    tags = TagsFilter(field_name='tags__slug', label='Теги')
+    search = CharFilter(method='filter_search', label='Поиск')
+    ordering = filters.ChoiceFilter(
+        choices=((POPULAR, 'По популярности'),),
+        method='filter_ordering',
+        label='Сортировка'
+    )
 
     class Meta:
         model = Recipe
         fields = ['author', 'tags', 'is_in_shopping_cart', 'is_favorited']
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by('-popularity', '-id')
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
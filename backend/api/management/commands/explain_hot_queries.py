@@ -0,0 +1,105 @@
+from api.search import (IngredientIndex, get_trigram_queryset,
+                        uses_trigram_search)
+from api.shopping_cart import get_cart_ingredients
+from api.views import FollowViewSet, RecipeViewSet
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.db.models.query import RawQuerySet
+from recipes.models import Recipe
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+User = get_user_model()
+RECIPE_LISTS = (
+    ('Список рецептов', ''),
+    ('Рецепты по тегам', 'tags=breakfast&tags=lunch&tags=dinner'),
+    ('Рецепты автора', 'author={user}'),
+    ('Избранное', 'is_favorited=1'),
+    ('Корзина', 'is_in_shopping_cart=1'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Вывод планов выполнения основных запросов API.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int,
+            help='id пользователя, от имени которого строятся запросы.'
+        )
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='EXPLAIN ANALYZE, только для PostgreSQL.'
+        )
+
+    def handle(self, *args, **options):
+        user = AnonymousUser()
+        if options['user'] is not None:
+            user = User.objects.filter(pk=options['user']).first()
+            if user is None:
+                raise CommandError('Пользователь не найден.')
+        self.explain_options = {}
+        if options['analyze']:
+            if connection.vendor != 'postgresql':
+                raise CommandError('--analyze доступен только в PostgreSQL.')
+            self.explain_options = {'analyze': True, 'buffers': True}
+        for title, query in RECIPE_LISTS:
+            if '{user}' in query and user.is_anonymous:
+                continue
+            queryset = self.recipe_queryset(user, query.format(user=user.pk))
+            self.explain(f'{title}: количество', queryset.order_by())
+            self.explain(title, queryset[:6])
+        recipe = Recipe.objects.order_by('-pud_date').first()
+        if recipe is not None:
+            self.explain(
+                'Рецепт', self.recipe_queryset(user).filter(pk=recipe.pk)
+            )
+        if user.is_authenticated:
+            self.explain_user_queries(user)
+        if uses_trigram_search():
+            self.explain(
+                'Поиск ингредиентов', get_trigram_queryset('сах', 10)
+            )
+        else:
+            self.explain(
+                'Поиск ингредиентов: построение индекса в памяти',
+                IngredientIndex.get_queryset()
+            )
+
+    def explain_user_queries(self, user):
+        follows = FollowViewSet.get_subscriptions_queryset(user)[:6]
+        self.explain('Подписки', follows)
+        author_ids = [follow.author_id for follow in follows]
+        if author_ids:
+            self.explain(
+                'Рецепты авторов в подписках',
+                FollowViewSet.get_author_recipes_queryset(author_ids, limit=3)
+            )
+        self.explain('Список покупок', get_cart_ingredients(user.pk))
+
+    def recipe_queryset(self, user, query=''):
+        request = Request(APIRequestFactory().get(f'/api/recipes/?{query}'))
+        request.user = user
+        view = RecipeViewSet(
+            request=request, action='list', format_kwarg=None, kwargs={}
+        )
+        return view.filter_queryset(view.get_queryset())
+
+    def explain(self, title, queryset):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        if isinstance(queryset, RawQuerySet):
+            self.stdout.write(self.explain_raw(queryset))
+        else:
+            self.stdout.write(queryset.explain(**self.explain_options))
+        self.stdout.write('')
+
+    def explain_raw(self, queryset):
+        prefix = connection.ops.explain_query_prefix(**self.explain_options)
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {queryset.raw_query}', queryset.params)
+            return '\n'.join(
+                ' '.join(str(column) for column in row)
+                for row in cursor.fetchall()
+            )
@@ -1,6 +1,164 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def get_limit(request, param, default=None, maximum=None):
+    """Положительное число из параметра запроса. Как у limit пагинации
+    DRF, неверное значение не ошибка: вместо него берётся default."""
+    try:
+        limit = int(request.query_params[param])
+    except (KeyError, ValueError):
+        return default
+    if limit < 1:
+        return default
+    return limit if maximum is None else min(limit, maximum)
 
 
 class LimitPageNumberPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+    def get_count(self):
+        return self.page.paginator.count
+
+    def needs_count(self, request):
+        return True
+
+    def get_page_queryset(self, queryset, request):
+        """Срез страницы, который можно выбрать одновременно с COUNT;
+        None, если номер страницы без COUNT не проверить (page=last)"""
+        try:
+            number = int(request.query_params.get(self.page_query_param, 1))
+        except (TypeError, ValueError):
+            return None
+        if number < 1:
+            return None
+        page_size = self.get_page_size(request)
+        return queryset[(number - 1) * page_size:number * page_size]
+
+    def set_page(self, queryset, request, count, objects):
+        """Страница по отдельно выбранным количеству и объектам среза
+        get_page_queryset"""
+        paginator = self.django_paginator_class(
+            queryset, self.get_page_size(request)
+        )
+        paginator.count = count
+        page_number = request.query_params.get(self.page_query_param, 1)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            ))
+        self.page.object_list = objects
+        self.request = request
+        return objects
+
+
+class KeysetPagination(BasePagination):
+    """Курсорная пагинация по (дата, id) без OFFSET.
+
+    Включается параметром pagination=cursor или наличием cursor. Следующая
+    страница выбирается условием по дате и id последнего элемента, общее
+    количество считается только по запросу count=true.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    mode = 'cursor'
+    count_query_param = 'count'
+    date_field = 'pud_date'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    @classmethod
+    def is_requested(cls, request):
+        return (
+            request.query_params.get(cls.mode_query_param) == cls.mode
+            or cls.cursor_query_param in request.query_params
+        )
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return page_size if page_size > 0 else self.page_size
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            date, pk = urlsafe_b64decode(
+                cursor.encode()
+            ).decode().rsplit('|', 1)
+            date = parse_datetime(date)
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return date, pk
+
+    def encode_cursor(self, date, pk):
+        return urlsafe_b64encode(f'{date.isoformat()}|{pk}'.encode()).decode()
+
+    def needs_count(self, request):
+        return request.query_params.get(self.count_query_param) == 'true'
+
+    def get_page_queryset(self, queryset, request):
+        queryset = queryset.order_by(f'-{self.date_field}', '-id')
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            date, pk = cursor
+            queryset = queryset.filter(
+                Q(**{f'{self.date_field}__lt': date})
+                | Q(**{self.date_field: date, 'id__lt': pk})
+            )
+        return queryset[:self.get_page_size(request) + 1]
+
+    def set_page(self, queryset, request, count, objects):
+        self.request = request
+        self.count = count
+        page_size = self.get_page_size(request)
+        self.has_next = len(objects) > page_size
+        self.page = objects[:page_size]
+        return self.page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        count = queryset.count() if self.needs_count(request) else None
+        return self.set_page(queryset, request, count, list(
+            self.get_page_queryset(queryset, request)
+        ))
+
+    def get_count(self):
+        return self.count
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.mode_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param,
+            self.encode_cursor(getattr(last, self.date_field), last.id)
+        )
+
+    def get_paginated_response(self, data):
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['previous'] = None
+        response['results'] = data
+        return Response(response)
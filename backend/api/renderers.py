@@ -0,0 +1,37 @@
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import JSONRenderer
+
+
+class ShoppingCartRenderer(JSONRenderer):
+    """Рендерер файла списка покупок.
+
+    Файл отдаётся потоковым ответом из вьюсета, через рендерер проходят
+    только ошибки, они выводятся в JSON.
+    """
+
+
+class ShoppingCartTxtRenderer(ShoppingCartRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class ShoppingCartCsvRenderer(ShoppingCartRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class ShoppingCartPdfRenderer(ShoppingCartRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+
+
+class ShoppingCartContentNegotiation(DefaultContentNegotiation):
+    """Если формат из Accept не поддерживается (например,
+    application/json), файл отдаётся в первом формате, а не 406"""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except NotAcceptable:
+            return renderers[0], renderers[0].media_type
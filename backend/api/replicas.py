@@ -0,0 +1,69 @@
+import random
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from foodgram.db.routers import route_reads
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_COOKIE = 'read_primary'
+PIN_KEY = 'replica:pin:{}'
+
+
+def is_pinned(request):
+    """Клиент недавно писал и должен читать с основной базы"""
+    if request.COOKIES.get(PIN_COOKIE):
+        return True
+    user = request.user
+    return user.is_authenticated and bool(cache.get(PIN_KEY.format(user.id)))
+
+
+def pin(request, response):
+    """Закрепляет клиента за основной базой на DB_REPLICA_PIN_SECONDS.
+    Cookie работает и для анонимных запросов, ключ в кэше — для
+    клиентов, которые не хранят cookie и приходят с токеном."""
+    seconds = settings.DB_REPLICA_PIN_SECONDS
+    response.set_cookie(
+        PIN_COOKIE, '1', max_age=seconds, httponly=True, samesite='Lax'
+    )
+    if request.user.is_authenticated:
+        cache.set(PIN_KEY.format(request.user.id), True, seconds)
+
+
+class ReplicaReadMixin:
+    """Миксина чтения с реплик.
+
+    Безопасные запросы действий replica_actions (все, если None)
+    читают с одной из реплик DATABASE_REPLICAS. После успешной записи
+    клиент закрепляется за основной базой, чтобы видеть свои изменения
+    несмотря на задержку репликации.
+    """
+    replica_actions = None
+
+    def dispatch(self, request, *args, **kwargs):
+        with ExitStack() as self.read_routing:
+            return super().dispatch(request, *args, **kwargs)
+
+    def choose_read_database(self, request):
+        """Реплика для чтений запроса; None — основная база"""
+        if (settings.DATABASE_REPLICAS
+                and request.method in SAFE_METHODS
+                and (self.replica_actions is None
+                     or self.action in self.replica_actions)
+                and not is_pinned(request)):
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.read_database = self.choose_read_database(request)
+        if self.read_database is not None:
+            self.read_routing.enter_context(route_reads(self.read_database))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin(request, response)
+        return response
@@ -0,0 +1,208 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Case, IntegerField, Value, When
+from recipes.models import Ingredient, Recipe
+from recipes.stemmer import stem_words
+from recipes.versions import get_version
+
+RECIPE_FTS_TABLE = 'recipes_recipe_fts'
+SEARCH_CONFIG = 'russian'
+FTS_BATCH_SIZE = 1000
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса.
+
+    Названия хранятся отсортированным массивом: совпадения по началу
+    названия ищутся бинарным поиском, затем добавляются совпадения по
+    вхождению. Индекс строится при первом поиске и перестраивается, когда
+    меняется версия ингредиентов в общем кэше (изменение в любом процессе)
+    или истекает ttl.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = None
+        self._version = None
+        self._built_at = 0
+
+    def is_stale(self, version):
+        return (self._data is None or self._version != version
+                or time.monotonic() - self._built_at > self.ttl)
+
+    @staticmethod
+    def get_queryset():
+        return Ingredient.objects.values('id', 'name', 'measurement_unit')
+
+    def build(self, version=None):
+        rows = self.get_queryset()
+        entries = sorted(
+            ((row['name'].lower(), row) for row in rows),
+            key=lambda entry: entry[0]
+        )
+        data = (
+            [key for key, _ in entries],
+            [row for _, row in entries],
+        )
+        self._data = data
+        self._version = version
+        self._built_at = time.monotonic()
+        return data
+
+    def get_data(self):
+        version = get_version(Ingredient)
+        data = self._data
+        if self.is_stale(version):
+            with self._lock:
+                data = self._data
+                if self.is_stale(version):
+                    data = self.build(version)
+        return data
+
+    def search(self, query, limit):
+        query = query.strip().lower()
+        keys, rows = self.get_data()
+        result = []
+        position = bisect_left(keys, query)
+        while (position < len(keys) and len(result) < limit
+               and keys[position].startswith(query)):
+            result.append(rows[position])
+            position += 1
+        if len(result) < limit:
+            for key, row in zip(keys, rows):
+                if query in key and not key.startswith(query):
+                    result.append(row)
+                    if len(result) == limit:
+                        break
+        return result
+
+
+ingredient_index = IngredientIndex(settings.INGREDIENT_SEARCH_INDEX_TTL)
+
+
+def uses_trigram_search():
+    return (settings.INGREDIENT_SEARCH_TRIGRAM
+            and connection.vendor == 'postgresql')
+
+
+def get_trigram_queryset(query, limit):
+    """Поиск в базе по триграммному индексу"""
+    return Ingredient.objects.filter(name__icontains=query).annotate(
+        rank=Case(
+            When(name__istartswith=query, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField()
+        )
+    ).order_by('rank', 'name')[:limit]
+
+
+def search_ingredients(query, limit):
+    """Поиск ингредиентов: сначала по началу названия, затем по вхождению"""
+    if uses_trigram_search():
+        return get_trigram_queryset(query, limit)
+    return ingredient_index.search(query, limit)
+
+
+def get_recipe_search_vector():
+    """Вектор названия и описания рецепта. Выражение совпадает
+    с GIN-индексом из миграции recipes 0012, иначе индекс не используется."""
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def get_fts_query(query):
+    """Запрос FTS5: основы всех слов запроса; последнее слово может быть
+    недописано и ищется как префикс."""
+    terms = [f'"{word}"' for word in stem_words(query)]
+    if terms:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_recipes(queryset, query):
+    """Рецепты по названию и описанию с учётом морфологии, от более
+    релевантных к менее; совпадение в названии весит больше."""
+    if connection.vendor == 'postgresql':
+        vector = get_recipe_search_vector()
+        search_query = SearchQuery(query, config=SEARCH_CONFIG)
+        return queryset.annotate(
+            search=vector, search_rank=SearchRank(vector, search_query)
+        ).filter(search=search_query).order_by('-search_rank', '-id')
+    fts_query = get_fts_query(query)
+    if not fts_query:
+        return queryset.none()
+    # Ранг только в ORDER BY: FTS5 запрещает bm25 в GROUP BY, который
+    # Django строит для count() по запросу с аннотациями.
+    return queryset.extra(
+        tables=[RECIPE_FTS_TABLE],
+        where=[
+            f'{RECIPE_FTS_TABLE}.rowid = {Recipe._meta.db_table}.id',
+            f'{RECIPE_FTS_TABLE} MATCH %s',
+        ],
+        params=[fts_query],
+        order_by=[
+            f'{RECIPE_FTS_TABLE}.rank', f'-{Recipe._meta.db_table}.id'
+        ],
+    )
+
+
+def get_fts_row(recipe_id, name, text):
+    return (
+        recipe_id, ' '.join(stem_words(name)), ' '.join(stem_words(text))
+    )
+
+
+def index_recipe(recipe, created=False, using=DEFAULT_DB_ALIAS):
+    """Обновляет рецепт в таблице FTS5 (только SQLite)"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        if not created:
+            cursor.execute(
+                f'DELETE FROM {RECIPE_FTS_TABLE} WHERE rowid = %s',
+                [recipe.id]
+            )
+        cursor.execute(
+            f'INSERT INTO {RECIPE_FTS_TABLE} (rowid, name, text) '
+            f'VALUES (%s, %s, %s)',
+            get_fts_row(recipe.id, recipe.name, recipe.text)
+        )
+
+
+def unindex_recipe(recipe_id, using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {RECIPE_FTS_TABLE} WHERE rowid = %s', [recipe_id]
+        )
+
+
+def rebuild_recipe_search():
+    """Заполняет таблицу FTS5 заново, например после bulk_create"""
+    if connection.vendor != 'sqlite':
+        return
+    rows = Recipe.objects.values_list('id', 'name', 'text').iterator()
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {RECIPE_FTS_TABLE}')
+        while True:
+            batch = [get_fts_row(*row) for _, row in zip(
+                range(FTS_BATCH_SIZE), rows
+            )]
+            if not batch:
+                break
+            cursor.executemany(
+                f'INSERT INTO {RECIPE_FTS_TABLE} (rowid, name, text) '
+                f'VALUES (%s, %s, %s)', batch
+            )
@@ -1,20 +1,30 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import F
-from django.shortcuts import get_object_or_404
+from django.db.models import Prefetch, prefetch_related_objects
+from django.urls import reverse
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_base64.fields import Base64ImageField
-from recipes.models import (FavoriteRecipe, Ingredient, IngredientInRecipe,
-                            Recipe, ShoppingCart, Tag)
+from recipes.models import (Ingredient, IngredientInRecipe,
+                            IngredientRecipeIndex, Recipe, RecipeImageVariant,
+                            ShoppingCartIngredient, Tag)
+from recipes.tasks import process_recipe_image
 from rest_framework import serializers
+from rest_framework.exceptions import NotFound
 from rest_framework.validators import UniqueValidator
+from taskqueue.models import Task
 from users.models import Follow
 
+from .fields import StreamingBase64ImageField
+from .paginations import get_limit
+from .shopping_cart import SHOPPING_CART_STREAMS
+
 User = get_user_model()
 
 
 class GetIsSubscribedMixin:
     """Миксина отображения подписки на пользователя"""
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -61,21 +71,84 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+def prefetch_ingredients_amount():
+    """Предвыборка ингредиентов рецепта вместе с количеством"""
+    return Prefetch(
+        'ingredients_amount',
+        queryset=IngredientInRecipe.objects.select_related(
+            'ingredient'
+        ).order_by('ingredient__name')
+    )
+
+
 class GetIngredientsMixin:
     """Миксина для рецептов, получение ингредиентов"""
 
+    def get_ingredient_rows(self, obj):
+        return obj.ingredients_amount.all()
+
     def get_ingredients(self, obj):
-        return obj.ingredients.values(
-            'id', 'name', 'measurement_unit',
-            amount=F('ingredients_amount__amount')
+        return [
+            {
+                'id': item.ingredient.id,
+                'name': item.ingredient.name,
+                'measurement_unit': item.ingredient.measurement_unit,
+                'amount': item.amount,
+            } for item in self.get_ingredient_rows(obj)
+        ]
+
+
+class RecipeImageVariantSerializer(serializers.ModelSerializer):
+    """Сериализатор копий изображения рецепта"""
+    class Meta:
+        model = RecipeImageVariant
+        fields = ('width', 'format', 'image')
+
+
+class RecipeImageMixin:
+    """Миксина для рецептов, ссылка на копию изображения. Копии рецепта
+    выбираются заранее: prefetch_related('image_variants')."""
+
+    def get_image(self, obj):
+        """Копия изображения без метаданных в формате image_format:
+        наименьшая не уже image_width или, без него, самая крупная.
+        Исходная загрузка отдаётся, только пока копии не готовы."""
+        request = self.context.get('request')
+        params = request.query_params if request is not None else {}
+        variant_format = params.get('image_format', RecipeImageVariant.WEBP)
+        variants = [
+            variant for variant in obj.image_variants.all()
+            if variant.format == variant_format
+        ]
+        width = params.get('image_width', '')
+        if width.isdigit():
+            variants = [
+                variant for variant in variants
+                if variant.width >= int(width)
+            ] or variants[-1:]
+        else:
+            variants = variants[-1:]
+        return self.get_image_url(
+            variants[0].image if variants else obj.image
         )
 
+    def get_image_url(self, image):
+        if not image:
+            return None
+        request = self.context.get('request')
+        if request is None:
+            return image.url
+        return request.build_absolute_uri(image.url)
+
 
-class RecipeReadSerializer(GetIngredientsMixin, serializers.ModelSerializer):
+class RecipeReadSerializer(RecipeImageMixin, GetIngredientsMixin,
+                           serializers.ModelSerializer):
     """Сериализатор для чтения рецепта"""
     tags = TagSerializer(many=True)
-    author = CustomUserListSerializer()
+    author = serializers.SerializerMethodField()
     ingredients = serializers.SerializerMethodField()
+    image = serializers.SerializerMethodField()
+    image_variants = RecipeImageVariantSerializer(many=True, read_only=True)
     is_favorited = serializers.BooleanField(default=False)
     is_in_shopping_cart = serializers.BooleanField(default=False)
 
@@ -83,42 +156,87 @@ class RecipeReadSerializer(GetIngredientsMixin, serializers.ModelSerializer):
         model = Recipe
         fields = '__all__'
 
+    def get_author(self, obj):
+        author = obj.author
+        if hasattr(obj, 'is_subscribed'):
+            author.is_subscribed = obj.is_subscribed
+        return CustomUserListSerializer(author, context=self.context).data
 
-class RecipeWriteSerializer(GetIngredientsMixin, serializers.ModelSerializer):
+
+class RecipeCoverageSerializer(RecipeReadSerializer):
+    """Рецепт с долей ингредиентов, которые есть у пользователя"""
+    coverage = serializers.FloatField(read_only=True)
+
+
+class IngredientCoverageQuerySerializer(serializers.Serializer):
+    """Параметры поиска рецептов по имеющимся ингредиентам"""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100
+    )
+    min_coverage = serializers.FloatField(
+        min_value=0, max_value=1, default=0
+    )
+
+
+class IngredientAmountSerializer(serializers.Serializer):
+    """Ингредиент и его количество в записываемом рецепте"""
+    id = serializers.IntegerField(min_value=1, max_value=2 ** 31 - 1)
+    amount = serializers.IntegerField(
+        min_value=1, max_value=32767,
+        error_messages={'min_value': 'Минимальное количество = 1'}
+    )
+
+
+class RecipeWriteSerializer(RecipeImageMixin, GetIngredientsMixin,
+                            serializers.ModelSerializer):
     """Сериализатор для записи рецепта"""
     tags = serializers.PrimaryKeyRelatedField(
         many=True,
         queryset=Tag.objects.all()
     )
     ingredients = serializers.SerializerMethodField()
-    image = Base64ImageField()
+    image = StreamingBase64ImageField()
 
     class Meta:
         model = Recipe
         fields = '__all__'
-        read_only_fields = ('author',)
+        read_only_fields = (
+            'author', 'favorites_count', 'cart_count', 'popularity'
+        )
 
     def validate(self, data):
-        ingredients = self.initial_data['ingredients']
-        ingredient_list = []
-        if not ingredients:
+        if self.instance is None and 'image' not in data:
             raise serializers.ValidationError(
-                'Минимально должен быть 1 ингредиент.'
+                {'image': ['Обязательное поле.']}
+            )
+        if 'ingredients' not in self.initial_data:
+            if self.partial:
+                return data
+            raise serializers.ValidationError(
+                {'ingredients': ['Обязательное поле.']}
             )
-        for item in ingredients:
-            ingredient = get_object_or_404(
-                Ingredient, id=item['id']
+        items = IngredientAmountSerializer(
+            data=self.initial_data.get('ingredients'), many=True
+        )
+        if not items.is_valid():
+            raise serializers.ValidationError({'ingredients': items.errors})
+        if not items.validated_data:
+            raise serializers.ValidationError(
+                'Минимально должен быть 1 ингредиент.'
             )
-            if ingredient in ingredient_list:
+        amounts = {}
+        for item in items.validated_data:
+            if item['id'] in amounts:
                 raise serializers.ValidationError(
                     'Ингредиент не должен повторяться.'
                 )
-            if int(item.get('amount')) < 1:
-                raise serializers.ValidationError(
-                    'Минимальное количество = 1'
-                )
-            ingredient_list.append(ingredient)
-        data['ingredients'] = ingredients
+            amounts[item['id']] = item['amount']
+        self.found_ingredients = Ingredient.objects.in_bulk(amounts)
+        if len(self.found_ingredients) != len(amounts):
+            raise NotFound('Ингредиент не найден.')
+        data['ingredients'] = amounts
         return data
 
     def validate_cooking_time(self, time):
@@ -128,48 +246,142 @@ class RecipeWriteSerializer(GetIngredientsMixin, serializers.ModelSerializer):
             )
         return time
 
-    def add_ingredients_and_tags(self, instance, **validate_data):
-        ingredients = validate_data['ingredients']
-        tags = validate_data['tags']
-        for tag in tags:
-            instance.tags.add(tag)
-
-        IngredientInRecipe.objects.bulk_create([
-            IngredientInRecipe(
-                recipe=instance,
-                ingredient_id=ingredient.get('id'),
-                amount=ingredient.get('amount')
-            ) for ingredient in ingredients
-        ])
-        return instance
-
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = super().create(validated_data)
-        return self.add_ingredients_and_tags(
-            recipe, ingredients=ingredients, tags=tags
+        self.process_image(recipe, validated_data['image'])
+        recipe.tags.set(tags)
+        self.ingredient_rows = IngredientInRecipe.objects.bulk_create(
+            self.build_ingredient_row(recipe, ingredient_id, amount)
+            for ingredient_id, amount in ingredients.items()
+        )
+        return recipe
+
+    def build_ingredient_row(self, recipe, ingredient_id, amount):
+        return IngredientInRecipe(
+            recipe=recipe, ingredient=self.found_ingredients[ingredient_id],
+            amount=amount
         )
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['image'] = self.get_image(instance)
+        return data
+
+    def get_image(self, obj):
+        if 'image' in self.validated_data:
+            # копии новой загрузки ещё не готовы
+            return self.get_image_url(obj.image)
+        return super().get_image(obj)
+
+    def get_ingredient_rows(self, obj):
+        """Строки, записанные при сохранении, без повторной выборки"""
+        rows = getattr(self, 'ingredient_rows', None)
+        if rows is None:
+            prefetch_related_objects([obj], prefetch_ingredients_amount())
+            return super().get_ingredient_rows(obj)
+        return sorted(rows, key=lambda item: item.ingredient.name)
+
+    def update_ingredients(self, instance, ingredients):
+        """Записывает только добавленные, удалённые и изменённые
+        ингредиенты рецепта"""
+        current = {
+            item.ingredient_id: item
+            for item in instance.ingredients_amount.all()
+        }
+        removed = current.keys() - ingredients.keys()
+        added = [
+            self.build_ingredient_row(instance, ingredient_id, amount)
+            for ingredient_id, amount in ingredients.items()
+            if ingredient_id not in current
+        ]
+        changed = []
+        for ingredient_id, item in current.items():
+            amount = ingredients.get(ingredient_id)
+            if amount is not None and item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        self.ingredient_rows = [
+            item for ingredient_id, item in current.items()
+            if ingredient_id not in removed
+        ] + added
+        if not (removed or added or changed):
+            return
+        # списки покупок: старый состав вычитается, новый добавляется
+        cart_user_ids = list(instance.cart.values_list('user_id', flat=True))
+        ShoppingCartIngredient.objects.remove_recipe(instance, cart_user_ids)
+        # индекс рецепта обновляется один раз после удаления и вставки
+        with IngredientRecipeIndex.objects.deferred(
+                [instance.id] if removed or added else ()):
+            if removed:
+                instance.ingredients_amount.filter(
+                    ingredient_id__in=removed
+                ).delete()
+            if added:
+                IngredientInRecipe.objects.bulk_create(added)
+        if changed:
+            IngredientInRecipe.objects.bulk_update(changed, ['amount'])
+        ShoppingCartIngredient.objects.add_recipe(instance, cart_user_ids)
+
     def update(self, instance, validated_data):
-        instance.ingredients.clear()
-        instance.tags.clear()
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        instance = self.add_ingredients_and_tags(
-            instance, ingredients=ingredients, tags=tags)
-        return super().update(instance, validated_data)
+        if 'ingredients' in validated_data:
+            self.update_ingredients(
+                instance, validated_data.pop('ingredients')
+            )
+        if 'tags' in validated_data:
+            instance.tags.set(validated_data.pop('tags'))
+        instance = super().update(instance, validated_data)
+        if 'image' in validated_data:
+            self.process_image(instance, validated_data['image'])
+        return instance
+
+    @staticmethod
+    def process_image(recipe, image):
+        """Закрывает временный файл загрузки и ставит в очередь
+        создание копий изображения."""
+        image.close()
+        process_recipe_image.delay(recipe_id=recipe.id)
 
 
-class RecipeAddingSerializer(serializers.ModelSerializer):
+class RecipeAddingSerializer(RecipeImageMixin, serializers.ModelSerializer):
     """Сериализатор для добавления рецепта в подписки и корзины"""
+    image = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class FollowSerializer(GetIsSubscribedMixin, serializers.ModelSerializer):
+class ShoppingCartFileSerializer(serializers.ModelSerializer):
+    """Сериализатор отложенной сборки файла списка покупок"""
+    format = serializers.ChoiceField(
+        choices=tuple(SHOPPING_CART_STREAMS), write_only=True
+    )
+    file = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Task
+        fields = ('id', 'status', 'format', 'file')
+        read_only_fields = ('id', 'status')
+
+    def get_file(self, obj):
+        result = obj.result_data
+        if obj.status != Task.DONE or not result:
+            return None
+        return self.context['request'].build_absolute_uri(
+            f'{reverse("api:recipes-shopping-cart-file-download")}'
+            f'?id={obj.id}'
+        )
+
+
+class ShoppingCartFileStatusSerializer(serializers.Serializer):
+    """Параметры запроса состояния сборки файла списка покупок"""
+    id = serializers.IntegerField(min_value=1, max_value=2 ** 31 - 1)
+
+
+class FollowSerializer(serializers.ModelSerializer):
     """Сериализатор подписки"""
     id = serializers.ReadOnlyField(source='author.id')
     email = serializers.ReadOnlyField(source='author.email')
@@ -185,103 +397,36 @@ class FollowSerializer(GetIsSubscribedMixin, serializers.ModelSerializer):
         fields = ('id', 'email', 'username', 'first_name', 'last_name',
                   'is_subscribed', 'recipes', 'recipes_count')
 
+    def get_is_subscribed(self, obj):
+        return obj.user_id == self.context.get('request').user.id
+
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        queryset = obj.author.recipes.all()
-        if limit:
-            queryset = queryset[:int(limit)]
-        return RecipeAddingSerializer(queryset, many=True).data
+        author_recipes = self.context.get('author_recipes')
+        if author_recipes is not None:
+            queryset = author_recipes.get(obj.author_id, [])
+        else:
+            limit = get_limit(self.context.get('request'), 'recipes_limit')
+            queryset = obj.author.recipes.prefetch_related(
+                'image_variants'
+            )[:limit]
+        return RecipeAddingSerializer(
+            queryset, many=True, context=self.context
+        ).data
 
     def get_recipes_count(self, obj):
-        return obj.author.recipes.all().count()
-
-
-class CheckSubscribeSerializer(serializers.ModelSerializer):
-    """Сериализатор для проверки подписки"""
-    class Meta:
-        model = Follow
-        fields = ('user', 'author')
-
-    def validate(self, obj):
-        user = obj['user']
-        author = obj['author']
-        subscribed = user.follower.filter(author=author).exists()
-
-        if self.context.get('request').method == 'POST':
-            if user == author:
-                raise serializers.ValidationError(
-                    'Ошибка, на себя подписка не разрешена'
-                )
-            if subscribed:
-                raise serializers.ValidationError(
-                    'Ошибка, вы уже подписались'
-                )
-        if self.context.get('request').method == 'DELETE':
-            if user == author:
-                raise serializers.ValidationError(
-                    'Ошибка, отписка от самого себя не разрешена'
-                )
-            if not subscribed:
-                raise serializers.ValidationError(
-                    {'errors': 'Ошибка, вы уже отписались'}
-                )
-        return obj
-
-
-class CheckFavoriteSerializer(serializers.ModelSerializer):
-    """Сериализатор для проверки избранного"""
-    user = serializers.PrimaryKeyRelatedField(
-        queryset=User.objects.all()
-    )
-    recipe = serializers.PrimaryKeyRelatedField(
-        queryset=Recipe.objects.all()
-    )
-
-    class Meta:
-        model = FavoriteRecipe
-        fields = ('user', 'recipe')
-
-    def validate(self, obj):
-        user = self.context['request'].user
-        recipe = obj['recipe']
-        favorite = user.favorites.filter(recipe=recipe).exists()
-
-        if self.context.get('request').method == 'POST' and favorite:
-            raise serializers.ValidationError(
-                'Этот рецепт уже добавлен в избранном'
-            )
-        if self.context.get('request').method == 'DELETE' and not favorite:
-            raise serializers.ValidationError(
-                'Этот рецепт отсутствует в избранном'
-            )
-        return obj
-
-
-class CheckShoppingCartSerializer(serializers.ModelSerializer):
-    """Сериализатор для проверки корзины"""
-    user = serializers.PrimaryKeyRelatedField(
-        queryset=User.objects.all()
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
+        stats = getattr(obj.author, 'stats', None)
+        return stats.recipes_count if stats else 0
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id для пакетных операций"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_IDS_LIMIT,
     )
-    recipe = serializers.PrimaryKeyRelatedField(
-        queryset=Recipe.objects.all()
-    )
-
-    class Meta:
-        model = ShoppingCart
-        fields = ('user', 'recipe')
 
-    def validate(self, obj):
-        user = self.context['request'].user
-        recipe = obj['recipe']
-        cart = user.cart.filter(recipe=recipe).exists()
-
-        if self.context.get('request').method == 'POST' and cart:
-            raise serializers.ValidationError(
-                'Этот рецепт уже добавлен в корзину'
-            )
-        if self.context.get('request').method == 'DELETE' and not cart:
-            raise serializers.ValidationError(
-                'Этот рецепт отсутствует в корзине'
-            )
-        return obj
+    def validate_ids(self, value):
+        return list(dict.fromkeys(value))
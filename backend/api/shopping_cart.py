@@ -0,0 +1,108 @@
+import csv
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.db.models import Sum
+from recipes.models import ShoppingCartIngredient
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+FILENAME = 'shopping_cart'
+HEADER_FILE_CART = 'Мой список покупок:\n\nНаименование - Кол-во/Ед.изм.\n'
+CSV_HEADER = ('Наименование', 'Кол-во', 'Ед.изм.')
+PDF_TITLE = 'Мой список покупок'
+PDF_FONT_NAME = 'ShoppingCartFont'
+PDF_FONT_SIZE = 12
+PDF_MARGIN = 50
+PDF_LINE_HEIGHT = 18
+CHUNK_SIZE = 8192
+PDF_SPOOL_SIZE = 1024 * 1024
+
+
+class Echo:
+    """Буфер для csv.writer, возвращающий записанную строку"""
+    def write(self, value):
+        return value
+
+
+def get_cart_ingredients(user_id):
+    """Сводный список покупок пользователя по алфавиту"""
+    return ShoppingCartIngredient.objects.filter(user_id=user_id).values(
+        'ingredient__name',
+        'ingredient__measurement_unit'
+    ).order_by('ingredient__name').annotate(total=Sum('amount'))
+
+
+def get_pdf_font():
+    """Шрифт с кириллицей, если он есть в системе"""
+    if PDF_FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return PDF_FONT_NAME
+    if os.path.exists(settings.SHOPPING_CART_PDF_FONT):
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT_NAME, settings.SHOPPING_CART_PDF_FONT)
+        )
+        return PDF_FONT_NAME
+    return 'Helvetica'
+
+
+def stream_txt(ingredients):
+    yield HEADER_FILE_CART
+    for ingredient in ingredients:
+        yield (
+            f'{ingredient["ingredient__name"]} - {ingredient["total"]}/'
+            f'{ingredient["ingredient__measurement_unit"]}\n'
+        )
+
+
+def stream_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['total'],
+            ingredient['ingredient__measurement_unit'],
+        ))
+
+
+def stream_pdf(ingredients):
+    """reportlab пишет документ вместе с таблицей ссылок только в save(),
+    поэтому PDF отдаётся после сборки. Буфер больше PDF_SPOOL_SIZE
+    сбрасывается во временный файл, а не растёт в памяти."""
+    with SpooledTemporaryFile(PDF_SPOOL_SIZE) as buffer:
+        yield from build_pdf(ingredients, buffer)
+
+
+def build_pdf(ingredients, buffer):
+    font = get_pdf_font()
+    _, height = A4
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    pdf.setTitle(PDF_TITLE)
+    pdf.setFont(font, PDF_FONT_SIZE + 4)
+    pdf.drawString(PDF_MARGIN, height - PDF_MARGIN, PDF_TITLE)
+    pdf.setFont(font, PDF_FONT_SIZE)
+    y = height - PDF_MARGIN - 2 * PDF_LINE_HEIGHT
+    for ingredient in ingredients:
+        if y < PDF_MARGIN:
+            pdf.showPage()
+            pdf.setFont(font, PDF_FONT_SIZE)
+            y = height - PDF_MARGIN
+        pdf.drawString(
+            PDF_MARGIN, y,
+            f'• {ingredient["ingredient__name"]} - {ingredient["total"]} '
+            f'{ingredient["ingredient__measurement_unit"]}'
+        )
+        y -= PDF_LINE_HEIGHT
+    pdf.save()
+    buffer.seek(0)
+    yield from iter(lambda: buffer.read(CHUNK_SIZE), b'')
+
+
+SHOPPING_CART_STREAMS = {
+    'txt': stream_txt,
+    'csv': stream_csv,
+    'pdf': stream_pdf,
+}
@@ -0,0 +1,38 @@
+from django.core.files.storage import default_storage
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.versions import bump_version
+from taskqueue.models import Task
+
+from .search import index_recipe, unindex_recipe
+from .tasks import build_shopping_cart_file
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_reference_version(sender, **kwargs):
+    bump_version(sender)
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search(instance, created, using, **kwargs):
+    if created or instance.search_text != getattr(
+            instance, 'saved_search_text', None):
+        index_recipe(instance, created, using)
+        instance.saved_search_text = instance.search_text
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_search(instance, using, **kwargs):
+    unindex_recipe(instance.id, using)
+
+
+@receiver(post_delete, sender=Task)
+def remove_shopping_cart_file(instance, **kwargs):
+    """Файл списка покупок удаляется вместе с задачей"""
+    if (instance.name == build_shopping_cart_file.name
+            and instance.status == Task.DONE and instance.result_data):
+        default_storage.delete(instance.result_data['file'])
@@ -0,0 +1,25 @@
+from tempfile import TemporaryFile
+from uuid import uuid4
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from taskqueue.queue import task
+
+from .shopping_cart import SHOPPING_CART_STREAMS, get_cart_ingredients
+
+SHOPPING_CART_DIR = 'shopping_carts'
+
+
+@task
+def build_shopping_cart_file(user_id, file_format):
+    """Файл списка покупок в хранилище медиа; результат — его имя"""
+    with TemporaryFile() as file:
+        for chunk in SHOPPING_CART_STREAMS[file_format](
+            get_cart_ingredients(user_id).iterator()
+        ):
+            file.write(chunk.encode() if isinstance(chunk, str) else chunk)
+        file.seek(0)
+        name = default_storage.save(
+            f'{SHOPPING_CART_DIR}/{uuid4()}.{file_format}', File(file)
+        )
+    return {'file': name}
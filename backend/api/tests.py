@@ -0,0 +1,1074 @@
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+
+from api.replicas import PIN_COOKIE
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from foodgram.asgi import application
+from recipes.models import (FavoriteRecipe, Ingredient, IngredientInRecipe,
+                            IngredientRecipeIndex, Recipe, RecipeImageVariant,
+                            ShoppingCartIngredient, Tag)
+from recipes.popularity import update_popularity
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+from taskqueue.models import Task
+from taskqueue.queue import claim_tasks, release_stale_tasks, run_task, task
+from users.models import Follow
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+REPLICA = 'replica_test'
+CREATE_QUERIES = 15
+UNCHANGED_UPDATE_QUERIES = 11
+CHANGED_UPDATE_QUERIES = 17
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+)
+
+
+class RecipeQueriesTest(APITestCase):
+    """Число запросов к базе при чтении рецептов не зависит от размера
+    страницы и числа ингредиентов"""
+    PAGE_SIZES = (2, 10)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='reader', email='r@r.ru')
+        cls.token = Token.objects.create(user=cls.user)
+        authors = [
+            User.objects.create(username=f'author{i}', email=f'a{i}@a.ru')
+            for i in range(3)
+        ]
+        tags = [
+            Tag.objects.create(name=f'Тег {i}', color=f'#00000{i}',
+                               slug=f'tag{i}')
+            for i in range(3)
+        ]
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(20)
+        )
+        ingredients = list(Ingredient.objects.all())
+        cls.recipes = []
+        for i in range(12):
+            recipe = Recipe.objects.create(
+                author=authors[i % 3], name=f'Рецепт {i}', text='Текст',
+                cooking_time=10
+            )
+            recipe.tags.set(tags[:i % 3 + 1])
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(recipe=recipe, ingredient=ingredient,
+                                   amount=1)
+                for ingredient in ingredients[:i + 1]
+            )
+            cls.recipes.append(recipe)
+
+    def authenticate(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def assert_list_queries(self, queries, url):
+        for page_size in self.PAGE_SIZES:
+            with self.subTest(page_size=page_size):
+                with self.assertNumQueries(queries):
+                    response = self.client.get(f'{url}&limit={page_size}')
+                self.assertEqual(len(response.data['results']), page_size)
+
+    def test_list_anonymous(self):
+        # COUNT, страница, теги, копии изображений, ингредиенты
+        self.assert_list_queries(5, '/api/recipes/?page=1')
+
+    def test_list_authenticated(self):
+        # и токен; флаги пользователя считаются в запросе страницы
+        self.authenticate()
+        self.assert_list_queries(6, '/api/recipes/?page=1')
+
+    def test_list_cursor(self):
+        # курсорная пагинация без COUNT
+        self.authenticate()
+        self.assert_list_queries(5, '/api/recipes/?pagination=cursor')
+
+    def test_detail(self):
+        self.authenticate()
+        for recipe in (self.recipes[0], self.recipes[-1]):
+            with self.subTest(ingredients=recipe.ingredients.count()):
+                with self.assertNumQueries(5):
+                    response = self.client.get(f'/api/recipes/{recipe.id}/')
+                self.assertEqual(
+                    len(response.data['ingredients']),
+                    recipe.ingredients.count()
+                )
+
+
+class SubscriptionQueriesTest(APITestCase):
+    """Рецепты авторов в подписках выбираются одним запросом, не более
+    recipes_limit на автора"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='reader', email='r@r.ru')
+        cls.token = Token.objects.create(user=cls.user)
+        for i in range(4):
+            author = User.objects.create(
+                username=f'author{i}', email=f'a{i}@a.ru'
+            )
+            Follow.objects.create(user=cls.user, author=author)
+            for j in range(i + 1):
+                Recipe.objects.create(
+                    author=author, name=f'Рецепт {i}.{j}', text='Текст',
+                    cooking_time=10
+                )
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def test_recipes_limit(self):
+        for limit, expected in (('2', 2), ('', 4), ('abc', 4), ('0', 4)):
+            with self.subTest(recipes_limit=limit):
+                # токен, COUNT, страница, рецепты авторов, копии
+                # изображений
+                with self.assertNumQueries(5):
+                    response = self.client.get(
+                        '/api/users/subscriptions/',
+                        {'recipes_limit': limit}
+                    )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), 4)
+                for author in response.data['results']:
+                    created = Recipe.objects.filter(
+                        author_id=author['id']
+                    ).count()
+                    self.assertEqual(
+                        len(author['recipes']), min(created, expected)
+                    )
+
+
+class RecipeListTest(APITestCase):
+    """Курсорная пагинация, фильтр по тегам, поиск, сортировка по
+    популярности и добавление в избранное и корзину"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='reader', email='r@r.ru')
+        cls.token = Token.objects.create(user=cls.user)
+        tags = [
+            Tag.objects.create(name=f'Тег {i}', color=f'#00000{i}',
+                               slug=f'tag{i}')
+            for i in range(3)
+        ]
+        cls.recipes = []
+        for name, text in (
+            ('Блины с творогом', 'Тонкие блины'),
+            ('Сырники', 'Сырники из творога'),
+            ('Запечённая курица', 'Курица с овощами'),
+            ('Суп', 'Суп с курицей'),
+            ('Салат', 'Овощи'),
+        ):
+            recipe = Recipe.objects.create(
+                author=cls.user, name=name, text=text, cooking_time=10
+            )
+            recipe.tags.set(tags)
+            cls.recipes.append(recipe)
+        # одинаковая дата у двух рецептов: порядок внутри неё по id
+        date = timezone.now()
+        for days, recipe in zip((0, 1, 1, 2, 3), cls.recipes):
+            Recipe.objects.filter(pk=recipe.pk).update(
+                pud_date=date - timedelta(days=days)
+            )
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def get_ids(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_cursor_pages(self):
+        url = '/api/recipes/?pagination=cursor&limit=2'
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(
+            ids, [recipe.id for recipe in Recipe.objects.order_by(
+                '-pud_date', '-id'
+            )]
+        )
+        response = self.client.get(
+            '/api/recipes/?pagination=cursor&count=true'
+        )
+        self.assertEqual(response.data['count'], len(self.recipes))
+
+    def test_invalid_cursor(self):
+        for cursor in ('мусор', 'bm90LWEtZGF0ZXwx', 'MjAyMi0wMS0wMXx4'):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(f'/api/recipes/?cursor={cursor}')
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.data['detail'], 'Неверный курсор.')
+
+    def test_tags_without_duplicates(self):
+        ids = self.get_ids(
+            '/api/recipes/?tags=tag0&tags=tag1&tags=tag2&limit=10'
+        )
+        self.assertCountEqual(ids, [recipe.id for recipe in self.recipes])
+        response = self.client.get('/api/recipes/?tags=tag0&tags=tag1')
+        self.assertEqual(response.data['count'], len(self.recipes))
+
+    def test_search_stemmed(self):
+        blini, syrniki, chicken, soup, _ = (
+            recipe.id for recipe in self.recipes
+        )
+        # совпадение в названии выше совпадения в описании
+        self.assertEqual(self.get_ids('/api/recipes/?search=творог'),
+                         [blini, syrniki])
+        self.assertEqual(self.get_ids('/api/recipes/?search=курицу'),
+                         [chicken, soup])
+        self.assertEqual(self.get_ids('/api/recipes/?search=блин'), [blini])
+        self.assertEqual(self.get_ids('/api/recipes/?search=пицца'), [])
+
+    def test_ordering_popular(self):
+        first, second, third = self.recipes[2:]
+        self.client.post(f'/api/recipes/{first.id}/favorite/')
+        self.client.post(f'/api/recipes/{first.id}/shopping_cart/')
+        self.client.post(f'/api/recipes/{second.id}/shopping_cart/')
+        self.client.post(f'/api/recipes/{third.id}/favorite/')
+        update_popularity()
+        ids = self.get_ids('/api/recipes/?ordering=popular&limit=3')
+        self.assertEqual(ids, [first.id, second.id, third.id])
+        response = self.client.get('/api/recipes/?ordering=name')
+        self.assertEqual(response.status_code, 400)
+
+    def test_toggle_exists_and_counters(self):
+        recipe = self.recipes[0]
+        for action, counter, exists, missing in (
+            ('favorite', 'favorites_count',
+             'Этот рецепт уже добавлен в избранном',
+             'Этот рецепт отсутствует в избранном'),
+            ('shopping_cart', 'cart_count',
+             'Этот рецепт уже добавлен в корзину',
+             'Этот рецепт отсутствует в корзине'),
+        ):
+            with self.subTest(action=action):
+                url = f'/api/recipes/{recipe.id}/{action}/'
+                self.assertEqual(self.client.post(url).status_code, 201)
+                response = self.client.post(url)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data['non_field_errors'], [exists])
+                recipe.refresh_from_db()
+                self.assertEqual(getattr(recipe, counter), 1)
+                # счётчик, разошедшийся со строками, не уходит ниже нуля
+                Recipe.objects.filter(pk=recipe.pk).update(**{counter: 0})
+                self.assertEqual(self.client.delete(url).status_code, 204)
+                response = self.client.delete(url)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data['non_field_errors'], [missing])
+                recipe.refresh_from_db()
+                self.assertEqual(getattr(recipe, counter), 0)
+
+
+class RecipeImageUrlTest(APITestCase):
+    """Короткие карточки рецептов ссылаются на копию изображения без
+    метаданных, а не на исходную загрузку"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='reader', email='r@r.ru')
+        cls.token = Token.objects.create(user=cls.user)
+        author = User.objects.create(username='author', email='a@a.ru')
+        Follow.objects.create(user=cls.user, author=author)
+        cls.recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Текст', cooking_time=10,
+            image='image_recipes/original.png'
+        )
+        RecipeImageVariant.objects.create(
+            recipe=cls.recipe, width=320, format=RecipeImageVariant.WEBP,
+            image='image_recipes/variants/original_320.webp'
+        )
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def test_variant_urls(self):
+        response = self.client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.data['image'].endswith('original_320.webp'))
+        response = self.client.get('/api/users/subscriptions/')
+        recipe = response.data['results'][0]['recipes'][0]
+        self.assertTrue(recipe['image'].startswith('http://testserver/'))
+        self.assertTrue(recipe['image'].endswith('original_320.webp'))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class RecipeWriteQueriesTest(APITestCase):
+    """Число запросов при записи рецепта не зависит от числа
+    ингредиентов, а неизменённые ингредиенты не перезаписываются"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='author', email='a@a.ru')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.tag = Tag.objects.create(name='Тег', color='#000000', slug='tag')
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(60)
+        )
+        cls.ingredient_ids = list(
+            Ingredient.objects.values_list('id', flat=True)
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def get_data(self, ingredient_ids, amount=1):
+        return {
+            'name': 'Рецепт',
+            'text': 'Текст',
+            'cooking_time': 10,
+            'tags': [self.tag.id],
+            'ingredients': [
+                {'id': ingredient_id, 'amount': amount}
+                for ingredient_id in ingredient_ids
+            ],
+        }
+
+    def test_create_and_update(self):
+        for count in (5, 50):
+            with self.subTest(ingredients=count):
+                ingredient_ids = self.ingredient_ids[:count]
+                with self.assertNumQueries(CREATE_QUERIES):
+                    response = self.client.post(
+                        '/api/recipes/',
+                        {**self.get_data(ingredient_ids), 'image': IMAGE},
+                        format='json'
+                    )
+                self.assertEqual(response.status_code, 201)
+                url = f'/api/recipes/{response.data["id"]}/'
+                with self.assertNumQueries(UNCHANGED_UPDATE_QUERIES):
+                    response = self.client.patch(
+                        url, self.get_data(ingredient_ids), format='json'
+                    )
+                self.assertEqual(response.status_code, 200)
+                # один удалён, один добавлен, у остальных новое количество
+                changed_ids = self.ingredient_ids[1:count + 1]
+                with self.assertNumQueries(CHANGED_UPDATE_QUERIES):
+                    response = self.client.patch(
+                        url, self.get_data(changed_ids, amount=2),
+                        format='json'
+                    )
+                self.assertEqual(response.status_code, 200)
+                self.assertCountEqual(
+                    [item['id'] for item in response.data['ingredients']],
+                    changed_ids
+                )
+
+    def test_invalid_ingredients(self):
+        ingredient_id = self.ingredient_ids[0]
+        for ingredients in (
+            'abc', [], [5], [{'id': 'x', 'amount': 1}],
+            [{'id': ingredient_id}], [{'id': ingredient_id, 'amount': 'a'}],
+            [{'id': ingredient_id, 'amount': 0}],
+            [{'id': ingredient_id, 'amount': 1}] * 2,
+        ):
+            with self.subTest(ingredients=ingredients):
+                response = self.client.post(
+                    '/api/recipes/',
+                    {**self.get_data([]), 'ingredients': ingredients,
+                     'image': IMAGE},
+                    format='json'
+                )
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Recipe.objects.exists())
+
+
+class ShoppingCartDownloadTest(APITestCase):
+    """Формат файла списка покупок выбирается по Accept, неизвестный
+    формат получает txt"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='buyer', email='b@b.ru')
+        cls.token = Token.objects.create(user=cls.user)
+        recipe = Recipe.objects.create(
+            author=cls.user, name='Рецепт', text='Текст', cooking_time=10
+        )
+        ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+        IngredientInRecipe.objects.create(
+            recipe=recipe, ingredient=ingredient, amount=5
+        )
+        cls.recipe = recipe
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        self.client.post(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+
+    def test_formats(self):
+        for accept, content_type in (
+            ('text/plain', 'text/plain'),
+            ('text/csv', 'text/csv'),
+            ('application/pdf', 'application/pdf'),
+            ('application/json', 'text/plain'),
+            ('*/*', 'text/plain'),
+        ):
+            with self.subTest(accept=accept):
+                response = self.client.get(
+                    '/api/recipes/download_shopping_cart/',
+                    HTTP_ACCEPT=accept
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], content_type)
+                content = b''.join(response.streaming_content)
+                if content_type == 'application/pdf':
+                    self.assertTrue(content.startswith(b'%PDF'))
+                else:
+                    self.assertIn('Соль', content.decode())
+
+
+class CartIngredientsTest(APITestCase):
+    """Сводные списки покупок меняются вместе с рецептами в корзинах"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author', email='a@a.ru')
+        cls.buyers = [
+            User.objects.create(username=f'buyer{i}', email=f'b{i}@b.ru')
+            for i in range(2)
+        ]
+        cls.tag = Tag.objects.create(name='Тег', color='#000000', slug='tag')
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(4)
+        )
+        cls.ingredients = list(Ingredient.objects.order_by('id'))
+        cls.recipe, cls.other = (
+            Recipe.objects.create(
+                author=cls.author, name=name, text='Текст', cooking_time=10
+            ) for name in ('Рецепт', 'Другой')
+        )
+        for recipe in (cls.recipe, cls.other):
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=3
+                ) for ingredient in cls.ingredients[:2]
+            )
+
+    def setUp(self):
+        for buyer in self.buyers:
+            self.client.force_authenticate(buyer)
+            for recipe in (self.recipe, self.other):
+                self.client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        self.client.force_authenticate(self.author)
+
+    def assert_cart_ingredients(self):
+        self.assertEqual(
+            {
+                (item.user_id, item.ingredient_id): item.amount
+                for item in ShoppingCartIngredient.objects.all()
+            },
+            ShoppingCartIngredient.objects.calculate()
+        )
+
+    def test_update_and_delete(self):
+        self.assert_cart_ingredients()
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.id}/',
+            {
+                'tags': [self.tag.id],
+                'ingredients': [
+                    {'id': self.ingredients[1].id, 'amount': 5},
+                    {'id': self.ingredients[2].id, 'amount': 2},
+                ],
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_cart_ingredients()
+        response = self.client.delete(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_cart_ingredients()
+
+
+class BulkTest(APITestCase):
+    """Пакетные операции: результат по каждому id, счётчики рецептов
+    и списки покупок, ограничение длины списка"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='reader', email='r@r.ru')
+        cls.author = User.objects.create(username='author', email='a@a.ru')
+        ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {i}', text='Текст',
+                cooking_time=10
+            ) for i in range(3)
+        ]
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe=recipe, ingredient=ingredient, amount=2)
+            for recipe in cls.recipes
+        )
+        cls.missing_id = cls.recipes[-1].id + 100
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def get_results(self, method, url, ids):
+        response = getattr(self.client, method)(
+            url, {'ids': ids}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return {
+            result['id']: (result['status'], result.get('errors'))
+            for result in response.data['results']
+        }
+
+    def assert_counters(self, field, expected):
+        self.assertEqual(
+            list(Recipe.objects.filter(
+                id__in=[recipe.id for recipe in self.recipes]
+            ).order_by('id').values_list(field, flat=True)),
+            expected
+        )
+
+    def assert_cart_ingredients(self):
+        self.assertEqual(
+            {
+                (item.user_id, item.ingredient_id): item.amount
+                for item in ShoppingCartIngredient.objects.all()
+            },
+            ShoppingCartIngredient.objects.calculate()
+        )
+
+    def test_favorite(self):
+        first, second, third = (recipe.id for recipe in self.recipes)
+        self.client.post(f'/api/recipes/{first}/favorite/')
+        results = self.get_results(
+            'post', '/api/recipes/favorite/',
+            [first, second, self.missing_id, second]
+        )
+        self.assertEqual(results, {
+            first: ('exists', 'Этот рецепт уже добавлен в избранном'),
+            second: ('added', None),
+            self.missing_id: ('not_found', 'Рецепт не найден'),
+        })
+        self.assert_counters('favorites_count', [1, 1, 0])
+        results = self.get_results(
+            'delete', '/api/recipes/favorite/', [first, third]
+        )
+        self.assertEqual(results, {
+            first: ('deleted', None),
+            third: ('missing', 'Этот рецепт отсутствует в избранном'),
+        })
+        self.assert_counters('favorites_count', [0, 1, 0])
+
+    def test_shopping_cart(self):
+        ids = [recipe.id for recipe in self.recipes]
+        self.client.post(f'/api/recipes/{ids[0]}/shopping_cart/')
+        self.get_results('post', '/api/recipes/shopping_cart/', ids)
+        self.assert_counters('cart_count', [1, 1, 1])
+        self.assert_cart_ingredients()
+        self.assertEqual(
+            ShoppingCartIngredient.objects.get(user=self.user).amount, 6
+        )
+        self.get_results('delete', '/api/recipes/shopping_cart/', ids[:2])
+        self.assert_counters('cart_count', [0, 0, 1])
+        self.assert_cart_ingredients()
+
+    def test_subscribe(self):
+        missing_id = self.author.id + 100
+        results = self.get_results(
+            'post', '/api/users/subscribe/',
+            [self.author.id, self.user.id, missing_id]
+        )
+        self.assertEqual(results, {
+            self.author.id: ('added', None),
+            self.user.id: ('self', 'Ошибка, на себя подписка не разрешена'),
+            missing_id: ('not_found', 'Автор не найден'),
+        })
+        results = self.get_results(
+            'delete', '/api/users/subscribe/', [self.author.id, missing_id]
+        )
+        self.assertEqual(results, {
+            self.author.id: ('deleted', None),
+            missing_id: ('missing', 'Ошибка, вы уже отписались'),
+        })
+        self.assertFalse(Follow.objects.exists())
+
+    def test_ids_limit(self):
+        ids = list(range(1, settings.BULK_IDS_LIMIT + 2))
+        response = self.client.post(
+            '/api/recipes/favorite/', {'ids': ids}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ids', response.data)
+        results = self.get_results(
+            'post', '/api/recipes/favorite/', ids[:-1]
+        )
+        self.assertEqual(len(results), settings.BULK_IDS_LIMIT)
+
+
+@task(max_attempts=3)
+def failing_task():
+    raise ValueError('Ошибка задачи')
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, TASKS_RETRY_DELAY=10, TASKS_KEEP_DAYS=7
+)
+class TaskQueueTest(APITestCase):
+    """Повтор упавших задач с растущей задержкой, возврат зависших
+    задач в очередь, очистка старых задач и выдача файла владельцу"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='buyer', email='b@b.ru')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.other = User.objects.create(username='other', email='o@o.ru')
+        recipe = Recipe.objects.create(
+            author=cls.user, name='Рецепт', text='Текст', cooking_time=10
+        )
+        ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+        IngredientInRecipe.objects.create(
+            recipe=recipe, ingredient=ingredient, amount=5
+        )
+        cls.recipe = recipe
+
+    def run_claimed(self):
+        (task_id,) = claim_tasks(1)
+        task = Task.objects.get(pk=task_id)
+        run_task(task)
+        return task
+
+    def test_retry_backoff(self):
+        task = failing_task.delay()
+        for attempt, delay in ((1, 10), (2, 20)):
+            start = timezone.now()
+            with self.assertLogs('taskqueue.queue', 'ERROR'):
+                task = self.run_claimed()
+            self.assertEqual(task.status, Task.PENDING)
+            self.assertEqual(task.attempts, attempt)
+            self.assertIn('Ошибка задачи', task.error)
+            self.assertGreaterEqual(
+                task.run_at, start + timedelta(seconds=delay)
+            )
+            self.assertLessEqual(
+                task.run_at, timezone.now() + timedelta(seconds=delay)
+            )
+            self.assertEqual(claim_tasks(1), [])
+            Task.objects.filter(pk=task.pk).update(run_at=timezone.now())
+        with self.assertLogs('taskqueue.queue', 'ERROR'):
+            task = self.run_claimed()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertEqual(claim_tasks(1), [])
+
+    def test_stale_lock_requeue(self):
+        task = failing_task.delay()
+        self.assertEqual(claim_tasks(1), [task.id])
+        release_stale_tasks()
+        self.assertEqual(Task.objects.get(pk=task.pk).status, Task.RUNNING)
+        locked_at = timezone.now() - timedelta(
+            seconds=settings.TASKS_LOCK_TIMEOUT + 1
+        )
+        Task.objects.filter(pk=task.pk).update(locked_at=locked_at)
+        release_stale_tasks()
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.PENDING)
+        self.assertEqual(task.attempts, 1)
+        Task.objects.filter(pk=task.pk).update(
+            status=Task.RUNNING, attempts=3, locked_at=locked_at
+        )
+        release_stale_tasks()
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertEqual(task.error, 'Превышено время выполнения.')
+
+    @override_settings(TASKS_EAGER=True)
+    def test_file_download(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        self.client.post(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+        response = self.client.post(
+            '/api/recipes/shopping_cart_file/', {'format': 'txt'}
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], Task.DONE)
+        url = response.data['file']
+        self.assertIn('/api/recipes/shopping_cart_file/download/', url)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Соль', b''.join(response.streaming_content).decode())
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_authenticate(None)
+        self.client.credentials()
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+    @override_settings(TASKS_EAGER=True)
+    def test_purge_old_tasks(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        response = self.client.post(
+            '/api/recipes/shopping_cart_file/', {'format': 'txt'}
+        )
+        done = Task.objects.get(pk=response.data['id'])
+        name = done.result_data['file']
+        self.assertTrue(default_storage.exists(name))
+        failed = Task.objects.create(
+            name=failing_task.name, status=Task.FAILED, run_at=timezone.now()
+        )
+        pending = Task.objects.create(
+            name=failing_task.name, run_at=timezone.now() + timedelta(days=1)
+        )
+        release_stale_tasks()
+        self.assertEqual(Task.objects.count(), 3)
+        Task.objects.update(run_at=timezone.now() - timedelta(days=8))
+        release_stale_tasks()
+        self.assertEqual(
+            list(Task.objects.values_list('id', flat=True)), [pending.id]
+        )
+        self.assertFalse(Task.objects.filter(pk=failed.pk).exists())
+        self.assertFalse(default_storage.exists(name))
+
+
+class MetricsTest(APITestCase):
+    """/metrics без METRICS_TOKEN открыт только при DEBUG"""
+
+    def test_access(self):
+        for debug, token, header, status in (
+            (False, '', '', 403),
+            (True, '', '', 200),
+            (False, 'secret', '', 401),
+            (False, 'secret', 'Bearer wrong', 401),
+            (False, 'secret', 'Bearer secret', 200),
+        ):
+            with self.subTest(debug=debug, token=token, header=header):
+                with self.settings(DEBUG=debug, METRICS_TOKEN=token):
+                    response = self.client.get(
+                        '/metrics', HTTP_AUTHORIZATION=header
+                    )
+                self.assertEqual(response.status_code, status)
+
+
+class CacheTest(APITestCase):
+    """Кэш справочников и условные запросы рецептов: повторный ответ
+    из кэша или 304, после изменения данных — новый ответ"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='reader', email='r@r.ru')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='Рецепт', text='Текст', cooking_time=10
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_reference_cache(self):
+        Tag.objects.create(name='Тег', color='#000000', slug='tag')
+        response = self.client.get('/api/tags/')
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/tags/').data,
+                             response.data)
+            response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # bulk_create в load_tags без сигналов, версию меняет команда
+        call_command('load_tags')
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.data), Tag.objects.count())
+
+    def test_reference_cache_invalidated_by_save(self):
+        ingredient = Ingredient.objects.create(name='Соль',
+                                               measurement_unit='г')
+        self.client.get('/api/ingredients/')
+        ingredient.name = 'Сахар'
+        ingredient.save()
+        response = self.client.get('/api/ingredients/')
+        self.assertEqual(response.data[0]['name'], 'Сахар')
+
+    def test_recipe_etag(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        for url in ('/api/recipes/', f'/api/recipes/{self.recipe.id}/'):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+                self.client.delete(
+                    f'/api/recipes/{self.recipe.id}/favorite/'
+                )
+
+
+class IngredientIndexTest(APITestCase):
+    """Обратный индекс ингредиентов обновляется при любой записи через
+    ORM, доли и страница считаются в базе"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='cook', email='c@c.ru')
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(4)
+        )
+        cls.ingredients = list(Ingredient.objects.all())
+        cls.recipes = [
+            Recipe.objects.create(author=cls.user, name=f'Рецепт {i}',
+                                  text='Текст', cooking_time=10)
+            for i in range(3)
+        ]
+        # рецепт i из первых i + 2 ингредиентов
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe=recipe, ingredient=ingredient)
+            for i, recipe in enumerate(cls.recipes)
+            for ingredient in cls.ingredients[:i + 2]
+        )
+
+    def assert_index(self):
+        expected = set()
+        for recipe in Recipe.objects.all():
+            ingredient_ids = list(
+                recipe.ingredients_amount.values_list('ingredient_id',
+                                                      flat=True)
+            )
+            expected |= {
+                (ingredient_id, recipe.id, len(ingredient_ids))
+                for ingredient_id in ingredient_ids
+            }
+        self.assertEqual(set(IngredientRecipeIndex.objects.values_list(
+            'ingredient_id', 'recipe_id', 'size'
+        )), expected)
+
+    def test_index_follows_writes(self):
+        self.assert_index()
+        recipe = self.recipes[0]
+        item = IngredientInRecipe(recipe=recipe,
+                                  ingredient=self.ingredients[3])
+        item.save()
+        self.assert_index()
+        item.delete()
+        self.assert_index()
+        IngredientInRecipe.objects.filter(
+            recipe=self.recipes[2], ingredient=self.ingredients[0]
+        ).delete()
+        self.assert_index()
+        IngredientInRecipe.objects.filter(
+            recipe=self.recipes[1], ingredient=self.ingredients[2]
+        ).update(recipe=recipe)
+        self.assert_index()
+
+    def test_ranking_and_pages(self):
+        first, second = self.ingredients[:2]
+        url = (f'/api/recipes/by_ingredients/?ingredients={first.id}'
+               f'&ingredients={second.id}')
+        response = self.client.get(f'{url}&limit=2&page=2')
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(
+            [(recipe['id'], recipe['coverage'])
+             for recipe in response.data['results']],
+            [(self.recipes[2].id, 0.5)]
+        )
+        response = self.client.get(f'{url}&min_coverage=0.6')
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [self.recipes[0].id, self.recipes[1].id]
+        )
+
+
+class AsyncViewsTest(TransactionTestCase):
+    """Асинхронные представления профиля asgi отвечают так же, как
+    вьюсеты DRF. Запросы к базе идут из потоков пула, поэтому данные
+    должны быть закоммичены."""
+    PATHS = (
+        '/api/recipes/',
+        '/api/recipes/?page=2&limit=2',
+        '/api/recipes/?page=last&limit=2',
+        '/api/recipes/?page=9',
+        '/api/recipes/?pagination=cursor&count=true&limit=2',
+        '/api/recipes/?cursor=invalid',
+        '/api/recipes/?tags=tag0&tags=tag1&is_favorited=1',
+        '/api/recipes/{recipe}/',
+        '/api/recipes/0/',
+        '/api/tags/',
+        '/api/tags/{tag}/',
+        '/api/ingredients/?name=%D0%98%D0%BD',
+    )
+
+    def setUp(self):
+        self.user = User.objects.create(username='reader', email='r@r.ru')
+        self.token = Token.objects.create(user=self.user)
+        self.tag = Tag.objects.create(name='Тег', color='#000000',
+                                      slug='tag0')
+        ingredient = Ingredient.objects.create(name='Ингредиент',
+                                               measurement_unit='г')
+        for i in range(5):
+            self.recipe = Recipe.objects.create(
+                author=self.user, name=f'Рецепт {i}', text='Текст',
+                cooking_time=10
+            )
+            self.recipe.tags.set([self.tag])
+            IngredientInRecipe.objects.create(
+                recipe=self.recipe, ingredient=ingredient, amount=i + 1
+            )
+        self.recipe.favorites.create(user=self.user)
+
+    @async_to_sync
+    async def asgi_get(self, path, headers):
+        path, _, query = path.partition('?')
+        communicator = ApplicationCommunicator(application, {
+            'type': 'http',
+            'method': 'GET',
+            'path': path,
+            'query_string': query.encode(),
+            'headers': [(name.lower().encode(), value.encode())
+                        for name, value in headers.items()],
+        })
+        await communicator.send_input({'type': 'http.request'})
+        start = await communicator.receive_output(5)
+        body = b''
+        while True:
+            message = await communicator.receive_output(5)
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                return start['status'], json.loads(body)
+
+    def test_same_responses(self):
+        headers = {'Host': 'testserver'}
+        client = APIClient()
+        for authenticated in (False, True):
+            if authenticated:
+                headers['Authorization'] = f'Token {self.token}'
+                client.credentials(HTTP_AUTHORIZATION=headers[
+                    'Authorization'
+                ])
+            for path in self.PATHS:
+                path = path.format(recipe=self.recipe.id, tag=self.tag.id)
+                with self.subTest(path=path, authenticated=authenticated):
+                    response = client.get(path)
+                    self.assertEqual(
+                        self.asgi_get(path, headers),
+                        (response.status_code, response.json())
+                    )
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingTest(TransactionTestCase):
+    """Чтения идут в реплику, запись и чтения после записи — в основную
+    базу. Реплика — отдельная база SQLite со своими данными, поэтому по
+    ответу видно, откуда он прочитан."""
+    client_class = APIClient
+
+    @classmethod
+    def setUpClass(cls):
+        # Базы нет в настройках, поэтому test runner её не создаёт:
+        # она создаётся и мигрирует здесь, до включения DATABASE_REPLICAS
+        connections.databases[REPLICA] = {
+            **connections.databases['default'], 'NAME': '', 'TEST': {}
+        }
+        connections[REPLICA].creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        cls.databases = {'default', REPLICA}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].creation.destroy_test_db(
+            connections[REPLICA].settings_dict['NAME'], verbosity=0
+        )
+        del connections.databases[REPLICA]
+
+    def setUp(self):
+        user = recipe = None
+        # в реплике те же id, что в основной базе, но другие названия
+        for alias, name in (('default', 'Основная'), (REPLICA, 'Реплика')):
+            user = User.objects.using(alias).create(
+                id=user and user.id, username='reader', email='r@r.ru'
+            )
+            recipe = Recipe.objects.using(alias).create(
+                id=recipe and recipe.id, author=user, name=name,
+                text='Текст', cooking_time=10
+            )
+            Tag.objects.using(alias).create(
+                name=name, color='#000000', slug='tag'
+            )
+        self.url = f'/api/recipes/{recipe.id}/'
+        self.token = Token.objects.create(user_id=user.id)
+        # в том числе отметку об изменении тегов, созданных выше
+        cache.clear()
+
+    def tearDown(self):
+        # flush очищает только модели, которые роутер мигрирует в базу
+        with self.settings(DATABASE_REPLICAS=[]):
+            call_command(
+                'flush', database=REPLICA, interactive=False, verbosity=0
+            )
+
+    def get_recipe_name(self, client):
+        response = client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.data['name']
+
+    def test_reads_and_writes(self):
+        self.assertEqual(self.get_recipe_name(self.client), 'Реплика')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        self.assertEqual(self.get_recipe_name(self.client), 'Реплика')
+        response = self.client.post(f'{self.url}favorite/')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(FavoriteRecipe.objects.using('default').exists())
+        self.assertFalse(FavoriteRecipe.objects.using(REPLICA).exists())
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_pin_by_cookie(self):
+        self.client.post(f'{self.url}favorite/')
+        self.assertEqual(self.get_recipe_name(self.client), 'Реплика')
+        self.client.cookies[PIN_COOKIE] = '1'
+        self.assertEqual(self.get_recipe_name(self.client), 'Основная')
+
+    def test_pin_by_token_user(self):
+        writer = APIClient()
+        writer.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        writer.post(f'{self.url}favorite/')
+        # другой клиент того же пользователя, без cookie
+        reader = APIClient()
+        reader.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        self.assertEqual(self.get_recipe_name(reader), 'Основная')
+        self.assertEqual(self.get_recipe_name(APIClient()), 'Реплика')
+
+    def test_reference_changed_reads_primary(self):
+        response = self.client.get('/api/tags/')
+        self.assertEqual([tag['name'] for tag in response.data], ['Реплика'])
+        Tag.objects.create(name='Новый', color='#111111', slug='new')
+        response = self.client.get('/api/tags/')
+        self.assertCountEqual(
+            [tag['name'] for tag in response.data], ['Новый', 'Основная']
+        )
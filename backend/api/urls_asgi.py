@@ -0,0 +1,23 @@
+from django.urls import re_path
+
+from . import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+app_name = 'api'
+
+# Имена как у маршрутов роутера в api.urls, остальные адреса из них же.
+# У рецепта только числовой id: иначе шаблон перехватит действия
+# вроде recipes/feed/.
+urlpatterns = [
+    re_path(r'^recipes/$', async_views.recipe_list, name='recipes-list'),
+    re_path(r'^recipes/(?P<pk>\d+)/$', async_views.recipe_detail,
+            name='recipes-detail'),
+    re_path(r'^tags/$', async_views.reference_view, name='tag-list'),
+    re_path(r'^tags/(?P<pk>[^/.]+)/$', async_views.reference_view,
+            name='tag-detail'),
+    re_path(r'^ingredients/$', async_views.reference_view,
+            name='ingredient-list'),
+    re_path(r'^ingredients/(?P<pk>[^/.]+)/$', async_views.reference_view,
+            name='ingredient-detail'),
+    *sync_urlpatterns,
+]
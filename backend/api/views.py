@@ -1,30 +1,107 @@
+from collections import defaultdict
 from http import HTTPStatus
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import transaction
-from django.db.models import BooleanField, Exists, OuterRef, Sum, Value
-from django.http import HttpResponse
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, connection, transaction
+from django.db.models import (BooleanField, Exists, F, OuterRef, Subquery,
+                              Value, Window, prefetch_related_objects)
+from django.db.models.functions import Coalesce, Greatest, RowNumber
+from django.http import FileResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
-from recipes.models import (FavoriteRecipe, Ingredient, IngredientInRecipe,
-                            Recipe, ShoppingCart, Tag)
+from recipes.models import (FavoriteRecipe, Ingredient, IngredientRecipeIndex,
+                            Recipe, ShoppingCart, ShoppingCartIngredient, Tag,
+                            count_subquery)
 from rest_framework import mixins, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.relations import PrimaryKeyRelatedField
 from rest_framework.response import Response
-from users.models import Follow
+from rest_framework.settings import api_settings
+from taskqueue.models import Task
+from users.models import AuthorStats, Follow
 
-from .filters import IngredientSearchFilter, RecipeFilter
+from .cache import ConditionalRecipeMixin, VersionedCacheMixin
+from .filters import POPULAR, IngredientSearchFilter, RecipeFilter
+from .paginations import KeysetPagination, get_limit
 from .permissions import IsAdminAuthorOrReadOnly, IsAdminOrReadOnly
-from .serializers import (CheckFavoriteSerializer, CheckShoppingCartSerializer,
-                          CheckSubscribeSerializer, FollowSerializer,
+from .renderers import (ShoppingCartContentNegotiation,
+                        ShoppingCartCsvRenderer, ShoppingCartPdfRenderer,
+                        ShoppingCartTxtRenderer)
+from .replicas import ReplicaReadMixin
+from .search import search_ingredients
+from .serializers import (BulkIdsSerializer, FollowSerializer,
+                          IngredientCoverageQuerySerializer,
                           IngredientSerializer, RecipeAddingSerializer,
-                          RecipeReadSerializer, RecipeWriteSerializer,
-                          TagSerializer)
+                          RecipeCoverageSerializer, RecipeReadSerializer,
+                          RecipeWriteSerializer, ShoppingCartFileSerializer,
+                          ShoppingCartFileStatusSerializer, TagSerializer,
+                          prefetch_ingredients_amount)
+from .shopping_cart import (FILENAME, SHOPPING_CART_STREAMS,
+                            get_cart_ingredients)
+from .tasks import build_shopping_cart_file
 
 User = get_user_model()
-FILENAME = 'shopping_cart.txt'
-HEADER_FILE_CART = 'Мой список покупок:\n\nНаименование - Кол-во/Ед.изм.\n'
+NON_FIELD_ERRORS_KEY = api_settings.NON_FIELD_ERRORS_KEY
+UPDATE_ACTIONS = ('update', 'partial_update')
+SUBSCRIBE_SELF = 'Ошибка, на себя подписка не разрешена'
+SUBSCRIBE_EXISTS = 'Ошибка, вы уже подписались'
+SHOPPING_CART_FILE_NOT_READY = 'Файл ещё не готов'
+UNSUBSCRIBE_SELF = 'Ошибка, отписка от самого себя не разрешена'
+UNSUBSCRIBE_MISSING = 'Ошибка, вы уже отписались'
+FAVORITE_EXISTS = 'Этот рецепт уже добавлен в избранном'
+FAVORITE_MISSING = 'Этот рецепт отсутствует в избранном'
+CART_EXISTS = 'Этот рецепт уже добавлен в корзину'
+CART_MISSING = 'Этот рецепт отсутствует в корзине'
+RECIPE_NOT_FOUND = 'Рецепт не найден'
+AUTHOR_NOT_FOUND = 'Автор не найден'
+COUNTER_FIELDS = {
+    FavoriteRecipe: 'favorites_count',
+    ShoppingCart: 'cart_count',
+}
+TOGGLE_ERRORS = {
+    FavoriteRecipe: (FAVORITE_EXISTS, FAVORITE_MISSING),
+    ShoppingCart: (CART_EXISTS, CART_MISSING),
+}
+ADDED, DELETED = 'added', 'deleted'
+EXISTS, MISSING, NOT_FOUND, SELF = 'exists', 'missing', 'not_found', 'self'
+
+
+def get_recipe(pk, only=('id', 'name', 'image', 'cooking_time')):
+    """Рецепт по id из адреса; ошибка такая же, как у
+    PrimaryKeyRelatedField"""
+    try:
+        recipe = Recipe.objects.only(*only).filter(pk=pk).first()
+    except (TypeError, ValueError):
+        recipe = None
+    if recipe is None:
+        message = PrimaryKeyRelatedField.default_error_messages[
+            'does_not_exist'
+        ]
+        raise ValidationError(
+            {'recipe': [message.format(pk_value=pk)]}, code='does_not_exist'
+        )
+    return recipe
+
+
+def get_bulk_ids(request):
+    serializer = BulkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data['ids']
+
+
+def bulk_response(ids, statuses, messages):
+    """Результат пакетной операции по каждому id в порядке запроса"""
+    results = []
+    for pk in ids:
+        result = {'id': pk, 'status': statuses[pk]}
+        if statuses[pk] in messages:
+            result['errors'] = messages[statuses[pk]]
+        results.append(result)
+    return Response({'results': results})
 
 
 class ListRetrieveViewSet(viewsets.GenericViewSet, mixins.ListModelMixin,
@@ -32,50 +109,106 @@ class ListRetrieveViewSet(viewsets.GenericViewSet, mixins.ListModelMixin,
     permission_classes = (IsAdminOrReadOnly, )
 
 
-class TagViewSet(ListRetrieveViewSet):
+class TagViewSet(ReplicaReadMixin, VersionedCacheMixin,
+                 ListRetrieveViewSet):
     """Вьюсет список тегов"""
+    cache_models = (Tag,)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientViewSet(ListRetrieveViewSet):
+class IngredientViewSet(ReplicaReadMixin, VersionedCacheMixin,
+                        ListRetrieveViewSet):
     """Вьюсет список ингредиентов"""
+    cache_models = (Ingredient,)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     filter_class = IngredientSearchFilter
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name is None:
+            return super().list(request, *args, **kwargs)
+        limit = get_limit(
+            request, 'limit', default=settings.INGREDIENT_SEARCH_LIMIT,
+            maximum=settings.INGREDIENT_SEARCH_LIMIT
+        )
+        serializer = self.get_serializer(
+            search_ingredients(name, limit), many=True
+        )
+        return Response(serializer.data)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(ReplicaReadMixin, ConditionalRecipeMixin,
+                    viewsets.ModelViewSet):
     """Вьюсет для рецепта"""
     permission_classes = (IsAdminAuthorOrReadOnly,)
     filter_class = RecipeFilter
 
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            ranked = params.get('ordering') == POPULAR or params.get('search')
+            if KeysetPagination.is_requested(self.request) and not ranked:
+                self._paginator = KeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
     def get_queryset(self):
+        if self.action in UPDATE_ACTIONS:
+            # записи не нужны аннотации и предвыборки ответа чтения
+            return Recipe.objects.prefetch_related(
+                prefetch_ingredients_amount()
+            )
+        if self.action == 'destroy':
+            return Recipe.objects.all()
+        queryset = Recipe.objects.select_related('author').prefetch_related(
+            'tags', 'image_variants', prefetch_ingredients_amount()
+        )
         if self.request.user.is_authenticated:
-            return Recipe.objects.annotate(
+            return queryset.annotate(
                 is_favorited=Exists(FavoriteRecipe.objects.filter(
                     user=self.request.user, recipe__pk=OuterRef('pk'))
                 ),
                 is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
                     user=self.request.user, recipe__pk=OuterRef('pk'))
+                ),
+                is_subscribed=Exists(Follow.objects.filter(
+                    user=self.request.user, author=OuterRef('author'))
                 )
             )
         else:
-            return Recipe.objects.annotate(
+            return queryset.annotate(
                 is_favorited=Value(False, output_field=BooleanField()),
-                is_in_shopping_cart=Value(False, output_field=BooleanField())
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+                is_subscribed=Value(False, output_field=BooleanField())
             )
 
     @transaction.atomic()
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        AuthorStats.objects.change_recipes_count(self.request.user.id, 1)
+
+    @transaction.atomic()
+    def perform_update(self, serializer):
+        serializer.save()
+
+    @transaction.atomic()
+    def perform_destroy(self, instance):
+        # Строки обратного индекса удаляются каскадом вместе с рецептом
+        cart_user_ids = list(instance.cart.values_list('user_id', flat=True))
+        ShoppingCartIngredient.objects.remove_recipe(instance, cart_user_ids)
+        instance.delete()
+        AuthorStats.objects.change_recipes_count(instance.author_id, -1)
 
     @action(
         detail=True,
@@ -83,26 +216,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated]
     )
     def favorite(self, request, pk=None):
-        data = {
-            'user': request.user.id,
-            'recipe': pk,
-        }
-        serializer = CheckFavoriteSerializer(
-            data=data, context={'request': request}
-        )
-        serializer.is_valid(raise_exception=True)
         return self.add_object(FavoriteRecipe, request.user, pk)
 
     @favorite.mapping.delete
     def del_favorite(self, request, pk=None):
-        data = {
-            'user': request.user.id,
-            'recipe': pk,
-        }
-        serializer = CheckFavoriteSerializer(
-            data=data, context={'request': request}
-        )
-        serializer.is_valid(raise_exception=True)
         return self.delete_object(FavoriteRecipe, request.user, pk)
 
     @action(
@@ -111,109 +228,399 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated]
     )
     def shopping_cart(self, request, pk=None):
-        data = {
-            'user': request.user.id,
-            'recipe': pk,
-        }
-        serializer = CheckShoppingCartSerializer(
-            data=data, context={'request': request}
-        )
-        serializer.is_valid(raise_exception=True)
         return self.add_object(ShoppingCart, request.user, pk)
 
     @shopping_cart.mapping.delete
     def del_shopping_cart(self, request, pk=None):
-        data = {
-            'user': request.user.id,
-            'recipe': pk,
-        }
-        serializer = CheckShoppingCartSerializer(
-            data=data, context={'request': request}
-        )
-        serializer.is_valid(raise_exception=True)
         return self.delete_object(ShoppingCart, request.user, pk)
 
-    @transaction.atomic()
     def add_object(self, model, user, pk):
-        recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.create(user=user, recipe=recipe)
-        serializer = RecipeAddingSerializer(recipe)
+        """Добавление одной вставкой: повтор отсекает уникальное
+        ограничение, а не предварительная проверка, поэтому нет гонки
+        между проверкой и вставкой."""
+        recipe = get_recipe(pk)
+        try:
+            with transaction.atomic():
+                model.objects.create(user=user, recipe=recipe)
+                field = COUNTER_FIELDS[model]
+                Recipe.objects.filter(pk=recipe.pk).update(
+                    **{field: F(field) + 1}
+                )
+                if model is ShoppingCart:
+                    ShoppingCartIngredient.objects.add_recipe(
+                        recipe, [user.id]
+                    )
+        except IntegrityError:
+            raise ValidationError(
+                {NON_FIELD_ERRORS_KEY: [TOGGLE_ERRORS[model][0]]}
+            )
+        prefetch_related_objects([recipe], 'image_variants')
+        serializer = RecipeAddingSerializer(
+            recipe, context=self.get_serializer_context()
+        )
         return Response(serializer.data, status=HTTPStatus.CREATED)
 
     @transaction.atomic()
     def delete_object(self, model, user, pk):
-        model.objects.filter(user=user, recipe__id=pk).delete()
+        """Удаление одним запросом: отсутствие строки видно по числу
+        удалённых строк."""
+        try:
+            deleted, _ = model.objects.filter(
+                user=user, recipe_id=pk
+            ).delete()
+        except (TypeError, ValueError):
+            deleted = 0
+        if not deleted:
+            get_recipe(pk, only=('id',))
+            raise ValidationError(
+                {NON_FIELD_ERRORS_KEY: [TOGGLE_ERRORS[model][1]]}
+            )
+        field = COUNTER_FIELDS[model]
+        Recipe.objects.filter(pk=pk).update(
+            **{field: Greatest(F(field) - 1, Value(0))}
+        )
+        if model is ShoppingCart:
+            ShoppingCartIngredient.objects.remove_recipes([pk], [user.id])
         return Response(status=HTTPStatus.NO_CONTENT)
 
     @action(
-        methods=['get'], detail=False, permission_classes=[IsAuthenticated]
+        methods=['post'], detail=False, url_path='favorite',
+        url_name='favorite-bulk', permission_classes=[IsAuthenticated]
+    )
+    def favorite_bulk(self, request):
+        """Добавляет в избранное рецепты из списка ids"""
+        return self.add_objects(FavoriteRecipe, request)
+
+    @favorite_bulk.mapping.delete
+    def del_favorite_bulk(self, request):
+        return self.delete_objects(FavoriteRecipe, request)
+
+    @action(
+        methods=['post'], detail=False, url_path='shopping_cart',
+        url_name='shopping-cart-bulk', permission_classes=[IsAuthenticated]
+    )
+    def shopping_cart_bulk(self, request):
+        """Добавляет в корзину рецепты из списка ids"""
+        return self.add_objects(ShoppingCart, request)
+
+    @shopping_cart_bulk.mapping.delete
+    def del_shopping_cart_bulk(self, request):
+        return self.delete_objects(ShoppingCart, request)
+
+    @transaction.atomic()
+    def add_objects(self, model, request):
+        """Пакетное добавление: рецепты и уже добавленные проверяются
+        одним запросом, строки вставляются одним bulk_create, счётчики
+        пересчитываются по таблице, поэтому не расходятся и при
+        параллельных запросах."""
+        user = request.user
+        ids = get_bulk_ids(request)
+        added = dict(Recipe.objects.filter(id__in=ids).annotate(
+            added=Exists(model.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            ))
+        ).values_list('id', 'added'))
+        statuses = {
+            pk: NOT_FOUND if pk not in added else EXISTS if added[pk]
+            else ADDED for pk in ids
+        }
+        new_ids = [pk for pk in ids if statuses[pk] == ADDED]
+        if new_ids:
+            model.objects.bulk_create(
+                [model(user=user, recipe_id=pk) for pk in new_ids],
+                ignore_conflicts=True
+            )
+            self.update_counters(model, new_ids)
+            if model is ShoppingCart:
+                ShoppingCartIngredient.objects.add_recipes(new_ids, [user.id])
+        return bulk_response(ids, statuses, {
+            EXISTS: TOGGLE_ERRORS[model][0],
+            NOT_FOUND: RECIPE_NOT_FOUND,
+        })
+
+    @transaction.atomic()
+    def delete_objects(self, model, request):
+        user = request.user
+        ids = get_bulk_ids(request)
+        queryset = model.objects.filter(user=user, recipe_id__in=ids)
+        deleted_ids = set(
+            queryset.select_for_update().values_list('recipe_id', flat=True)
+        )
+        if deleted_ids:
+            queryset.filter(recipe_id__in=deleted_ids).delete()
+            self.update_counters(model, deleted_ids)
+            if model is ShoppingCart:
+                ShoppingCartIngredient.objects.remove_recipes(
+                    deleted_ids, [user.id]
+                )
+        return bulk_response(ids, {
+            pk: DELETED if pk in deleted_ids else MISSING for pk in ids
+        }, {MISSING: TOGGLE_ERRORS[model][1]})
+
+    def update_counters(self, model, recipe_ids):
+        field = COUNTER_FIELDS[model]
+        Recipe.objects.filter(id__in=recipe_ids).update(
+            **{field: count_subquery(model, 'recipe')}
+        )
+
+    @action(detail=False)
+    def by_ingredients(self, request):
+        """Рецепты по доле своих ингредиентов, которые есть у пользователя.
+
+        Доли, фильтр по минимальной доле, сортировка и страница считаются
+        в базе по обратному индексу ингредиент -> рецепты, полные строки
+        читаются только для рецептов страницы.
+        """
+        query = IngredientCoverageQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        self._paginator = self.pagination_class()
+        page = self.paginate_queryset(IngredientRecipeIndex.objects.coverage(
+            query.validated_data['ingredients'],
+            query.validated_data['min_coverage']
+        ))
+        recipes = self.get_queryset().in_bulk(
+            [row['recipe_id'] for row in page]
+        )
+        for row in page:
+            if row['recipe_id'] in recipes:
+                recipes[row['recipe_id']].coverage = round(
+                    row['coverage'], 4
+                )
+        serializer = RecipeCoverageSerializer(
+            [recipes[row['recipe_id']] for row in page
+             if row['recipe_id'] in recipes],
+            many=True, context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """Новые рецепты авторов из подписок с курсорной пагинацией.
+
+        Подписки присоединяются JOIN, без списка id авторов в запросе.
+        Страница выбирается по индексу только по id и дате, полные строки
+        с флагами пользователя читаются отдельно для этих id: иначе
+        подзапросы флагов считаются для всех рецептов подписок до
+        сортировки.
+        """
+        self._paginator = KeysetPagination()
+        page = self.paginate_queryset(Recipe.objects.filter(
+            author__following__user=request.user
+        ).only('id', 'pud_date'))
+        recipes = self.get_queryset().in_bulk([recipe.id for recipe in page])
+        serializer = self.get_serializer(
+            [recipes[recipe.id] for recipe in page if recipe.id in recipes],
+            many=True
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        methods=['get'], detail=False, permission_classes=[IsAuthenticated],
+        renderer_classes=[ShoppingCartTxtRenderer, ShoppingCartCsvRenderer,
+                          ShoppingCartPdfRenderer],
+        content_negotiation_class=ShoppingCartContentNegotiation
     )
     def download_shopping_cart(self, request):
-        ingredients = IngredientInRecipe.objects.filter(
-            recipe__cart__user=request.user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).order_by('ingredient__name').annotate(total=Sum('amount'))
-        result = HEADER_FILE_CART
-        result += '\n'.join([
-            f'{ingredient["ingredient__name"]} - {ingredient["total"]}/'
-            f'{ingredient["ingredient__measurement_unit"]}'
-            for ingredient in ingredients
-        ])
-        response = HttpResponse(result, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename={FILENAME}'
+        ingredients = get_cart_ingredients(request.user.id)
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            SHOPPING_CART_STREAMS[renderer.format](ingredients.iterator()),
+            content_type=renderer.media_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename={FILENAME}.{renderer.format}'
+        )
         return response
 
+    @action(
+        methods=['post'], detail=False, permission_classes=[IsAuthenticated]
+    )
+    def shopping_cart_file(self, request):
+        """Ставит в очередь сборку файла списка покупок"""
+        serializer = ShoppingCartFileSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        task = build_shopping_cart_file.delay(
+            user_id=request.user.id,
+            file_format=serializer.validated_data['format']
+        )
+        serializer = ShoppingCartFileSerializer(
+            task, context={'request': request}
+        )
+        return Response(serializer.data, status=HTTPStatus.ACCEPTED)
+
+    @staticmethod
+    def get_shopping_cart_task(request):
+        """Задача сборки файла из ?id= текущего пользователя"""
+        serializer = ShoppingCartFileStatusSerializer(
+            data=request.query_params
+        )
+        serializer.is_valid(raise_exception=True)
+        task = get_object_or_404(
+            Task, pk=serializer.validated_data['id'],
+            name=build_shopping_cart_file.name
+        )
+        if task.kwargs['user_id'] != request.user.id:
+            raise NotFound()
+        return task
+
+    @shopping_cart_file.mapping.get
+    def shopping_cart_file_status(self, request):
+        """Состояние сборки файла и ссылка на готовый файл"""
+        serializer = ShoppingCartFileSerializer(
+            self.get_shopping_cart_task(request),
+            context={'request': request}
+        )
+        return Response(serializer.data)
+
+    @action(
+        methods=['get'], detail=False, url_path='shopping_cart_file/download',
+        permission_classes=[IsAuthenticated]
+    )
+    def shopping_cart_file_download(self, request):
+        """Готовый файл списка покупок, только его владельцу"""
+        task = self.get_shopping_cart_task(request)
+        if task.status != Task.DONE:
+            raise NotFound(SHOPPING_CART_FILE_NOT_READY)
+        name = task.result_data['file']
+        if not default_storage.exists(name):
+            raise NotFound()
+        return FileResponse(
+            default_storage.open(name), as_attachment=True,
+            filename=f'{FILENAME}.{task.kwargs["file_format"]}'
+        )
+
 
-class FollowViewSet(UserViewSet):
+class FollowViewSet(ReplicaReadMixin, UserViewSet):
     """Вьюсет подписки"""
+    replica_actions = ('subscriptions',)
+
     @action(
         methods=['post'],
         detail=True,
         permission_classes=[IsAuthenticated]
     )
-    @transaction.atomic()
     def subscribe(self, request, id=None):
-
         user = request.user
         author = get_object_or_404(User, pk=id)
-        data = {
-            'user': user.id,
-            'author': author.id,
-        }
-        serializer = CheckSubscribeSerializer(
-            data=data,
-            context={'request': request},
-        )
-        serializer.is_valid(raise_exception=True)
-        result = Follow.objects.create(user=user, author=author)
+        if author == user:
+            raise ValidationError({NON_FIELD_ERRORS_KEY: [SUBSCRIBE_SELF]})
+        try:
+            with transaction.atomic():
+                result = Follow.objects.create(user=user, author=author)
+        except IntegrityError:
+            raise ValidationError({NON_FIELD_ERRORS_KEY: [SUBSCRIBE_EXISTS]})
         serializer = FollowSerializer(result, context={'request': request})
         return Response(serializer.data, status=HTTPStatus.CREATED)
 
     @subscribe.mapping.delete
-    @transaction.atomic()
     def del_subscribe(self, request, id=None):
         user = request.user
-        author = get_object_or_404(User, pk=id)
-        data = {
-            'user': user.id,
-            'author': author.id,
+        if str(id) == str(user.id):
+            raise ValidationError({NON_FIELD_ERRORS_KEY: [UNSUBSCRIBE_SELF]})
+        deleted, _ = user.follower.filter(author_id=id).delete()
+        if not deleted:
+            get_object_or_404(User, pk=id)
+            raise ValidationError({'errors': [UNSUBSCRIBE_MISSING]})
+        return Response(status=HTTPStatus.NO_CONTENT)
+
+    @action(
+        methods=['post'], detail=False, url_path='subscribe',
+        url_name='subscribe-bulk', permission_classes=[IsAuthenticated]
+    )
+    @transaction.atomic()
+    def subscribe_bulk(self, request):
+        """Подписывает на авторов из списка ids"""
+        user = request.user
+        ids = get_bulk_ids(request)
+        subscribed = dict(User.objects.filter(id__in=ids).annotate(
+            subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('pk')
+            ))
+        ).values_list('id', 'subscribed'))
+        statuses = {
+            pk: NOT_FOUND if pk not in subscribed else SELF if pk == user.id
+            else EXISTS if subscribed[pk] else ADDED for pk in ids
         }
-        serializer = CheckSubscribeSerializer(
-            data=data,
-            context={'request': request},
+        Follow.objects.bulk_create([
+            Follow(user=user, author_id=pk)
+            for pk in ids if statuses[pk] == ADDED
+        ], ignore_conflicts=True)
+        return bulk_response(ids, statuses, {
+            SELF: SUBSCRIBE_SELF,
+            EXISTS: SUBSCRIBE_EXISTS,
+            NOT_FOUND: AUTHOR_NOT_FOUND,
+        })
+
+    @subscribe_bulk.mapping.delete
+    @transaction.atomic()
+    def del_subscribe_bulk(self, request):
+        ids = get_bulk_ids(request)
+        queryset = request.user.follower.filter(author_id__in=ids)
+        deleted_ids = set(
+            queryset.select_for_update().values_list('author_id', flat=True)
         )
-        serializer.is_valid(raise_exception=True)
-        user.follower.filter(author=author).delete()
-        return Response(status=HTTPStatus.NO_CONTENT)
+        if deleted_ids:
+            queryset.filter(author_id__in=deleted_ids).delete()
+        return bulk_response(ids, {
+            pk: DELETED if pk in deleted_ids else MISSING for pk in ids
+        }, {MISSING: UNSUBSCRIBE_MISSING})
 
     @action(detail=False, permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
-        user = request.user
-        queryset = user.follower.all()
-        pages = self.paginate_queryset(queryset)
+        pages = self.paginate_queryset(
+            self.get_subscriptions_queryset(request.user)
+        )
+        author_recipes = self.get_author_recipes(
+            [follow.author_id for follow in pages],
+            get_limit(request, 'recipes_limit')
+        )
         serializer = FollowSerializer(
-            pages, many=True, context={'request': request}
+            pages, many=True, context={
+                'request': request, 'author_recipes': author_recipes
+            }
         )
         return self.get_paginated_response(serializer.data)
+
+    @staticmethod
+    def get_subscriptions_queryset(user):
+        """Подписки пользователя; число рецептов автора берётся из
+        счётчика"""
+        return user.follower.select_related('author').annotate(
+            recipes_count=Coalesce('author__stats__recipes_count', 0)
+        )
+
+    @classmethod
+    def get_author_recipes(cls, author_ids, limit=None):
+        """Последние рецепты авторов одним запросом, не более limit на
+        каждого автора."""
+        recipes = list(cls.get_author_recipes_queryset(author_ids, limit))
+        prefetch_related_objects(recipes, 'image_variants')
+        author_recipes = defaultdict(list)
+        for recipe in recipes:
+            author_recipes[recipe.author_id].append(recipe)
+        return author_recipes
+
+    @staticmethod
+    def get_author_recipes_queryset(author_ids, limit=None):
+        queryset = Recipe.objects.filter(
+            author_id__in=author_ids
+        ).order_by('-pud_date')
+        if limit is not None and connection.vendor == 'postgresql':
+            ranked = queryset.annotate(row_number=Window(
+                expression=RowNumber(),
+                partition_by=F('author_id'),
+                order_by=F('pud_date').desc()
+            ))
+            sql, params = ranked.query.sql_with_params()
+            queryset = Recipe.objects.raw(
+                f'SELECT * FROM ({sql}) AS ranked '
+                f'WHERE row_number <= %s ORDER BY pud_date DESC',
+                (*params, limit)
+            )
+        elif limit is not None:
+            queryset = queryset.filter(id__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).order_by('-pud_date').values('id')[:limit]
+            ))
+        return queryset
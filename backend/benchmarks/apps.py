@@ -0,0 +1,34 @@
+import time
+
+from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from foodgram.db import connection_opened
+
+
+def db_latency(execute, sql, params, many, context):
+    """Задержка каждого запроса к базе, как при базе на другом хосте"""
+    time.sleep(settings.BENCH_DB_LATENCY_MS / 1000)
+    return execute(sql, params, many, context)
+
+
+def add_db_latency(sender, connection, **kwargs):
+    # Обёртка живёт в объекте соединения потока и переживает
+    # переподключения, поэтому добавляется один раз.
+    if db_latency not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_latency)
+
+
+def add_connect_latency(sender, connection, **kwargs):
+    """Задержка открытия соединения: TCP, TLS и аутентификация"""
+    time.sleep(settings.BENCH_DB_CONNECT_LATENCY_MS / 1000)
+
+
+class BenchmarksConfig(AppConfig):
+    name = 'benchmarks'
+
+    def ready(self):
+        if settings.BENCH_DB_LATENCY_MS:
+            connection_created.connect(add_db_latency)
+        if settings.BENCH_DB_CONNECT_LATENCY_MS:
+            connection_opened.connect(add_connect_latency)
@@ -0,0 +1,184 @@
+import json
+import os
+import platform
+import random
+import time
+
+import django
+from benchmarks.suite import PERCENTILES, run_scenario, seed_dataset
+from benchmarks.utils import get_client, rollback_after
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from recipes.models import Ingredient
+
+CLIENTS = 20
+URLS_PER_SCENARIO = 50
+COMPARED_FIELDS = ('p95_ms', 'queries_per_request')
+ENDPOINTS = (
+    'recipe_list', 'recipe_list_filtered', 'recipe_detail', 'subscriptions',
+    'download_shopping_cart', 'ingredient_search',
+)
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный прогон горячих эндпоинтов API на сгенерированных '
+            'данных: перцентили задержки, пропускная способность и число '
+            'запросов к базе. Результат сохраняется в JSON, данные '
+            'откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--recipes', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Подписок на пользователя.')
+        parser.add_argument('--favorites', type=int, default=30,
+                            help='Рецептов в избранном у пользователя.')
+        parser.add_argument('--cart', type=int, default=10,
+                            help='Рецептов в корзине у пользователя.')
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Замеряемых запросов на эндпоинт.')
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            choices=ENDPOINTS,
+                            help='Прогнать только указанные эндпоинты.')
+        parser.add_argument(
+            '--output',
+            help='Файл результата, по умолчанию '
+                 'bench_results/api-<время>.json.'
+        )
+        parser.add_argument(
+            '--compare',
+            help='JSON прошлого прогона: при регрессии команда '
+                 'завершается ошибкой.'
+        )
+        parser.add_argument(
+            '--max-regression', type=float, default=20,
+            help='Допустимый рост p95 при сравнении, %%.'
+        )
+
+    def get_scenarios(self, users, recipe_ids, tags):
+        """Адреса эндпоинтов; у каждого сценария свои клиенты"""
+        rng = random.Random(0)
+        authenticated = [get_client(user) for user in users[:CLIENTS]]
+        anonymous = [get_client()]
+        prefixes = [
+            name[:rng.randint(2, 4)] for name in rng.sample(
+                list(Ingredient.objects.values_list('name', flat=True)),
+                URLS_PER_SCENARIO
+            )
+        ]
+        return {
+            'recipe_list': (anonymous, [
+                f'/api/recipes/?page={page}&limit=6'
+                for page in range(1, 11)
+            ]),
+            'recipe_list_filtered': (authenticated, [
+                f'/api/recipes/?tags={tag.slug}&limit=6'
+                f'&is_favorited={flag}&is_in_shopping_cart=0'
+                for tag in tags for flag in (0, 1)
+            ] + [
+                f'/api/recipes/?author={user.id}&limit=6'
+                for user in users[:URLS_PER_SCENARIO]
+            ]),
+            'recipe_detail': (authenticated, [
+                f'/api/recipes/{recipe_id}/'
+                for recipe_id in rng.sample(recipe_ids, URLS_PER_SCENARIO)
+            ]),
+            'subscriptions': (authenticated, [
+                '/api/users/subscriptions/?limit=6&recipes_limit=3'
+            ]),
+            'download_shopping_cart': (authenticated, [
+                f'/api/recipes/download_shopping_cart/?format={file_format}'
+                for file_format in ('txt', 'csv')
+            ]),
+            'ingredient_search': (anonymous, [
+                f'/api/ingredients/?name={prefix}' for prefix in prefixes
+            ]),
+        }
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                baseline = json.load(file)
+        with rollback_after():
+            start = time.perf_counter()
+            users, recipe_ids, tags = seed_dataset(
+                options['users'], options['recipes'], options['follows'],
+                options['favorites'], options['cart'],
+                options['ingredients_per_recipe']
+            )
+            self.stdout.write(
+                f'Данные созданы за {time.perf_counter() - start:.1f} с'
+            )
+            scenarios = self.get_scenarios(users, recipe_ids, tags)
+            results = {}
+            for name in options['endpoints'] or ENDPOINTS:
+                clients, urls = scenarios[name]
+                results[name] = run_scenario(
+                    clients, urls, options['requests'], options['warmup']
+                )
+                self.stdout.write(self.format_result(name, results[name]))
+        report = {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'scale': {
+                key: options[key] for key in (
+                    'users', 'recipes', 'follows', 'favorites', 'cart',
+                    'ingredients_per_recipe', 'requests', 'warmup'
+                )
+            },
+            'endpoints': results,
+        }
+        path = options['output'] or os.path.join(
+            'bench_results', time.strftime('api-%Y%m%d-%H%M%S.json')
+        )
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результат сохранён в {path}')
+        if baseline is not None:
+            self.compare(baseline, report, options['max_regression'])
+
+    def format_result(self, name, result):
+        latency = ' '.join(
+            f'p{percent}={result[f"p{percent}_ms"]:.1f}'
+            for percent in PERCENTILES
+        )
+        return (
+            f'{name:<24} {latency} мс  {result["throughput_rps"]:7.1f} rps  '
+            f'запросов к БД {result["queries_per_request"]:.1f}  '
+            f'ошибок {result["errors"]}'
+        )
+
+    def compare(self, baseline, report, max_regression):
+        """Сравнивает p95 и число запросов к базе с прошлым прогоном"""
+        if baseline.get('scale') != report['scale']:
+            self.stdout.write('Внимание: масштаб прогонов различается.')
+        regressions = []
+        for name, result in report['endpoints'].items():
+            previous = baseline.get('endpoints', {}).get(name)
+            if previous is None:
+                continue
+            changes = ', '.join(
+                f'{field} {previous[field]} -> {result[field]}'
+                for field in COMPARED_FIELDS
+            )
+            self.stdout.write(f'{name:<24} {changes}')
+            limit = previous['p95_ms'] * (1 + max_regression / 100)
+            if result['p95_ms'] > limit:
+                regressions.append(f'{name}: p95 {result["p95_ms"]} мс')
+            if result['queries_per_request'] > previous[
+                'queries_per_request'
+            ]:
+                regressions.append(
+                    f'{name}: запросов к БД {result["queries_per_request"]}'
+                )
+        if regressions:
+            raise CommandError('Регрессия: ' + '; '.join(regressions))
+        self.stdout.write('Регрессий нет.')
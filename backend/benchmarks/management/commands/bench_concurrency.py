@@ -0,0 +1,76 @@
+import asyncio
+import json
+import time
+
+from benchmarks.server import get_paths, load, server
+from benchmarks.suite import PERCENTILES, seed_dataset
+from django.core.management import BaseCommand
+
+PROFILES = ('sync', 'gthread', 'asgi')
+
+
+class Command(BaseCommand):
+    help = ('Пропускная способность профилей gunicorn (sync, gthread, asgi) '
+            'при большом числе одновременных соединений. Серверы '
+            'запускаются командой по очереди на текущей базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', choices=PROFILES,
+                            default=list(PROFILES))
+        parser.add_argument('--connections', type=int, default=200)
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Длительность нагрузки на профиль, сек.')
+        parser.add_argument('--workers', type=int, default=2,
+                            help='Процессов gunicorn в каждом профиле.')
+        parser.add_argument('--threads', type=int, default=20,
+                            help='Потоков в процессе для gthread и asgi.')
+        parser.add_argument(
+            '--db-latency', type=float, default=2,
+            help='Задержка каждого запроса к базе в серверах, мс: '
+                 'имитирует сетевой путь до PostgreSQL. 0 — без задержки.'
+        )
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument(
+            '--seed', action='store_true',
+            help='Заполнить базу данными bench_api без отката. Только для '
+                 'отдельной базы (DB_NAME).'
+        )
+        parser.add_argument('--output')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            seed_dataset(users=200, recipes=5000, follows=20, favorites=30,
+                         cart=10, ingredients_per_recipe=8)
+        paths = get_paths()
+        results = {}
+        for profile in options['profiles']:
+            with server(options['port'], {
+                'GUNICORN_PROFILE': profile,
+                'GUNICORN_WORKERS': str(options['workers']),
+                'GUNICORN_THREADS': str(options['threads']),
+                'ASGI_THREADS': str(options['threads']),
+                'BENCH_DB_LATENCY_MS': str(options['db_latency']),
+            }):
+                result = asyncio.run(load(
+                    options['port'], paths, options['connections'],
+                    options['duration']
+                ))
+            results[profile] = result
+            self.stdout.write(
+                f'{profile:<8} {result["throughput_rps"]:8.1f} rps  '
+                + ' '.join(f'p{percent}={result[f"p{percent}_ms"]:.0f}'
+                           for percent in PERCENTILES)
+                + f' мс  запросов {result["requests"]}  '
+                f'ошибок {result["errors"]}'
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({
+                    'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                    'connections': options['connections'],
+                    'duration': options['duration'],
+                    'workers': options['workers'],
+                    'threads': options['threads'],
+                    'db_latency_ms': options['db_latency'],
+                    'profiles': results,
+                }, file, ensure_ascii=False, indent=2)
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import re
+import secrets
+import time
+
+from benchmarks.server import fetch, get_paths, load, server
+from benchmarks.suite import PERCENTILES
+from django.core.management import BaseCommand
+
+MODES = ('per-request', 'persistent', 'pool')
+METRIC = re.compile(
+    r'^foodgram_(db_connections_opened_total|db_pool_opened)'
+    r'\{alias="default"\} (\S+)$', re.M
+)
+
+
+class Command(BaseCommand):
+    help = ('Соединения с базой и задержка ответов без постоянных '
+            'соединений, с постоянными соединениями (CONN_MAX_AGE) и с '
+            'пулом (DB_POOL_SIZE). Число открытых соединений берётся '
+            'из /metrics сервера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=MODES,
+                            default=list(MODES))
+        parser.add_argument('--connections', type=int, default=2)
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Длительность нагрузки на режим, сек.')
+        parser.add_argument('--threads', type=int, default=20,
+                            help='Потоков gthread в процессе сервера.')
+        parser.add_argument('--pool-size', type=int, default=5)
+        parser.add_argument(
+            '--connect-latency', type=float, default=5,
+            help='Задержка открытия соединения, мс: имитирует TCP и '
+                 'аутентификацию в PostgreSQL.'
+        )
+        parser.add_argument(
+            '--db-latency', type=float, default=0,
+            help='Задержка каждого запроса к базе, мс.'
+        )
+        parser.add_argument('--port', type=int, default=8766)
+        parser.add_argument('--output')
+
+    def handle(self, *args, **options):
+        paths = get_paths()
+        token = secrets.token_hex(16)
+        results = {}
+        for mode in options['modes']:
+            # Один процесс, чтобы /metrics показал все соединения
+            with server(options['port'], {
+                'GUNICORN_PROFILE': 'gthread',
+                'GUNICORN_WORKERS': '1',
+                'GUNICORN_THREADS': str(options['threads']),
+                'DB_CONN_MAX_AGE': '0' if mode == 'per-request' else '60',
+                'DB_POOL_SIZE': str(
+                    options['pool_size'] if mode == 'pool' else 0
+                ),
+                'BENCH_DB_CONNECT_LATENCY_MS': str(
+                    options['connect_latency']
+                ),
+                'BENCH_DB_LATENCY_MS': str(options['db_latency']),
+                'PERF_METRICS_ENABLED': 'True',
+                'METRICS_TOKEN': token,
+            }):
+                result = asyncio.run(load(
+                    options['port'], paths, options['connections'],
+                    options['duration']
+                ))
+                metrics = dict(METRIC.findall(fetch(
+                    options['port'], '/metrics',
+                    {'Authorization': f'Bearer {token}'}
+                )))
+            result['connections_opened'] = int(float(
+                metrics.get('db_connections_opened_total', 0)
+            ))
+            result['pool_opened'] = int(float(
+                metrics.get('db_pool_opened', 0)
+            ))
+            results[mode] = result
+            self.stdout.write(
+                f'{mode:<12} соединений {result["connections_opened"]:6} '
+                f'{result["throughput_rps"]:8.1f} rps  '
+                + ' '.join(f'p{percent}={result[f"p{percent}_ms"]:.1f}'
+                           for percent in PERCENTILES)
+                + f' мс  запросов {result["requests"]}  '
+                f'ошибок {result["errors"]}'
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({
+                    'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                    'connections': options['connections'],
+                    'duration': options['duration'],
+                    'threads': options['threads'],
+                    'pool_size': options['pool_size'],
+                    'connect_latency_ms': options['connect_latency'],
+                    'db_latency_ms': options['db_latency'],
+                    'modes': results,
+                }, file, ensure_ascii=False, indent=2)
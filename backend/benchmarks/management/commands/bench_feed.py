@@ -0,0 +1,113 @@
+import time
+from statistics import median
+
+from benchmarks.utils import get_bench_user, get_client, rollback_after
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from recipes.models import Recipe
+from users.models import Follow
+
+User = get_user_model()
+BATCH_SIZE = 10000
+URL = '/api/recipes/feed/?limit={}'
+
+
+class Command(BaseCommand):
+    help = ('Лента рецептов из подписок: JOIN на подписки, EXISTS и '
+            'фильтр по списку авторов, первая и глубокая страница. '
+            'Данные откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=10000)
+        parser.add_argument('--recipes', type=int, default=1000000)
+        parser.add_argument('--follows', type=int, default=2000)
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def timed(self, func):
+        timings = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return result, median(timings)
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        limit = options['limit']
+        with rollback_after():
+            user = get_bench_user()
+            author_ids = self.seed(user, options)
+            recipes = Recipe.objects.only('id', 'pud_date')
+            variants = {
+                'JOIN': recipes.filter(author__following__user=user),
+                'EXISTS': recipes.filter(id__in=recipes.annotate(
+                    followed=Exists(Follow.objects.filter(
+                        user=user, author=OuterRef('author')
+                    ))
+                ).filter(followed=True).values('id')),
+                'IN (подзапрос)': recipes.filter(
+                    author_id__in=Follow.objects.filter(
+                        user=user
+                    ).values('author_id')
+                ),
+                'IN (авторы)': recipes.filter(author_id__in=author_ids),
+            }
+            deep = variants['JOIN'].order_by('-pud_date', '-id')[
+                limit * 100:limit * 100 + 1
+            ].get()
+            self.stdout.write(
+                f'{"вариант":<14}{"1-я стр., мс":>14}{"101-я стр., мс":>16}'
+            )
+            for name, queryset in variants.items():
+                queryset = queryset.order_by('-pud_date', '-id')
+                _, first = self.timed(lambda: list(queryset[:limit]))
+                _, far = self.timed(lambda: list(queryset.filter(
+                    pud_date__lte=deep.pud_date
+                ).exclude(pud_date=deep.pud_date, id__gt=deep.id)[:limit]))
+                self.stdout.write(f'{name:<14}{first:>14.1f}{far:>16.1f}')
+            query = variants['JOIN'].order_by('-pud_date', '-id')[:limit]
+            self.stdout.write(f'План JOIN ({connection.vendor}):')
+            self.stdout.write(query.explain())
+            client = get_client(user)
+            response, elapsed = self.timed(
+                lambda: client.get(URL.format(limit))
+            )
+            next_url = response.json()['next']
+            _, next_elapsed = self.timed(lambda: client.get(next_url))
+            self.stdout.write(
+                f'API: 1-я стр. {elapsed:.1f} мс, '
+                f'следующая {next_elapsed:.1f} мс'
+            )
+
+    def seed(self, user, options):
+        """Авторы, рецепты по кругу у авторов и подписки пользователя
+        на каждого authors // follows автора."""
+        count = options['authors']
+        User.objects.bulk_create(
+            User(username=f'bench_author_{i}',
+                 email=f'bench_author_{i}@bench.local')
+            for i in range(count)
+        )
+        authors = list(User.objects.filter(
+            username__startswith='bench_author_'
+        ).order_by('id').values_list('id', flat=True))
+        for start in range(0, options['recipes'], BATCH_SIZE):
+            stop = min(start + BATCH_SIZE, options['recipes'])
+            Recipe.objects.bulk_create(
+                Recipe(author_id=authors[i % count], name=f'bench {i}',
+                       text='bench', cooking_time=10)
+                for i in range(start, stop)
+            )
+        step = max(count // options['follows'], 1)
+        followed = authors[::step][:options['follows']]
+        Follow.objects.bulk_create(
+            Follow(user=user, author_id=author_id) for author_id in followed
+        )
+        self.stdout.write(
+            f'Авторов {count}, рецептов {options["recipes"]}, '
+            f'подписок {len(followed)}'
+        )
+        return followed
@@ -0,0 +1,108 @@
+import random
+import time
+from statistics import median
+
+from benchmarks.utils import (bulk_create_recipes, get_bench_ingredients,
+                              get_bench_user, get_client, rollback_after)
+from django.core.management import BaseCommand
+from django.db.models import Count, F, FloatField, Q
+from django.db.models.functions import Cast
+from recipes.models import IngredientInRecipe, IngredientRecipeIndex, Recipe
+
+URL = '/api/recipes/by_ingredients/?{}&limit=6'
+INGREDIENTS_PER_RECIPE = 8
+BATCH_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = ('Поиск рецептов по имеющимся ингредиентам: агрегация в SQL '
+            'против обратного индекса. Данные откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--have', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def timed(self, func):
+        timings = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return result, median(timings)
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        with rollback_after():
+            ingredients = get_bench_ingredients(options['ingredients'])
+            # индекс строится отдельно и с замером времени
+            with IngredientRecipeIndex.objects.deferred():
+                self.seed(ingredients, options['recipes'])
+            start = time.perf_counter()
+            IngredientRecipeIndex.objects.rebuild()
+            self.stdout.write(
+                f'Индекс построен за '
+                f'{(time.perf_counter() - start) * 1000:.0f} мс'
+            )
+            rng = random.Random(0)
+            have = [
+                ingredient.id for ingredient in rng.sample(
+                    ingredients[:options['ingredients'] // 10],
+                    options['have']
+                )
+            ]
+            sql, sql_ms = self.timed(lambda: list(
+                Recipe.objects.annotate(
+                    matched=Count(
+                        'ingredients_amount',
+                        filter=Q(ingredients_amount__ingredient_id__in=have)
+                    ),
+                    total=Count('ingredients_amount')
+                ).filter(matched__gt=0).annotate(
+                    coverage=Cast(F('matched'), FloatField()) / F('total')
+                ).order_by('-coverage', '-matched', '-id').values_list(
+                    'id', flat=True
+                )
+            ))
+            index, index_ms = self.timed(lambda: list(
+                IngredientRecipeIndex.objects.coverage(have).values_list(
+                    'recipe_id', flat=True
+                )
+            ))
+            self.stdout.write(
+                f'Кандидатов: SQL {len(sql)}, индекс {len(index)}'
+            )
+            self.stdout.write(f'SQL агрегация   {sql_ms:8.1f} мс')
+            self.stdout.write(f'индекс          {index_ms:8.1f} мс')
+            client = get_client(get_bench_user())
+            query = '&'.join(f'ingredients={pk}' for pk in have)
+            response, api_ms = self.timed(
+                lambda: client.get(URL.format(query))
+            )
+            self.stdout.write(
+                f'API             {api_ms:8.1f} мс, '
+                f'count={response.json()["count"]}'
+            )
+
+    def seed(self, ingredients, count):
+        """Рецепты по INGREDIENTS_PER_RECIPE ингредиентов; частые
+        ингредиенты из начала списка встречаются чаще."""
+        recipe_ids = bulk_create_recipes([get_bench_user()], count)
+        rng = random.Random(0)
+        weights = [1 / (rank + 1) for rank in range(len(ingredients))]
+        for start in range(0, len(recipe_ids), BATCH_SIZE):
+            rows = []
+            for recipe_id in recipe_ids[start:start + BATCH_SIZE]:
+                chosen = {
+                    ingredient.id for ingredient in rng.choices(
+                        ingredients, weights, k=INGREDIENTS_PER_RECIPE
+                    )
+                }
+                rows.extend(
+                    IngredientInRecipe(
+                        recipe_id=recipe_id, ingredient_id=ingredient_id,
+                        amount=1
+                    ) for ingredient_id in chosen
+                )
+            IngredientInRecipe.objects.bulk_create(rows)
@@ -0,0 +1,55 @@
+import time
+from statistics import median
+
+from api.search import ingredient_index
+from api.serializers import IngredientSerializer
+from benchmarks.utils import get_client, rollback_after
+from django.conf import settings
+from django.core.management import BaseCommand, call_command
+from recipes.models import Ingredient
+
+QUERIES = ('а', 'мо', 'сах', 'кури', 'масло', 'сливоч', 'ый', 'соус')
+URL = '/api/ingredients/?name={}'
+
+
+def timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return median(timings)
+
+
+class Command(BaseCommand):
+    help = ('Сравнение поиска ингредиентов через icontains и через '
+            'индекс в памяти.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        with rollback_after():
+            if not Ingredient.objects.exists():
+                call_command('load_ingredients')
+            ingredient_index.get_data()
+            client = get_client()
+            self.stdout.write(
+                f'{"запрос":<10}{"icontains, мс":>15}{"индекс, мс":>13}'
+                f'{"API, мс":>10}'
+            )
+            for query in QUERIES:
+                icontains = timed(lambda: IngredientSerializer(
+                    Ingredient.objects.filter(name__icontains=query),
+                    many=True
+                ).data, repeat)
+                index = timed(
+                    lambda: ingredient_index.search(query, limit), repeat
+                )
+                api = timed(lambda: client.get(URL.format(query)), repeat)
+                self.stdout.write(
+                    f'{query:<10}{icontains:>15.3f}{index:>13.3f}'
+                    f'{api:>10.3f}'
+                )
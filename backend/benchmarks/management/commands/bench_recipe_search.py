@@ -0,0 +1,115 @@
+import random
+import time
+from statistics import median
+
+from api.search import rebuild_recipe_search, search_recipes
+from benchmarks.utils import get_bench_user, get_client, rollback_after
+from django.core.management import BaseCommand
+from django.db.models import Q
+from recipes.models import Recipe
+
+URL = '/api/recipes/?search={}&limit=6'
+BATCH_SIZE = 10000
+ADJECTIVES = (
+    'куриный', 'куриная', 'яблочный', 'яблочное', 'сырный', 'сырная',
+    'грибной', 'грибная', 'овощной', 'овощное', 'томатный', 'томатная',
+    'домашний', 'домашняя', 'пряный', 'пряная', 'сливочный', 'сливочное',
+)
+NOUNS = (
+    'суп', 'супа', 'пирог', 'пирога', 'салат', 'салата', 'соус', 'соуса',
+    'запеканка', 'запеканки', 'рагу', 'каша', 'каши', 'омлет', 'паста',
+    'пирожки', 'котлеты', 'курица', 'курицы', 'курицей', 'яблоко',
+    'яблоки', 'яблоками', 'грибы', 'грибами', 'сыр', 'сыром', 'картофель',
+    'картофелем', 'морковь', 'морковью', 'лук', 'луком', 'молоко',
+    'молоком', 'сметана', 'сметаной', 'тесто', 'теста', 'духовка',
+    'духовке', 'сковорода', 'сковороде', 'минута', 'минут', 'соль',
+)
+VERBS = (
+    'нарезать', 'нарезаем', 'обжарить', 'обжариваем', 'добавить',
+    'добавляем', 'запекать', 'запекаем', 'варить', 'варим', 'посолить',
+    'перемешать', 'перемешиваем', 'подавать', 'подаём', 'остудить',
+)
+SYLLABLES = ('ба', 'ве', 'ги', 'до', 'жу', 'зе', 'ка', 'ли', 'мо', 'ну',
+             'пе', 'ри', 'со', 'ту', 'фа', 'ха')
+COOKING_WORDS_IN_TEXT = 5
+OTHER_WORDS_IN_TEXT = 25
+OTHER_WORDS = 5000
+QUERIES = ('курица', 'яблочный пирог', 'запекать с сыром', 'грибами')
+
+
+class Command(BaseCommand):
+    help = ('Полнотекстовый поиск рецептов: icontains против индекса '
+            'FTS5/GIN на сгенерированном корпусе. Данные откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=200000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def timed(self, func):
+        timings = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return result, median(timings)
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        with rollback_after():
+            self.seed(options['recipes'])
+            start = time.perf_counter()
+            rebuild_recipe_search()
+            self.stdout.write(
+                f'Индекс построен за '
+                f'{(time.perf_counter() - start) * 1000:.0f} мс'
+            )
+            client = get_client(get_bench_user())
+            for query in QUERIES:
+                words = query.split()
+                condition = Q()
+                for word in words:
+                    condition &= (
+                        Q(name__icontains=word) | Q(text__icontains=word)
+                    )
+                contains, contains_ms = self.timed(lambda: self.first_page(
+                    Recipe.objects.filter(condition).order_by('-id')
+                ))
+                found, search_ms = self.timed(lambda: self.first_page(
+                    search_recipes(Recipe.objects.all(), query)
+                ))
+                response, api_ms = self.timed(
+                    lambda: client.get(URL.format(query))
+                )
+                self.stdout.write(
+                    f'«{query}»: icontains {contains_ms:7.1f} мс, '
+                    f'индекс {search_ms:7.1f} мс, API {api_ms:7.1f} мс, '
+                    f'найдено: icontains {contains}, индекс {found}'
+                )
+
+    def first_page(self, queryset):
+        """Как при пагинации: число результатов и первая страница"""
+        list(queryset.values_list('id', flat=True)[:6])
+        return queryset.count()
+
+    def seed(self, count):
+        """Рецепты из кулинарных слов в разных формах и случайных слов,
+        которые изображают словарь настоящих описаний."""
+        author = get_bench_user()
+        rng = random.Random(0)
+        vocabulary = ADJECTIVES + NOUNS + VERBS
+        other_words = [
+            ''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4)))
+            for _ in range(OTHER_WORDS)
+        ]
+        for start in range(0, count, BATCH_SIZE):
+            Recipe.objects.bulk_create(
+                Recipe(
+                    author=author,
+                    name=f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}',
+                    text=' '.join(
+                        rng.choices(vocabulary, k=COOKING_WORDS_IN_TEXT)
+                        + rng.choices(other_words, k=OTHER_WORDS_IN_TEXT)
+                    ),
+                    cooking_time=10,
+                ) for _ in range(start, min(start + BATCH_SIZE, count))
+            )
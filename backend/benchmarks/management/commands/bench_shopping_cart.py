@@ -0,0 +1,58 @@
+from benchmarks.utils import (get_bench_ingredients, get_bench_user,
+                              get_client, measure_streaming, rollback_after)
+from django.core.management import BaseCommand
+from recipes.models import IngredientInRecipe, Recipe, ShoppingCart
+
+URL = '/api/recipes/download_shopping_cart/?format={}'
+
+
+class Command(BaseCommand):
+    help = ('Замер скачивания списка покупок: время до первого байта '
+            'и пиковая память. Данные откатываются после замера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument('--ingredients', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with rollback_after():
+            user = self.seed(options['recipes'], options['ingredients'])
+            client = get_client(user)
+            for file_format in ('txt', 'csv', 'pdf'):
+                for _ in range(options['repeat']):
+                    result = measure_streaming(
+                        client, URL.format(file_format)
+                    )
+                    self.stdout.write(
+                        '{format}: status={status} ttfb={ttfb_ms:.1f}ms '
+                        'total={total_ms:.1f}ms size={size_bytes}B '
+                        'python_peak={python_peak_kb:.0f}KiB '
+                        'peak_rss={peak_rss_mb:.1f}MiB'.format(
+                            format=file_format, **result
+                        )
+                    )
+
+    def seed(self, recipes_count, ingredients_count):
+        user = get_bench_user()
+        ingredients = get_bench_ingredients(ingredients_count * 10)
+        recipes = Recipe.objects.bulk_create(
+            Recipe(author=user, name=f'bench рецепт {i}', text='bench',
+                   cooking_time=10)
+            for i in range(recipes_count)
+        )
+        if recipes and recipes[0].pk is None:
+            recipes = list(Recipe.objects.filter(author=user))
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe=recipe,
+                ingredient=ingredients[(i + j) % len(ingredients)],
+                amount=j + 1
+            )
+            for i, recipe in enumerate(recipes)
+            for j in range(ingredients_count)
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=user, recipe=recipe) for recipe in recipes
+        )
+        return user
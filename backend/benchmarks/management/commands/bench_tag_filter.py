@@ -0,0 +1,70 @@
+import time
+from statistics import median
+
+from benchmarks.utils import (bulk_create_recipes, get_bench_tags,
+                              get_bench_user, get_client, rollback_after)
+from django.core.management import BaseCommand
+from recipes.models import Recipe
+
+URL = '/api/recipes/?{}&limit=6'
+
+
+class Command(BaseCommand):
+    help = ('Фильтрация рецептов по всем тегам: число строк и время для '
+            'JOIN, JOIN с DISTINCT и подзапроса. Данные откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def timed(self, func):
+        timings = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return result, median(timings)
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        with rollback_after():
+            tags = get_bench_tags()
+            slugs = [tag.slug for tag in tags]
+            self.seed(tags, options['recipes'])
+            recipes = Recipe.objects.all()
+            variants = {
+                'join': lambda: recipes.filter(
+                    tags__slug__in=slugs
+                ).count(),
+                'join + distinct': lambda: recipes.filter(
+                    tags__slug__in=slugs
+                ).distinct().count(),
+                'подзапрос': lambda: recipes.filter(
+                    pk__in=Recipe.tags.through.objects.filter(
+                        tag__slug__in=slugs
+                    ).values('recipe_id')
+                ).count(),
+            }
+            for name, func in variants.items():
+                rows, elapsed = self.timed(func)
+                self.stdout.write(
+                    f'{name:<16} строк={rows:<8} {elapsed:8.1f} мс'
+                )
+            client = get_client(get_bench_user())
+            query = '&'.join(f'tags={slug}' for slug in slugs)
+            response, elapsed = self.timed(
+                lambda: client.get(URL.format(query))
+            )
+            self.stdout.write(
+                f'{"API":<16} count={response.json()["count"]:<8} '
+                f'{elapsed:8.1f} мс'
+            )
+
+    def seed(self, tags, count):
+        recipe_ids = bulk_create_recipes([get_bench_user()], count)
+        through = Recipe.tags.through
+        through.objects.bulk_create(
+            (through(recipe_id=recipe_id, tag_id=tag.id)
+             for i, recipe_id in enumerate(recipe_ids)
+             for j, tag in enumerate(tags) if (i >> j) & 1)
+        )
@@ -0,0 +1,178 @@
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+from benchmarks.suite import PERCENTILES, percentile
+from django.conf import settings
+from django.core.management import CommandError
+from recipes.models import Ingredient, Recipe
+
+HOST = '127.0.0.1'
+STARTUP_TIMEOUT = 30
+REQUEST_TIMEOUT = 30
+PATHS = 100
+
+
+def get_paths():
+    """Анонимные запросы к спискам и карточкам рецептов, тегам
+    и поиску ингредиентов"""
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+    if not recipe_ids:
+        raise CommandError(
+            'В базе нет рецептов: запустите с --seed на отдельной базе.'
+        )
+    rng = random.Random(0)
+    names = list(Ingredient.objects.values_list('name', flat=True))
+    paths = []
+    for index in range(PATHS):
+        kind = index % 4
+        if kind == 0:
+            paths.append(f'/api/recipes/?page={rng.randint(1, 20)}&limit=6')
+        elif kind == 1:
+            paths.append(f'/api/recipes/{rng.choice(recipe_ids)}/')
+        elif kind == 2:
+            paths.append('/api/tags/')
+        elif names:
+            prefix = rng.choice(names)[:rng.randint(2, 4)]
+            paths.append(f'/api/ingredients/?name={quote(prefix)}')
+    return paths
+
+
+@contextmanager
+def server(port, env):
+    """gunicorn с gunicorn.conf.py и переменными окружения env. Вместо
+    кэша в памяти процесса серверу даётся общий файловый кэш: процессов
+    может быть несколько."""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache_env = {}
+        if settings.CACHES['default']['BACKEND'].endswith('.LocMemCache'):
+            cache_env = {
+                'CACHE_BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'CACHE_LOCATION': cache_dir,
+            }
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+            cwd=settings.BASE_DIR,
+            env={
+                **os.environ,
+                'GUNICORN_BIND': f'{HOST}:{port}',
+                'DEBUG': 'False',
+                **cache_env,
+                **env,
+            },
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            wait_for_port(port, process)
+            yield
+        finally:
+            process.terminate()
+            process.wait()
+
+
+def wait_for_port(port, process):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(
+                'Сервер завершился при запуске, проверьте '
+                'GUNICORN_PROFILE, CACHE_BACKEND и установку uvicorn.'
+            )
+        try:
+            socket.create_connection((HOST, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError('Сервер не запустился.')
+
+
+def fetch(port, path, headers=None):
+    """Тело ответа на GET, например /metrics"""
+    request = Request(f'http://{HOST}:{port}{path}', headers=headers or {})
+    with urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+        return response.read().decode()
+
+
+async def load(port, paths, connections, duration):
+    """connections клиентов с keep-alive отправляют запросы друг
+    за другом до истечения duration секунд"""
+    timings, errors = [], [0]
+    deadline = time.monotonic() + duration
+
+    async def client(number):
+        reader = writer = None
+        index = number
+        while time.monotonic() < deadline:
+            path = paths[index % len(paths)]
+            index += connections
+            start = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(
+                        HOST, port
+                    )
+                status, keep_alive = await asyncio.wait_for(
+                    request(reader, writer, path), REQUEST_TIMEOUT
+                )
+            except (OSError, IndexError, ValueError,
+                    asyncio.IncompleteReadError, asyncio.TimeoutError):
+                errors[0] += 1
+                keep_alive, status = False, None
+            else:
+                timings.append((time.perf_counter() - start) * 1000)
+                errors[0] += status >= 400
+            if not keep_alive and writer is not None:
+                writer.close()
+                reader = writer = None
+        if writer is not None:
+            writer.close()
+
+    started = time.monotonic()
+    await asyncio.gather(*(client(number) for number in range(connections)))
+    elapsed = time.monotonic() - started
+    if not timings:
+        raise CommandError('Ни один запрос не выполнен.')
+    return {
+        'requests': len(timings),
+        'errors': errors[0],
+        'throughput_rps': round(len(timings) / elapsed, 1),
+        **{f'p{percent}_ms': round(percentile(timings, percent), 1)
+           for percent in PERCENTILES},
+    }
+
+
+async def request(reader, writer, path):
+    """GET по HTTP/1.1: статус и можно ли переиспользовать соединение"""
+    writer.write(
+        f'GET {path} HTTP/1.1\r\nHost: {HOST}\r\n\r\n'.encode('latin1')
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode('latin1').strip()
+        if not line:
+            break
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip().lower()
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get('connection') != 'close'
@@ -0,0 +1,136 @@
+import io
+import random
+import time
+from contextlib import contextmanager, redirect_stdout
+
+from api.search import rebuild_recipe_search
+from benchmarks.utils import (bulk_create_recipes, get_bench_ingredients,
+                              get_bench_tags)
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from recipes.models import (FavoriteRecipe, Ingredient, IngredientInRecipe,
+                            IngredientRecipeIndex, Recipe, ShoppingCart,
+                            ShoppingCartIngredient)
+from recipes.popularity import update_popularity
+from users.models import Follow
+
+User = get_user_model()
+PERCENTILES = (50, 95, 99)
+
+
+def seed_dataset(users, recipes, follows, favorites, cart,
+                 ingredients_per_recipe, seed=0):
+    """Пользователи, рецепты с тегами и ингредиентами, подписки,
+    избранное и корзины. Ингредиенты и теги берутся из load_ingredients
+    и load_tags. Производные данные (счётчики, списки покупок, индексы)
+    пересобираются, как после загрузки в обход API."""
+    rng = random.Random(seed)
+    if not Ingredient.objects.exists():
+        call_command('load_ingredients')
+    ingredients = list(
+        Ingredient.objects.values_list('id', flat=True)
+    ) or [ingredient.id for ingredient in get_bench_ingredients(2000)]
+    tags = get_bench_tags()
+    usernames = [f'bench_{i}' for i in range(users)]
+    User.objects.bulk_create(
+        (User(username=username, email=f'{username}@bench.local')
+         for username in usernames)
+    )
+    authors = list(User.objects.filter(username__in=usernames))
+    user_ids = [user.id for user in authors]
+    recipe_ids = bulk_create_recipes(authors, recipes)
+    bulk_create(
+        Recipe.tags.through(recipe_id=recipe_id, tag_id=tag.id)
+        for recipe_id in recipe_ids
+        for tag in rng.sample(tags, rng.randint(1, len(tags)))
+    )
+    # индекс пересобирается целиком ниже
+    with IngredientRecipeIndex.objects.deferred():
+        bulk_create(
+            IngredientInRecipe(recipe_id=recipe_id,
+                               ingredient_id=ingredient_id,
+                               amount=rng.randint(1, 500))
+            for recipe_id in recipe_ids
+            for ingredient_id in rng.sample(ingredients,
+                                            ingredients_per_recipe)
+        )
+    bulk_create(
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id in user_ids
+        for author_id in rng.sample(user_ids, min(follows, users))
+        if author_id != user_id
+    )
+    for model, per_user in ((FavoriteRecipe, favorites),
+                            (ShoppingCart, cart)):
+        bulk_create(
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in rng.sample(recipe_ids, min(per_user, recipes))
+        )
+    with redirect_stdout(io.StringIO()):
+        call_command('rebuild_counters')
+    ShoppingCartIngredient.objects.rebuild()
+    IngredientRecipeIndex.objects.rebuild()
+    rebuild_recipe_search()
+    update_popularity()
+    return authors, recipe_ids, tags
+
+
+def bulk_create(objects):
+    model_objects = list(objects)
+    if model_objects:
+        type(model_objects[0]).objects.bulk_create(model_objects)
+
+
+@contextmanager
+def count_queries():
+    """Считает запросы к базе без включения DEBUG"""
+    counter = [0]
+
+    def wrapper(execute, sql, params, many, context):
+        counter[0] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield counter
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу"""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[rank - 1]
+
+
+def run_scenario(clients, urls, requests, warmup):
+    """Выполняет requests запросов по кругу клиентов и адресов.
+    Потоковые ответы читаются целиком, как их получил бы клиент."""
+    def call(index):
+        response = clients[index % len(clients)].get(urls[index % len(urls)])
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    for index in range(warmup):
+        call(index)
+    timings, queries, errors = [], [], 0
+    for index in range(warmup, warmup + requests):
+        with count_queries() as counter:
+            start = time.perf_counter()
+            response = call(index)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(counter[0])
+        errors += response.status_code >= 400
+    total = sum(timings) / 1000
+    return {
+        'requests': requests,
+        'errors': errors,
+        **{f'p{percent}_ms': round(percentile(timings, percent), 2)
+           for percent in PERCENTILES},
+        'mean_ms': round(total * 1000 / requests, 2),
+        'max_ms': round(max(timings), 2),
+        'throughput_rps': round(requests / total, 1),
+        'queries_per_request': round(sum(queries) / requests, 2),
+        'max_queries': max(queries),
+    }
@@ -0,0 +1,98 @@
+import resource
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import transaction
+from recipes.models import Ingredient, Recipe, Tag
+from rest_framework.test import APIClient
+
+User = get_user_model()
+BENCH_PASSWORD = 'bench-password'
+
+
+@contextmanager
+def rollback_after():
+    """Выполняет замер в транзакции и откатывает созданные данные"""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def get_bench_user(username='bench_user'):
+    user, _ = User.objects.get_or_create(
+        username=username,
+        defaults={'email': f'{username}@bench.local'}
+    )
+    return user
+
+
+def get_bench_ingredients(count):
+    """Ингредиенты из базы, недостающие создаются"""
+    ingredients = list(Ingredient.objects.all()[:count])
+    if len(ingredients) < count:
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'bench ингредиент {i}', measurement_unit='г')
+            for i in range(len(ingredients), count)
+        )
+        ingredients = list(Ingredient.objects.all()[:count])
+    return ingredients
+
+
+def get_bench_tags():
+    if not Tag.objects.exists():
+        call_command('load_tags')
+    return list(Tag.objects.all())
+
+
+def bulk_create_recipes(authors, count, **fields):
+    """Создаёт count рецептов по кругу у авторов, возвращает их id.
+
+    SQLite не возвращает id из bulk_create, поэтому они выбираются
+    отдельным запросом по авторам.
+    """
+    fields = {'text': 'bench', 'cooking_time': 10, **fields}
+    Recipe.objects.bulk_create(
+        (Recipe(author=authors[i % len(authors)], name=f'bench рецепт {i}',
+                **fields) for i in range(count))
+    )
+    return list(Recipe.objects.filter(
+        author__in=authors
+    ).order_by('id').values_list('id', flat=True))
+
+
+def get_client(user=None):
+    client = APIClient()
+    if user is not None:
+        client.force_authenticate(user)
+    return client
+
+
+def peak_rss_mb():
+    """Пиковый RSS процесса в мегабайтах (ru_maxrss в KiB на Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure_streaming(client, url):
+    """Время до первого байта, полное время, размер и пик памяти Python
+    при чтении потокового ответа."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get(url)
+    chunks = iter(response.streaming_content)
+    first = next(chunks, b'')
+    ttfb = time.perf_counter() - start
+    size = len(first) + sum(len(chunk) for chunk in chunks)
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'status': response.status_code,
+        'ttfb_ms': ttfb * 1000,
+        'total_ms': total * 1000,
+        'size_bytes': size,
+        'python_peak_kb': peak / 1024,
+        'peak_rss_mb': peak_rss_mb(),
+    }
@@ -0,0 +1,73 @@
+"""
+ASGI config for foodgram project.
+
+Запросы разбираются по foodgram.urls_asgi: чтения рецептов, тегов
+и ингредиентов обслуживают асинхронные представления api.async_views,
+остальное — обычные синхронные представления.
+
+Django 3.2 читает тело потокового ответа в цикле событий, а генераторы
+списка покупок обращаются к базе, что там запрещено. Поэтому потоковые
+ответы читаются в отдельном потоке, в нём же ответ и закрывается.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.core.handlers.asgi import ASGIHandler
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+ASGI_URLCONF = 'foodgram.urls_asgi'
+
+
+class FoodgramASGIHandler(ASGIHandler):
+
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = ASGI_URLCONF
+        return request, error_response
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        headers = [
+            (str(header).encode('ascii'), str(value).encode('latin1'))
+            for header, value in response.items()
+        ]
+        headers += [
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+            for cookie in response.cookies.values()
+        ]
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+        loop = asyncio.get_running_loop()
+        # один поток на ответ: курсор генератора живёт в его соединении
+        with ThreadPoolExecutor(1) as executor:
+            try:
+                parts = iter(response)
+                while True:
+                    part = await loop.run_in_executor(
+                        executor, next, parts, None
+                    )
+                    if part is None:
+                        break
+                    for chunk, _ in self.chunk_bytes(part):
+                        await send({
+                            'type': 'http.response.body',
+                            'body': chunk,
+                            'more_body': True,
+                        })
+                await send({'type': 'http.response.body'})
+            finally:
+                # request_finished закрывает соединения потока ответа
+                await loop.run_in_executor(executor, response.close)
+
+
+django.setup(set_prefix=False)
+application = FoodgramASGIHandler()
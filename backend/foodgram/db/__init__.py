@@ -0,0 +1,14 @@
+from django.db import connections
+from django.dispatch import Signal
+
+# Открыто новое соединение с базой (не взято из пула)
+connection_opened = Signal()
+
+
+def check_connections(**kwargs):
+    """В начале запроса помечает соединения для проверки: соединение,
+    оставшееся от прошлых запросов, проверяется один раз при первом
+    обращении и закрывается, если оборвалось (например, после
+    перезапуска базы). Аналог CONN_HEALTH_CHECKS из Django 4.1."""
+    for connection in connections.all():
+        connection.health_check_done = False
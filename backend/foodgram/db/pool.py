@@ -0,0 +1,168 @@
+import os
+from functools import partial
+from threading import BoundedSemaphore, Lock
+
+from django.conf import settings
+from django.db import OperationalError
+
+from . import connection_opened
+
+pools = {}
+pools_lock = Lock()
+
+
+class ConnectionPool:
+    """Пул соединений процесса: не больше size открытых соединений,
+    при исчерпании запрос ждёт освободившееся до timeout секунд."""
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.slots = BoundedSemaphore(size)
+        self.lock = Lock()
+        self.idle_connections = []
+        self.opened = 0
+        self.in_use = 0
+
+    @property
+    def idle(self):
+        return len(self.idle_connections)
+
+    def acquire(self, connect):
+        """Соединение и признак того, что оно уже использовалось"""
+        if not self.slots.acquire(timeout=self.timeout):
+            raise OperationalError(
+                f'Нет свободного соединения в пуле за {self.timeout} с'
+            )
+        try:
+            with self.lock:
+                reused = bool(self.idle_connections)
+                connection = (
+                    self.idle_connections.pop() if reused else None
+                )
+                self.in_use += 1
+            if connection is None:
+                connection = connect()
+                with self.lock:
+                    self.opened += 1
+            return connection, reused
+        except BaseException:
+            with self.lock:
+                self.in_use -= 1
+            self.slots.release()
+            raise
+
+    def release(self, connection, discard=False):
+        try:
+            if not discard:
+                try:
+                    connection.rollback()
+                except Exception:
+                    discard = True
+            if discard:
+                with self.lock:
+                    self.opened -= 1
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+            else:
+                with self.lock:
+                    self.idle_connections.append(connection)
+        finally:
+            with self.lock:
+                self.in_use -= 1
+            self.slots.release()
+
+
+def get_pool(alias, settings_dict):
+    # Ключ с pid: после fork соединения родителя использовать нельзя.
+    # NAME меняется при создании тестовой базы.
+    key = (alias, settings_dict['NAME'], os.getpid())
+    with pools_lock:
+        if key not in pools:
+            pools[key] = ConnectionPool(
+                settings_dict['POOL_SIZE'],
+                settings_dict.get('POOL_TIMEOUT', settings.DB_POOL_TIMEOUT)
+            )
+        return pools[key]
+
+
+def get_pools():
+    """Пулы текущего процесса по псевдониму базы"""
+    pid = os.getpid()
+    with pools_lock:
+        return {
+            alias: pool for (alias, name, pool_pid), pool in pools.items()
+            if pool_pid == pid
+        }
+
+
+class PooledDatabaseWrapperMixin:
+    """Соединение с базой для DatabaseWrapper бэкенда.
+
+    Если у базы задан POOL_SIZE, соединения берутся из пула процесса,
+    а закрытие возвращает их в пул; взятое повторно соединение
+    проверяется при DB_HEALTH_CHECKS. Без POOL_SIZE поведение
+    стандартное. О каждом новом соединении сообщает connection_opened.
+    Постоянное соединение проверяется при первом обращении в запросе,
+    если check_connections сбросил health_check_done.
+    """
+    health_check_done = True
+
+    @property
+    def pool(self):
+        if not self.settings_dict.get('POOL_SIZE'):
+            return None
+        return get_pool(self.alias, self.settings_dict)
+
+    def open_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        connection_opened.send(sender=self.__class__, connection=self)
+        return connection
+
+    def connect(self):
+        self.health_check_done = True
+        super().connect()
+
+    def ensure_connection(self):
+        if (self.connection is not None and not self.health_check_done
+                and not self.in_atomic_block):
+            self.health_check_done = True
+            if not self.is_usable():
+                self.close()
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self):
+        # Вызывается в начале и конце запроса и обращается к соединению:
+        # проверка нужна только при первом обращении из кода запроса
+        self.health_check_done = True
+        super().close_if_unusable_or_obsolete()
+
+    def get_new_connection(self, conn_params):
+        connect = partial(self.open_connection, conn_params)
+        pool = self.pool
+        if pool is None:
+            return connect()
+        while True:
+            connection, reused = pool.acquire(connect)
+            if (not reused or not settings.DB_HEALTH_CHECKS
+                    or self.is_usable_connection(connection)):
+                return connection
+            pool.release(connection, discard=True)
+
+    def is_usable_connection(self, connection):
+        current, self.connection = self.connection, connection
+        try:
+            return self.is_usable()
+        finally:
+            self.connection = current
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        pool.release(
+            self.connection,
+            discard=bool(getattr(self.connection, 'closed', False))
+        )
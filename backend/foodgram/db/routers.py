@@ -0,0 +1,48 @@
+from contextlib import contextmanager
+from threading import local
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+state = local()
+
+
+def get_read_database():
+    return getattr(state, 'read_database', None)
+
+
+@contextmanager
+def route_reads(alias):
+    """Чтения в блоке идут в базу alias; None — в основную"""
+    previous = get_read_database()
+    state.read_database = alias
+    try:
+        yield
+    finally:
+        state.read_database = previous
+
+
+class ReplicaRouter:
+    """Направляет чтения в реплику, выбранную route_reads.
+
+    Запись и чтение внутри транзакции основной базы всегда идут в
+    основную базу. Реплики не мигрируются: схему и данные они получают
+    репликацией.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = get_read_database()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
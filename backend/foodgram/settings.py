@@ -1,5 +1,6 @@
 import os
 
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -33,6 +34,9 @@ INSTALLED_APPS = [
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
+    'benchmarks.apps.BenchmarksConfig',
+    'taskqueue.apps.TaskqueueConfig',
+    'metrics.apps.MetricsConfig',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -40,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'metrics.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -72,18 +77,81 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Бэкенды проекта расширяют стандартные пулом соединений (POOL_SIZE)
+DB_BACKENDS = {
+    'django.db.backends.postgresql': 'foodgram.db.backends.postgresql',
+    'django.db.backends.postgresql_psycopg2':
+        'foodgram.db.backends.postgresql',
+    'django.db.backends.sqlite3': 'foodgram.db.backends.sqlite3',
+}
+DB_ENGINE = os.getenv('DB_ENGINE', default='django.db.backends.sqlite3')
+# Соединений с базой в пуле процесса; 0 — без пула
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', default=0))
+# Сколько секунд ждать свободного соединения пула
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', default=10))
+# Проверять соединение, оставшееся от прошлого запроса или взятое из пула
+DB_HEALTH_CHECKS = os.getenv('DB_HEALTH_CHECKS', default='True') == 'True'
+
 DATABASES = {
     'default': {
-        'ENGINE': os.getenv('DB_ENGINE', default='django.db.backends.sqlite3'),
+        'ENGINE': DB_BACKENDS.get(DB_ENGINE, DB_ENGINE),
         'NAME': os.getenv('DB_NAME',
                           default=os.path.join(BASE_DIR, 'db.sqlite3')),
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default=5432)
+        'PORT': os.getenv('DB_PORT', default=5432),
+        # С пулом соединение возвращается в пул в конце каждого запроса
+        'CONN_MAX_AGE': 0 if DB_POOL_SIZE else int(
+            os.getenv('DB_CONN_MAX_AGE', default=60)
+        ),
+        'POOL_SIZE': DB_POOL_SIZE,
     }
 }
 
+# Реплики только для чтения: HOST для PostgreSQL или файлы для SQLite
+DB_REPLICAS = [
+    replica for replica in os.getenv('DB_REPLICAS', default='').split(',')
+    if replica
+]
+DATABASE_REPLICAS = [
+    f'replica_{number}' for number in range(1, len(DB_REPLICAS) + 1)
+]
+for alias, replica in zip(DATABASE_REPLICAS, DB_REPLICAS):
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME' if 'sqlite' in DB_ENGINE else 'HOST': replica,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['foodgram.db.routers.ReplicaRouter']
+# Сколько секунд после записи читать с основной базы: больше задержки
+# репликации
+DB_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', default=5))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+
+# Версии справочников в кэше должны быть общими для процессов: с
+# локальным кэшем каждый процесс не видит изменений, сделанных в других
+GUNICORN_WORKERS = int(os.getenv('GUNICORN_WORKERS', default=1))
+if (GUNICORN_WORKERS > 1
+        and CACHES['default']['BACKEND'].endswith('.LocMemCache')):
+    raise ImproperlyConfigured(
+        f'GUNICORN_WORKERS={GUNICORN_WORKERS} требует общего кэша: задайте '
+        'CACHE_BACKEND, например django.core.cache.backends.db.DatabaseCache'
+    )
+
+REFERENCE_CACHE_TIMEOUT = int(
+    os.getenv('REFERENCE_CACHE_TIMEOUT', default=600)
+)
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -124,7 +192,83 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+# Схема создана с 32-битными id (AutoField), менять их тип миграциями
+# не нужно
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', default=20))
+INGREDIENT_SEARCH_INDEX_TTL = int(
+    os.getenv('INGREDIENT_SEARCH_INDEX_TTL', default=300)
+)
+INGREDIENT_SEARCH_TRIGRAM = os.getenv(
+    'INGREDIENT_SEARCH_TRIGRAM', default='False'
+) == 'True'
+
+RECIPE_IMAGE_WIDTHS = tuple(
+    int(width) for width in os.getenv(
+        'RECIPE_IMAGE_WIDTHS', default='320,640,1280'
+    ).split(',')
+)
+RECIPE_IMAGE_QUALITY = int(os.getenv('RECIPE_IMAGE_QUALITY', default=80))
+# Максимум id в одном пакетном запросе (избранное, корзина, подписки)
+BULK_IDS_LIMIT = int(os.getenv('BULK_IDS_LIMIT', default=100))
+RECIPE_POPULARITY_HALF_LIFE_DAYS = float(
+    os.getenv('RECIPE_POPULARITY_HALF_LIFE_DAYS', default=7)
+)
+RECIPE_POPULARITY_WINDOW_DAYS = int(
+    os.getenv('RECIPE_POPULARITY_WINDOW_DAYS', default=60)
+)
+
+# Потоков для запросов к базе асинхронных представлений (профиль asgi)
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', default=20))
+
+TASKS_EAGER = os.getenv('TASKS_EAGER', default='False') == 'True'
+TASKS_WORKER_PROCESSES = int(os.getenv('TASKS_WORKER_PROCESSES', default=2))
+TASKS_POLL_INTERVAL = float(os.getenv('TASKS_POLL_INTERVAL', default=1))
+TASKS_MAX_ATTEMPTS = int(os.getenv('TASKS_MAX_ATTEMPTS', default=3))
+TASKS_RETRY_DELAY = int(os.getenv('TASKS_RETRY_DELAY', default=10))
+TASKS_LOCK_TIMEOUT = int(os.getenv('TASKS_LOCK_TIMEOUT', default=600))
+TASKS_KEEP_DAYS = int(os.getenv('TASKS_KEEP_DAYS', default=7))
+
+# Только для замеров: искусственная задержка каждого запроса к базе
+BENCH_DB_LATENCY_MS = float(os.getenv('BENCH_DB_LATENCY_MS', default=0))
+BENCH_DB_CONNECT_LATENCY_MS = float(
+    os.getenv('BENCH_DB_CONNECT_LATENCY_MS', default=0)
+)
+
+PERF_METRICS_ENABLED = os.getenv(
+    'PERF_METRICS_ENABLED', default='True'
+) == 'True'
+PERF_SAMPLE_RATE = float(os.getenv('PERF_SAMPLE_RATE', default=0.05))
+PERF_QUERY_BUDGET = int(os.getenv('PERF_QUERY_BUDGET', default=20))
+PERF_LOG_JSON = os.getenv('PERF_LOG_JSON', default='False') == 'True'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'metrics': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'metrics': {
+            'handlers': ['metrics'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
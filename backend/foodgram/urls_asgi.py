@@ -0,0 +1,12 @@
+"""Адреса для профиля asgi: те же, что в foodgram.urls, но чтения
+рецептов, тегов и ингредиентов обслуживают асинхронные представления
+(api.urls_asgi)."""
+from django.contrib import admin
+from django.urls import include, path
+from metrics.views import metrics
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
+    path('api/', include('api.urls_asgi', namespace='api')),
+]
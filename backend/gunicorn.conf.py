@@ -0,0 +1,36 @@
+"""Профили запуска gunicorn, выбираются переменной GUNICORN_PROFILE.
+
+sync — синхронные процессы: медленный запрос к базе занимает процесс
+целиком; gthread — процессы с пулом потоков GUNICORN_THREADS;
+asgi — uvicorn с асинхронными представлениями чтения и пулом потоков
+ASGI_THREADS для запросов к базе (foodgram.asgi).
+"""
+import os
+
+PROFILES = {
+    'sync': {
+        'wsgi_app': 'foodgram.wsgi:application',
+        'worker_class': 'sync',
+    },
+    'gthread': {
+        'wsgi_app': 'foodgram.wsgi:application',
+        'worker_class': 'gthread',
+    },
+    'asgi': {
+        'wsgi_app': 'foodgram.asgi:application',
+        'worker_class': 'uvicorn.workers.UvicornWorker',
+    },
+}
+
+profile = os.getenv('GUNICORN_PROFILE', default='sync')
+if profile not in PROFILES:
+    raise RuntimeError(
+        f'Неизвестный GUNICORN_PROFILE {profile!r}, '
+        f'доступны: {", ".join(PROFILES)}'
+    )
+
+wsgi_app = PROFILES[profile]['wsgi_app']
+worker_class = PROFILES[profile]['worker_class']
+bind = os.getenv('GUNICORN_BIND', default='0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', default=1))
+threads = int(os.getenv('GUNICORN_THREADS', default=20))
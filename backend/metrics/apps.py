@@ -0,0 +1,15 @@
+from django.apps import AppConfig
+from foodgram.db import connection_opened
+
+from .registry import registry
+
+
+def count_connection(sender, connection, **kwargs):
+    registry.observe_connection(connection.alias)
+
+
+class MetricsConfig(AppConfig):
+    name = 'metrics'
+
+    def ready(self):
+        connection_opened.connect(count_connection)
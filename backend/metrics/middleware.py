@@ -0,0 +1,169 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack
+from threading import Lock
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .registry import registry
+
+logger = logging.getLogger('metrics')
+
+UNRESOLVED_VIEW = '<unresolved>'
+METRICS_VIEW = 'metrics'
+
+
+class RequestSample:
+    """Подробные замеры одного запроса, попавшего в выборку"""
+
+    def __init__(self):
+        self.query_count = 0
+        self.db_seconds = 0
+        self.render_seconds = 0
+        self.render_started = None
+        self.statements = Counter()
+        # асинхронные представления выполняют запросы в нескольких потоках
+        self.lock = Lock()
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self.lock:
+                self.db_seconds += time.perf_counter() - start
+                self.query_count += 1
+                self.statements[sql] += 1
+
+    def start_render(self, response):
+        self.render_started = time.perf_counter()
+        response.add_post_render_callback(self.finish_render)
+
+    def finish_render(self, response):
+        self.render_seconds += time.perf_counter() - self.render_started
+
+
+def get_view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else UNRESOLVED_VIEW
+
+
+def count_stream(view, content):
+    size = 0
+    for chunk in content:
+        size += len(chunk)
+        yield chunk
+    registry.add_response_bytes(view, size)
+
+
+class PerformanceMiddleware:
+    """Метрики запросов по имени представления для /metrics.
+
+    Время ответа и статус записываются для каждого запроса. Число
+    и время запросов к базе, время рендеринга и проверка бюджета
+    запросов собираются для доли PERF_SAMPLE_RATE запросов: перехват
+    запросов к базе стоит дороже простого замера времени.
+
+    Под ASGI миддлвара асинхронная: запросы к базе асинхронных
+    представлений перехватываются в потоках, где они выполняются
+    (api.async_views), по request.perf_sample.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PERF_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # так Django узнаёт асинхронный __call__, как у MiddlewareMixin
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        sample = self.start_sample(request)
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            if sample is not None:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(sample.record_query)
+                    )
+            response = self.get_response(request)
+        return self.finish(request, response, sample, start)
+
+    async def __acall__(self, request):
+        sample = self.start_sample(request)
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        return self.finish(request, response, sample, start)
+
+    def start_sample(self, request):
+        if random.random() < settings.PERF_SAMPLE_RATE:
+            request.perf_sample = RequestSample()
+            return request.perf_sample
+        return None
+
+    def finish(self, request, response, sample, start):
+        duration = time.perf_counter() - start
+        view = get_view_name(request)
+        if view == METRICS_VIEW:
+            return response
+        registry.observe_request(
+            view, request.method, response.status_code, duration
+        )
+        size = None
+        if response.streaming:
+            response.streaming_content = count_stream(
+                view, response.streaming_content
+            )
+        else:
+            size = len(response.content)
+            registry.add_response_bytes(view, size)
+        if sample is not None:
+            self.record_sample(request, response, view, sample, duration,
+                               size)
+        return response
+
+    def process_template_response(self, request, response):
+        sample = getattr(request, 'perf_sample', None)
+        if sample is not None:
+            sample.start_render(response)
+        return response
+
+    def record_sample(self, request, response, view, sample, duration,
+                      size):
+        over_budget = sample.query_count > settings.PERF_QUERY_BUDGET
+        registry.observe_sample(view, sample, over_budget)
+        if over_budget:
+            statement, repeats = sample.statements.most_common(1)[0]
+            logger.warning(
+                'Превышен бюджет запросов в %s: %s запросов к базе при '
+                'бюджете %s', view, sample.query_count,
+                settings.PERF_QUERY_BUDGET
+            )
+            if repeats > 1:
+                logger.warning(
+                    'Возможный N+1 в %s, запрос выполнен %s раз: %s',
+                    view, repeats, statement
+                )
+        if settings.PERF_LOG_JSON:
+            logger.info(json.dumps({
+                'view': view,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 2),
+                'db_queries': sample.query_count,
+                'db_ms': round(sample.db_seconds * 1000, 2),
+                'render_ms': round(sample.render_seconds * 1000, 2),
+                'response_bytes': size,
+                'over_budget': over_budget,
+            }, ensure_ascii=False))
@@ -0,0 +1,173 @@
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from threading import Lock
+
+from foodgram.db.pool import get_pools
+
+PREFIX = 'foodgram'
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace(
+        '\n', r'\n'
+    )
+
+
+def format_labels(labels):
+    return ','.join(f'{name}="{escape(value)}"' for name, value in labels)
+
+
+class MetricsRegistry:
+    """Метрики запросов текущего процесса в текстовом формате Prometheus.
+
+    Каждый процесс сервера копит свои значения, поэтому при нескольких
+    процессах gunicorn один опрос /metrics видит только один из них.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = Counter()
+            self.durations = defaultdict(
+                lambda: Histogram(DURATION_BUCKETS)
+            )
+            self.sampled = Counter()
+            self.queries = defaultdict(lambda: Histogram(QUERY_BUCKETS))
+            self.db_seconds = Counter()
+            self.render_seconds = Counter()
+            self.response_bytes = Counter()
+            self.budget_exceeded = Counter()
+            self.connections_opened = Counter()
+
+    def observe_request(self, view, method, status, duration):
+        with self.lock:
+            self.requests[view, method, status] += 1
+            self.durations[view].observe(duration)
+
+    def observe_sample(self, view, sample, over_budget):
+        with self.lock:
+            self.sampled[view] += 1
+            self.queries[view].observe(sample.query_count)
+            self.db_seconds[view] += sample.db_seconds
+            self.render_seconds[view] += sample.render_seconds
+            self.budget_exceeded[view] += over_budget
+
+    def add_response_bytes(self, view, size):
+        with self.lock:
+            self.response_bytes[view] += size
+
+    def observe_connection(self, alias):
+        with self.lock:
+            self.connections_opened[alias] += 1
+
+    def render(self):
+        lines = []
+
+        def metric(name, kind, description, samples):
+            lines.append(f'# HELP {PREFIX}_{name} {description}')
+            lines.append(f'# TYPE {PREFIX}_{name} {kind}')
+            for suffix, labels, value in samples:
+                lines.append(
+                    f'{PREFIX}_{name}{suffix}{{{format_labels(labels)}}} '
+                    f'{value}'
+                )
+
+        def counter(name, description, values, label_names=('view',)):
+            metric(name, 'counter', description, (
+                ('', zip(label_names, key if isinstance(key, tuple)
+                         else (key,)), value)
+                for key, value in sorted(values.items())
+            ))
+
+        def gauge(name, description, values):
+            metric(name, 'gauge', description, (
+                ('', (('alias', alias),), value)
+                for alias, value in sorted(values.items())
+            ))
+
+        def histogram(name, description, histograms):
+            samples = []
+            for view, item in sorted(histograms.items()):
+                total = 0
+                for bound, count in zip(
+                    item.buckets + ('+Inf',), item.counts
+                ):
+                    total += count
+                    samples.append(
+                        ('_bucket', (('view', view), ('le', bound)), total)
+                    )
+                samples.append(('_sum', (('view', view),), item.sum))
+                samples.append(('_count', (('view', view),), total))
+            metric(name, 'histogram', description, samples)
+
+        with self.lock:
+            counter(
+                'http_requests_total',
+                'Запросы по представлению, методу и статусу.',
+                self.requests, ('view', 'method', 'status')
+            )
+            histogram(
+                'http_request_duration_seconds',
+                'Полное время обработки запроса.', self.durations
+            )
+            counter(
+                'sampled_requests_total',
+                'Запросы, для которых собраны подробные метрики.',
+                self.sampled
+            )
+            histogram(
+                'db_queries', 'Запросов к базе на запрос (по выборке).',
+                self.queries
+            )
+            counter(
+                'db_duration_seconds_total',
+                'Время запросов к базе (по выборке).', self.db_seconds
+            )
+            counter(
+                'render_duration_seconds_total',
+                'Время сериализации ответа рендерером (по выборке).',
+                self.render_seconds
+            )
+            counter(
+                'response_size_bytes_total', 'Объём ответов.',
+                self.response_bytes
+            )
+            counter(
+                'query_budget_exceeded_total',
+                'Запросы, превысившие PERF_QUERY_BUDGET: признак N+1.',
+                self.budget_exceeded
+            )
+            counter(
+                'db_connections_opened_total',
+                'Открытые соединения с базой (без взятых из пула).',
+                self.connections_opened, ('alias',)
+            )
+        pools = get_pools()
+        for name, description in (
+            ('opened', 'Открытых соединений пула.'),
+            ('idle', 'Свободных соединений в пуле.'),
+            ('in_use', 'Соединений пула, занятых запросами.'),
+        ):
+            gauge(f'db_pool_{name}', description, {
+                alias: getattr(pool, name) for alias, pool in pools.items()
+            })
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
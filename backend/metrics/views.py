@@ -0,0 +1,24 @@
+from http import HTTPStatus
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+from .registry import registry
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def metrics(request):
+    """Метрики в текстовом формате Prometheus. Нужен заголовок
+    Authorization: Bearer <METRICS_TOKEN>; без токена метрики доступны
+    только при DEBUG."""
+    if not settings.METRICS_TOKEN:
+        if not settings.DEBUG:
+            return HttpResponse(status=HTTPStatus.FORBIDDEN)
+    elif not constant_time_compare(
+        request.META.get('HTTP_AUTHORIZATION', ''),
+        f'Bearer {settings.METRICS_TOKEN}'
+    ):
+        return HttpResponse(status=HTTPStatus.UNAUTHORIZED)
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
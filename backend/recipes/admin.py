@@ -1,7 +1,8 @@
 from django.contrib import admin
 
 from .models import (FavoriteRecipe, Ingredient, IngredientInRecipe, Recipe,
-                     ShoppingCart, Tag)
+                     RecipeImageVariant, ShoppingCart, ShoppingCartIngredient,
+                     Tag)
 
 
 @admin.register(Tag)
@@ -20,14 +21,18 @@ class IngredientInRecipeAdmin(admin.ModelAdmin):
     pass
 
 
+class RecipeImageVariantInline(admin.TabularInline):
+    model = RecipeImageVariant
+    extra = 0
+    readonly_fields = ('width', 'format', 'image')
+
+
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author')
+    list_display = ('name', 'author', 'favorites_count')
+    inlines = (RecipeImageVariantInline,)
     list_filter = ('name', 'author', 'tags')
-    readonly_fields = ('count_favorites',)
-
-    def count_favorites(self, obj):
-        return obj.favorites.count()
+    readonly_fields = ('favorites_count', 'cart_count', 'popularity')
 
 
 @admin.register(FavoriteRecipe)
@@ -38,3 +43,9 @@ class FavoriteRecipeAdmin(admin.ModelAdmin):
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
     pass
+
+
+@admin.register(ShoppingCartIngredient)
+class ShoppingCartIngredientAdmin(admin.ModelAdmin):
+    list_display = ('user', 'ingredient', 'amount')
+    list_filter = ('user',)
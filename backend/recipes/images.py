@@ -0,0 +1,68 @@
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import Recipe, RecipeImageVariant
+
+logger = logging.getLogger(__name__)
+
+PIL_FORMATS = {
+    RecipeImageVariant.WEBP: 'WEBP',
+    RecipeImageVariant.JPEG: 'JPEG',
+}
+
+
+def get_widths(original_width):
+    """Ширины копий, не больше исходной; маленькое изображение
+    сохраняется одной копией в исходную ширину."""
+    widths = [
+        width for width in settings.RECIPE_IMAGE_WIDTHS
+        if width <= original_width
+    ]
+    return widths or [original_width]
+
+
+def render_variant(image, width, variant_format):
+    height = max(round(image.height * width / image.width), 1)
+    buffer = BytesIO()
+    image.resize((width, height), Image.LANCZOS).save(
+        buffer, PIL_FORMATS[variant_format],
+        quality=settings.RECIPE_IMAGE_QUALITY, optimize=True
+    )
+    return ContentFile(buffer.getvalue())
+
+
+def create_image_variants(recipe_id):
+    """Создаёт копии изображения рецепта без метаданных во всех
+    форматах и ширинах, старые копии удаляются."""
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return
+    stem = os.path.splitext(os.path.basename(recipe.image.name))[0]
+    with recipe.image.open('rb') as file, Image.open(file) as original:
+        image = ImageOps.exif_transpose(original).convert('RGB')
+    variants = []
+    for width in get_widths(image.width):
+        for variant_format in PIL_FORMATS:
+            variant = RecipeImageVariant(
+                recipe=recipe, width=width, format=variant_format
+            )
+            variant.image.save(
+                f'{stem}_{width}.{variant_format}',
+                render_variant(image, width, variant_format),
+                save=False
+            )
+            variants.append(variant)
+    with transaction.atomic():
+        old_variants = list(recipe.image_variants.all())
+        recipe.image_variants.all().delete()
+        RecipeImageVariant.objects.bulk_create(variants)
+        Recipe.objects.filter(pk=recipe_id).update(updated_at=timezone.now())
+    for variant in old_variants:
+        variant.image.delete(save=False)
@@ -2,6 +2,7 @@ from csv import DictReader
 
 from django.core.management import BaseCommand
 from recipes.models import Ingredient
+from recipes.versions import bump_version
 
 ALREADY_LOADED_ERROR_MESSAGE = 'В базе уже есть данные.'
 
@@ -27,4 +28,6 @@ class Command(BaseCommand):
         except Exception:
             print('Что-то пошло не так!')
         else:
+            # bulk_create не отправляет сигналы, версию кэша меняем сами
+            bump_version(Ingredient)
             print('Загрузка окончена.')
@@ -1,5 +1,6 @@
 from django.core.management import BaseCommand
 from recipes.models import Tag
+from recipes.versions import bump_version
 
 
 class Command(BaseCommand):
@@ -21,4 +22,6 @@ class Command(BaseCommand):
         except Exception:
             print('Что-то пошло не так!')
         else:
+            # bulk_create не отправляет сигналы, версию кэша меняем сами
+            bump_version(Tag)
             print('Создание тегов окончено.')
@@ -0,0 +1,50 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from recipes.models import ShoppingCartIngredient
+
+
+class Command(BaseCommand):
+    help = 'Пересборка и проверка сводных списков покупок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сверить списки покупок с корзинами.'
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            nargs='+',
+            dest='user_ids',
+            help='id пользователей, по умолчанию все.'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids']
+        if not options['verify']:
+            with transaction.atomic():
+                ShoppingCartIngredient.objects.rebuild(user_ids)
+            print('Списки покупок пересобраны.')
+            return
+        expected = ShoppingCartIngredient.objects.calculate(user_ids)
+        queryset = ShoppingCartIngredient.objects.all()
+        if user_ids is not None:
+            queryset = queryset.filter(user_id__in=user_ids)
+        actual = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in queryset.values_list(
+                'user_id', 'ingredient_id', 'amount'
+            )
+        }
+        mismatches = 0
+        for key in sorted(expected.keys() | actual.keys()):
+            if expected.get(key, 0) != actual.get(key, 0):
+                mismatches += 1
+                user_id, ingredient_id = key
+                print(f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                      f'ожидалось {expected.get(key, 0)}, '
+                      f'в списке {actual.get(key, 0)}')
+        if mismatches:
+            raise CommandError(f'Расхождений: {mismatches}')
+        print('Расхождений нет.')
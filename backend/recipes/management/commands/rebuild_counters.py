@@ -0,0 +1,63 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import models, transaction
+from django.db.models import Count
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart, count_subquery
+from users.models import AuthorStats
+
+RECIPE_COUNTERS = (
+    (FavoriteRecipe, 'favorites_count'),
+    (ShoppingCart, 'cart_count'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Сверка и пересчёт счётчиков избранного, корзин и рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только вывести расхождения.'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.annotate(**{
+            f'actual_{field}': count_subquery(model, 'recipe')
+            for model, field in RECIPE_COUNTERS
+        })
+        mismatches = 0
+        for model, field in RECIPE_COUNTERS:
+            for recipe_id, stored, actual in recipes.exclude(**{
+                field: models.F(f'actual_{field}')
+            }).values_list('id', field, f'actual_{field}'):
+                mismatches += 1
+                print(f'Рецепт {recipe_id}, {field}: '
+                      f'ожидалось {actual}, записано {stored}')
+        expected = dict(Recipe.objects.values('author').order_by().annotate(
+            total=Count('id')
+        ).values_list('author', 'total'))
+        actual = dict(AuthorStats.objects.values_list(
+            'author_id', 'recipes_count'
+        ))
+        for author_id in sorted(expected.keys() | actual.keys()):
+            if expected.get(author_id, 0) != actual.get(author_id, 0):
+                mismatches += 1
+                print(f'Автор {author_id}: ожидалось '
+                      f'{expected.get(author_id, 0)} рецептов, '
+                      f'записано {actual.get(author_id, 0)}')
+        if options['verify']:
+            if mismatches:
+                raise CommandError(f'Расхождений: {mismatches}')
+            print('Расхождений нет.')
+            return
+        with transaction.atomic():
+            Recipe.objects.update(**{
+                field: count_subquery(model, 'recipe')
+                for model, field in RECIPE_COUNTERS
+            })
+            AuthorStats.objects.all().delete()
+            AuthorStats.objects.bulk_create(
+                AuthorStats(author_id=author_id, recipes_count=total)
+                for author_id, total in expected.items()
+            )
+        print(f'Счётчики пересчитаны, исправлено расхождений: {mismatches}.')
@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from recipes.models import IngredientRecipeIndex
+
+
+class Command(BaseCommand):
+    help = ('Пересборка обратного индекса ингредиент -> рецепты после '
+            'правок ингредиентов рецептов в обход ORM.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            IngredientRecipeIndex.objects.rebuild()
+        print('Индекс рецептов по ингредиентам пересобран.')
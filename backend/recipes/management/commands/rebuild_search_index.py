@@ -0,0 +1,14 @@
+from api.search import rebuild_recipe_search
+from django.core.management import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = ('Пересборка полнотекстового индекса рецептов SQLite после '
+            'загрузки рецептов в обход сигналов. На PostgreSQL индекс '
+            'обновляется сам.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_recipe_search()
+        print('Поисковый индекс рецептов пересобран.')
@@ -0,0 +1,10 @@
+from django.core.management import BaseCommand
+from recipes.popularity import update_popularity
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт популярности рецептов для сортировки ordering=popular.'
+
+    def handle(self, *args, **options):
+        updated = update_popularity()
+        print(f'Популярность пересчитана, изменено рецептов: {updated}.')
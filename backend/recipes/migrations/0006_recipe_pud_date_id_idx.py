@@ -0,0 +1,17 @@
+# Generated by Django 2.2.27 on 2026-10-18 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['pud_date', 'id'], name='recipe_pud_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.27 on 2026-10-18 19:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_pud_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pud_date'], name='recipe_author_pud_date_idx'),
+        ),
+    ]
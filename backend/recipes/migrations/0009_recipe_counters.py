@@ -0,0 +1,38 @@
+# Generated by Django 2.2.27 on 2026-10-18 19:56
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    for model_name, field in (('FavoriteRecipe', 'favorites_count'),
+                              ('ShoppingCart', 'cart_count')):
+        model = apps.get_model('recipes', model_name)
+        total = model.objects.filter(recipe=OuterRef('pk')).order_by(
+        ).values('recipe').annotate(total=Count('id')).values('total')
+        Recipe.objects.update(**{field: Coalesce(
+            Subquery(total, output_field=models.PositiveIntegerField()), 0
+        )})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipeimagevariant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='cart_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='В корзинах'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='В избранном'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 2.2.27 on 2026-10-18 20:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+FILL_SQL = """
+    INSERT INTO recipes_ingredientrecipeindex (ingredient_id, recipe_id, size)
+    SELECT item.ingredient_id, item.recipe_id, sizes.size
+    FROM recipes_ingredientinrecipe item
+    JOIN (
+        SELECT recipe_id, COUNT(*) AS size
+        FROM recipes_ingredientinrecipe GROUP BY recipe_id
+    ) sizes ON sizes.recipe_id = item.recipe_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientRecipeIndex',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.PositiveSmallIntegerField(verbose_name='Число ингредиентов рецепта')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_index', to='recipes.Ingredient', verbose_name='Ингредиент')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingredient_index', to='recipes.Recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Индекс рецептов по ингредиенту',
+                'verbose_name_plural': 'Индекс рецептов по ингредиентам',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='ingredientrecipeindex',
+            constraint=models.UniqueConstraint(fields=('ingredient', 'recipe'), name='unique_ingredient_recipe_index'),
+        ),
+        migrations.RunSQL(FILL_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,60 @@
+from django.db import migrations
+from recipes.stemmer import stem_words
+
+PG_CREATE_INDEX = (
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_search '
+    'ON recipes_recipe USING gin (('
+    "setweight(to_tsvector('russian'::regconfig, COALESCE(name, '')), 'A')"
+    " || setweight(to_tsvector('russian'::regconfig, COALESCE(text, '')), "
+    "'B')));"
+)
+PG_DROP_INDEX = 'DROP INDEX IF EXISTS recipes_recipe_search;'
+SQLITE_CREATE_TABLE = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts USING fts5('
+    "name, text, tokenize = 'unicode61 remove_diacritics 0');"
+)
+# Название весит больше описания, как веса A и B на PostgreSQL
+SQLITE_SET_RANK = (
+    'INSERT INTO recipes_recipe_fts (recipes_recipe_fts, rank) '
+    "VALUES ('rank', 'bm25(10.0, 1.0)');"
+)
+SQLITE_DROP_TABLE = 'DROP TABLE IF EXISTS recipes_recipe_fts;'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(PG_CREATE_INDEX)
+    elif vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE_TABLE)
+        schema_editor.execute(SQLITE_SET_RANK)
+        Recipe = apps.get_model('recipes', 'Recipe')
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO recipes_recipe_fts (rowid, name, text) '
+                'VALUES (%s, %s, %s)',
+                [(recipe_id, ' '.join(stem_words(name)),
+                  ' '.join(stem_words(text)))
+                 for recipe_id, name, text in Recipe.objects.values_list(
+                     'id', 'name', 'text'
+                 )]
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(PG_DROP_INDEX)
+    elif vendor == 'sqlite':
+        schema_editor.execute(SQLITE_DROP_TABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_ingredientrecipeindex'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
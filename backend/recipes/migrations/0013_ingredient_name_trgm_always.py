@@ -0,0 +1,25 @@
+from django.db import migrations
+
+PG_CREATE_INDEX = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm;'
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_trgm '
+    'ON recipes_ingredient USING gin ((UPPER(name::text)) gin_trgm_ops);'
+)
+
+
+def create_trigram_index(apps, schema_editor):
+    """Индекс для баз, где 0004 прошла с выключенной
+    INGREDIENT_SEARCH_TRIGRAM"""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(PG_CREATE_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, migrations.RunPython.noop),
+    ]
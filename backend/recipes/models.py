@@ -1,8 +1,16 @@
+from contextlib import contextmanager
+from threading import local
+
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models, router
+from django.db.models import (Count, ExpressionWrapper, F, OuterRef, Subquery,
+                              Sum, Value)
+from django.db.models.functions import Cast, Coalesce, Greatest
 
 User = get_user_model()
+# Отложено ли обновление обратного индекса ингредиентов в этом потоке
+index_state = local()
 
 
 class Tag(models.Model):
@@ -93,15 +101,142 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+    )
+    cart_count = models.PositiveIntegerField(
+        verbose_name='В корзинах',
+        default=0,
+    )
+    popularity = models.FloatField(
+        verbose_name='Популярность',
+        default=0,
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pud_date',)
+        indexes = [
+            models.Index(
+                fields=['pud_date', 'id'],
+                name='recipe_pud_date_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-pud_date'],
+                name='recipe_author_pud_date_idx'
+            ),
+            models.Index(
+                fields=['-popularity', '-id'],
+                name='recipe_popularity_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        recipe = super().from_db(db, field_names, values)
+        recipe.saved_search_text = recipe.search_text
+        return recipe
+
+    @property
+    def search_text(self):
+        """Название и описание, по которым ищется рецепт"""
+        return self.__dict__.get('name'), self.__dict__.get('text')
+
+
+class RecipeImageVariant(models.Model):
+    """Уменьшенная копия изображения рецепта"""
+    WEBP = 'webp'
+    JPEG = 'jpeg'
+    FORMATS = (
+        (WEBP, 'WebP'),
+        (JPEG, 'JPEG'),
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='image_variants',
+        verbose_name='Рецепт',
+    )
+    width = models.PositiveSmallIntegerField(
+        verbose_name='Ширина',
+    )
+    format = models.CharField(
+        verbose_name='Формат',
+        max_length=4,
+        choices=FORMATS,
+    )
+    image = models.ImageField(
+        verbose_name='Изображение',
+        upload_to='image_recipes/variants/',
+    )
+
+    class Meta:
+        verbose_name = 'Копия изображения рецепта'
+        verbose_name_plural = 'Копии изображений рецептов'
+        ordering = ('width',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'width', 'format'],
+                name='unique_image_variant'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} - {self.width}px {self.format}'
+
+
+class IngredientInRecipeQuerySet(models.QuerySet):
+    """Массовые записи ингредиентов рецептов обновляют обратный индекс
+    затронутых рецептов. Каскадное удаление вместе с рецептом индекс
+    не трогает: его строки удаляются тем же каскадом."""
+    index_fields = {'recipe', 'recipe_id', 'ingredient', 'ingredient_id'}
+
+    def refresh_index(self, recipe_ids, deleted=True):
+        IngredientRecipeIndex.objects.refresh_written(recipe_ids, deleted)
+
+    def written_recipe_ids(self):
+        if getattr(index_state, 'deferred', False):
+            return set()
+        return set(self.values_list('recipe_id', flat=True).distinct())
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        self.refresh_index({obj.recipe_id for obj in objs}, deleted=False)
+        return objs
+
+    def update(self, **kwargs):
+        # через update пишет и bulk_update
+        if (self.index_fields.isdisjoint(kwargs)
+                or getattr(index_state, 'deferred', False)):
+            return super().update(**kwargs)
+        recipe_ids = dict(self.values_list('pk', 'recipe_id'))
+        rows = super().update(**kwargs)
+        moved = set()
+        if 'recipe' in kwargs or 'recipe_id' in kwargs:
+            moved = set(self.model.objects.filter(
+                pk__in=list(recipe_ids)
+            ).values_list('recipe_id', flat=True))
+        self.refresh_index(set(recipe_ids.values()) | moved)
+        return rows
+
+    def delete(self):
+        recipe_ids = self.written_recipe_ids()
+        result = super().delete()
+        self.refresh_index(recipe_ids)
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
 
 class IngredientInRecipe(models.Model):
     """Промежуточная модель ингредиента и количества в рецепте"""
@@ -125,6 +260,8 @@ class IngredientInRecipe(models.Model):
         ]
     )
 
+    objects = IngredientInRecipeQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Ингредиент для рецепта'
         verbose_name_plural = 'Ингредиенты для рецепта'
@@ -139,6 +276,16 @@ class IngredientInRecipe(models.Model):
     def __str__(self):
         return f'{self.ingredient.name} - {self.amount}'
 
+    def save(self, *args, **kwargs):
+        # запись по одной строке: админка, shell
+        super().save(*args, **kwargs)
+        IngredientRecipeIndex.objects.refresh_written([self.recipe_id])
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        IngredientRecipeIndex.objects.refresh_written([self.recipe_id])
+        return result
+
 
 class FavoriteRecipe(models.Model):
     """Модель избранного рецепта"""
@@ -154,6 +301,10 @@ class FavoriteRecipe(models.Model):
         related_name='favorites',
         verbose_name='Рецепт',
     )
+    created_at = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True,
+    )
 
     class Meta:
         verbose_name = 'Избранный рецепт'
@@ -184,6 +335,10 @@ class ShoppingCart(models.Model):
         related_name='cart',
         verbose_name='Рецепт',
     )
+    created_at = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True,
+    )
 
     class Meta:
         verbose_name = 'Корзина'
@@ -195,3 +350,262 @@ class ShoppingCart(models.Model):
                 name='unique_cart_user'
             )
         ]
+
+
+class ShoppingCartIngredientManager(models.Manager):
+    """Поддержка сводного списка покупок при изменении корзин"""
+
+    def _recipes_amount(self, recipe_ids):
+        return Subquery(
+            IngredientInRecipe.objects.filter(
+                recipe_id__in=recipe_ids, ingredient=OuterRef('ingredient')
+            ).order_by().values('ingredient').annotate(
+                total=Sum('amount')
+            ).values('total'),
+            output_field=models.PositiveIntegerField()
+        )
+
+    def add_recipe(self, recipe, user_ids):
+        """Добавляет ингредиенты рецепта в списки покупок пользователей"""
+        self.add_recipes([recipe.pk], user_ids)
+
+    def remove_recipe(self, recipe, user_ids):
+        """Вычитает ингредиенты рецепта из списков покупок пользователей"""
+        self.remove_recipes([recipe.pk], user_ids)
+
+    def add_recipes(self, recipe_ids, user_ids):
+        """Добавляет ингредиенты рецептов в списки покупок пользователей"""
+        if not user_ids or not recipe_ids:
+            return
+        ingredient_ids = list(IngredientInRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('ingredient_id', flat=True).distinct())
+        if not ingredient_ids:
+            return
+        self.bulk_create([
+            self.model(user_id=user_id, ingredient_id=ingredient_id, amount=0)
+            for user_id in user_ids for ingredient_id in ingredient_ids
+        ], ignore_conflicts=True)
+        self.filter(
+            user_id__in=user_ids, ingredient_id__in=ingredient_ids
+        ).update(amount=F('amount') + self._recipes_amount(recipe_ids))
+
+    def remove_recipes(self, recipe_ids, user_ids):
+        """Вычитает ингредиенты рецептов из списков покупок пользователей"""
+        if not user_ids or not recipe_ids:
+            return
+        queryset = self.filter(
+            user_id__in=user_ids,
+            ingredient__ingredients_amount__recipe_id__in=recipe_ids
+        )
+        queryset.update(amount=Greatest(
+            F('amount') - self._recipes_amount(recipe_ids), Value(0)
+        ))
+        queryset.filter(amount=0).delete()
+
+    def calculate(self, user_ids=None):
+        """Суммы ингредиентов по корзинам, посчитанные с нуля"""
+        queryset = IngredientInRecipe.objects.filter(
+            recipe__cart__isnull=False
+        )
+        if user_ids is not None:
+            queryset = queryset.filter(recipe__cart__user_id__in=user_ids)
+        return {
+            (item['recipe__cart__user'], item['ingredient']): item['total']
+            for item in queryset.values(
+                'recipe__cart__user', 'ingredient'
+            ).order_by().annotate(total=Sum('amount'))
+        }
+
+    def rebuild(self, user_ids=None):
+        """Пересобирает списки покупок из корзин"""
+        queryset = self.all()
+        if user_ids is not None:
+            queryset = queryset.filter(user_id__in=user_ids)
+        queryset.delete()
+        self.bulk_create(
+            self.model(user_id=user_id, ingredient_id=ingredient_id,
+                       amount=amount)
+            for (user_id, ingredient_id), amount
+            in self.calculate(user_ids).items()
+        )
+
+
+class ShoppingCartIngredient(models.Model):
+    """Сводное количество ингредиента в корзине пользователя"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='cart_ingredients',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='cart_ingredients',
+        verbose_name='Ингредиент',
+    )
+    amount = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество',
+    )
+
+    objects = ShoppingCartIngredientManager()
+
+    class Meta:
+        verbose_name = 'Ингредиент в корзине'
+        verbose_name_plural = 'Ингредиенты в корзинах'
+        ordering = ('id',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_cart_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.ingredient} {self.amount}'
+
+
+def count_subquery(model, field):
+    """Число строк model, ссылающихся полем field на текущую строку"""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total'),
+        output_field=models.PositiveIntegerField()
+    ), 0)
+
+
+class IngredientRecipeIndexManager(models.Manager):
+    """Поддержка обратного индекса ингредиент -> рецепты"""
+    refresh_batch_size = 500
+
+    def refresh(self, recipe_ids, deleted=True):
+        """Приводит строки индекса рецептов recipe_ids к их ингредиентам:
+        вставка новых строк и новые размеры одним запросом, удаление
+        строк удалённых ингредиентов (deleted) — вторым. Строки других
+        рецептов не затрагиваются."""
+        recipe_ids = list(recipe_ids)
+        connection = connections[router.db_for_write(self.model)]
+        for start in range(0, len(recipe_ids), self.refresh_batch_size):
+            batch = recipe_ids[start:start + self.refresh_batch_size]
+            params = ', '.join(['%s'] * len(batch))
+            with connection.cursor() as cursor:
+                if deleted:
+                    cursor.execute(DELETE_STALE_INDEX_SQL.format(
+                        index=self.model._meta.db_table,
+                        source=IngredientInRecipe._meta.db_table,
+                        recipe_ids=params,
+                    ), batch)
+                cursor.execute(REFRESH_INDEX_SQL.format(
+                    index=self.model._meta.db_table,
+                    source=IngredientInRecipe._meta.db_table,
+                    recipe_ids=params,
+                ), batch * 2)
+
+    @contextmanager
+    def deferred(self, recipe_ids=()):
+        """Записи ингредиентов рецептов в блоке не обновляют индекс
+        по одной: в конце блока один раз обновляются рецепты
+        recipe_ids."""
+        previous = getattr(index_state, 'deferred', False)
+        index_state.deferred = True
+        try:
+            yield
+        finally:
+            index_state.deferred = previous
+        self.refresh(recipe_ids)
+
+    def refresh_written(self, recipe_ids, deleted=True):
+        """Обновление после записи ингредиентов, если оно не отложено"""
+        if not getattr(index_state, 'deferred', False):
+            self.refresh(recipe_ids, deleted)
+
+    def coverage(self, ingredient_ids, min_coverage=0):
+        """Рецепты, в которых есть хотя бы один из ингредиентов: число
+        найденных ингредиентов (matched) и их доля (coverage), от
+        большей доли к меньшей. Пересечение считается в базе группировкой
+        строк индекса, фильтр по доле и страница — там же."""
+        return self.filter(
+            ingredient_id__in=ingredient_ids
+        ).values('recipe_id', 'size').annotate(
+            matched=Count('ingredient_id')
+        ).annotate(coverage=ExpressionWrapper(
+            Cast('matched', models.FloatField()) / F('size'),
+            output_field=models.FloatField()
+        )).filter(coverage__gte=min_coverage).order_by(
+            '-coverage', '-matched', '-recipe_id'
+        )
+
+    def rebuild(self):
+        """Пересобирает индекс из ингредиентов рецептов одним INSERT"""
+        self.all().delete()
+        with connections[router.db_for_write(self.model)].cursor() as cursor:
+            cursor.execute(REBUILD_INDEX_SQL.format(
+                index=self.model._meta.db_table,
+                source=IngredientInRecipe._meta.db_table,
+            ))
+
+
+REBUILD_INDEX_SQL = """
+    INSERT INTO {index} (ingredient_id, recipe_id, size)
+    SELECT item.ingredient_id, item.recipe_id, sizes.size
+    FROM {source} item
+    JOIN (
+        SELECT recipe_id, COUNT(*) AS size FROM {source} GROUP BY recipe_id
+    ) sizes ON sizes.recipe_id = item.recipe_id
+"""
+REFRESH_INDEX_SQL = """
+    INSERT INTO {index} (ingredient_id, recipe_id, size)
+    SELECT item.ingredient_id, item.recipe_id, sizes.size
+    FROM {source} item
+    JOIN (
+        SELECT recipe_id, COUNT(*) AS size FROM {source}
+        WHERE recipe_id IN ({recipe_ids}) GROUP BY recipe_id
+    ) sizes ON sizes.recipe_id = item.recipe_id
+    WHERE item.recipe_id IN ({recipe_ids})
+    ON CONFLICT (ingredient_id, recipe_id) DO UPDATE SET size = excluded.size
+"""
+DELETE_STALE_INDEX_SQL = """
+    DELETE FROM {index} WHERE recipe_id IN ({recipe_ids}) AND NOT EXISTS (
+        SELECT 1 FROM {source} item
+        WHERE item.recipe_id = {index}.recipe_id
+        AND item.ingredient_id = {index}.ingredient_id
+    )
+"""
+
+
+class IngredientRecipeIndex(models.Model):
+    """Строка обратного индекса: рецепт с ингредиентом и число
+    ингредиентов рецепта"""
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='recipe_index',
+        verbose_name='Ингредиент',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='ingredient_index',
+        verbose_name='Рецепт',
+    )
+    size = models.PositiveSmallIntegerField(
+        verbose_name='Число ингредиентов рецепта',
+    )
+
+    objects = IngredientRecipeIndexManager()
+
+    class Meta:
+        verbose_name = 'Индекс рецептов по ингредиенту'
+        verbose_name_plural = 'Индекс рецептов по ингредиентам'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['ingredient', 'recipe'],
+                name='unique_ingredient_recipe_index'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient_id} - {self.recipe_id}'
@@ -0,0 +1,61 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import FavoriteRecipe, Recipe, ShoppingCart
+
+ACTIVITY_WEIGHTS = (
+    (FavoriteRecipe, 1.0),
+    (ShoppingCart, 2.0),
+)
+UPDATE_BATCH_SIZE = 500
+
+
+def calculate_popularity(now=None):
+    """Популярность рецептов: добавления в избранное и корзину за
+    RECIPE_POPULARITY_WINDOW_DAYS дней, вес которых убывает вдвое
+    за RECIPE_POPULARITY_HALF_LIFE_DAYS. События группируются по дням,
+    так что объём выборки не зависит от числа добавлений."""
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    since = now - timedelta(days=settings.RECIPE_POPULARITY_WINDOW_DAYS)
+    half_life = settings.RECIPE_POPULARITY_HALF_LIFE_DAYS
+    scores = defaultdict(float)
+    for model, weight in ACTIVITY_WEIGHTS:
+        activity = model.objects.filter(created_at__gte=since).annotate(
+            day=TruncDate('created_at')
+        ).values('recipe', 'day').order_by().annotate(total=Count('id'))
+        for item in activity.iterator():
+            age = (today - item['day']).days
+            scores[item['recipe']] += (
+                weight * item['total'] * 0.5 ** (age / half_life)
+            )
+    return scores
+
+
+def update_popularity(now=None):
+    """Записывает популярность; меняются только изменившиеся строки"""
+    scores = calculate_popularity(now)
+    current = dict(
+        Recipe.objects.filter(popularity__gt=0).values_list('id', 'popularity')
+    )
+    changed = [
+        Recipe(id=recipe_id, popularity=round(score, 6))
+        for recipe_id, score in scores.items()
+        if round(score, 6) != current.get(recipe_id)
+    ]
+    stale = list(current.keys() - scores.keys())
+    with transaction.atomic():
+        for start in range(0, len(stale), UPDATE_BATCH_SIZE):
+            Recipe.objects.filter(
+                id__in=stale[start:start + UPDATE_BATCH_SIZE]
+            ).update(popularity=0)
+        Recipe.objects.bulk_update(
+            changed, ['popularity'], batch_size=UPDATE_BATCH_SIZE
+        )
+    return len(changed) + len(stale)
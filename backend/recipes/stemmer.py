@@ -0,0 +1,81 @@
+"""Стеммер Портера (Snowball) для русского языка.
+
+Нужен полнотекстовому поиску на SQLite: FTS5 не знает русской морфологии,
+поэтому в индекс и в запрос попадают основы слов. На PostgreSQL морфологию
+даёт конфигурация russian.
+"""
+import re
+from functools import lru_cache
+
+PERFECTIVE_GERUND = re.compile(
+    r'(?:ив|ивши|ившись|ыв|ывши|ывшись|(?<=[ая])(?:в|вши|вшись))$'
+)
+REFLEXIVE = re.compile(r'(?:ся|сь)$')
+ADJECTIVE = re.compile(
+    r'(?:ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых'
+    r'|ую|юю|ая|яя|ою|ею)$'
+)
+PARTICIPLE = re.compile(r'(?:ивш|ывш|ующ|(?<=[ая])(?:ем|нн|вш|ющ|щ))$')
+VERB = re.compile(
+    r'(?:ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло'
+    r'|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю'
+    r'|(?<=[ая])(?:ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно))$'
+)
+NOUN = re.compile(
+    r'(?:а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием'
+    r'|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+SUPERLATIVE = re.compile(r'(?:ейше|ейш)$')
+DERIVATIONAL = re.compile(r'[^аеиоуыэюя][аеиоуыэюя].*ость?$')
+RV = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+WORD = re.compile(r'\w+')
+STOP_WORDS = frozenset((
+    'а', 'без', 'в', 'во', 'да', 'для', 'до', 'же', 'за', 'и', 'из', 'или',
+    'к', 'ко', 'на', 'над', 'не', 'ни', 'но', 'о', 'об', 'от', 'по', 'под',
+    'при', 'про', 'с', 'со', 'у', 'через',
+))
+CYRILLIC = re.compile(r'[а-я]')
+
+
+def strip(pattern, word):
+    return pattern.sub('', word, count=1)
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    """Основа слова; слова без кириллицы возвращаются как есть"""
+    word = word.lower().replace('ё', 'е')
+    match = RV.match(word)
+    if not CYRILLIC.search(word) or match is None:
+        return word
+    prefix, rv = match.groups()
+    stripped = strip(PERFECTIVE_GERUND, rv)
+    if stripped != rv:
+        rv = stripped
+    else:
+        rv = strip(REFLEXIVE, rv)
+        stripped = strip(ADJECTIVE, rv)
+        if stripped != rv:
+            rv = strip(PARTICIPLE, stripped)
+        else:
+            stripped = strip(VERB, rv)
+            rv = stripped if stripped != rv else strip(NOUN, rv)
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    if DERIVATIONAL.search(rv):
+        rv = re.sub(r'ость?$', '', rv)
+    if rv.endswith('ь'):
+        rv = rv[:-1]
+    else:
+        rv = strip(SUPERLATIVE, rv)
+        if rv.endswith('нн'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def stem_words(text):
+    """Основы слов текста без предлогов и союзов"""
+    return [
+        stem(word) for word in WORD.findall((text or '').lower())
+        if word not in STOP_WORDS
+    ]
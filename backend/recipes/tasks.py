@@ -0,0 +1,9 @@
+from taskqueue.queue import task
+
+from .images import create_image_variants
+
+
+@task
+def process_recipe_image(recipe_id):
+    """Копии изображения рецепта в нужных размерах и форматах"""
+    create_image_variants(recipe_id)
@@ -0,0 +1,30 @@
+"""Версии справочников в кэше.
+
+Версия модели меняется при любом изменении её данных: по ней строятся
+ключи кэша и ETag ответов, поэтому старые записи просто перестают
+использоваться. Кэш должен быть общим для процессов сервера.
+"""
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'reference:version:{}'
+CHANGED_KEY = 'reference:changed:{}'
+
+
+def get_version(model):
+    """Текущая версия данных модели, меняется при любом изменении"""
+    key = VERSION_KEY.format(model._meta.label_lower)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(model):
+    label = model._meta.label_lower
+    cache.set(VERSION_KEY.format(label), uuid4().hex, None)
+    cache.set(CHANGED_KEY.format(label), True,
+              settings.DB_REPLICA_PIN_SECONDS)
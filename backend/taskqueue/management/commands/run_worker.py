@@ -0,0 +1,80 @@
+import logging
+import multiprocessing
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from taskqueue.queue import claim_tasks, release_stale_tasks
+from taskqueue.worker import execute_task, init_process
+
+logger = logging.getLogger('taskqueue')
+
+HOUSEKEEPING_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = 'Обработчик очереди задач с пулом процессов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=settings.TASKS_WORKER_PROCESSES,
+            help='Число процессов пула.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=settings.TASKS_POLL_INTERVAL,
+            help='Пауза между опросами пустой очереди, сек.'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить готовые задачи и завершиться.'
+        )
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        if processes < 1:
+            raise CommandError('Нужен хотя бы один процесс.')
+        self.stopping = False
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        self.stdout.write(f'Обработчик запущен, процессов: {processes}')
+        pool = ProcessPoolExecutor(
+            processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_process
+        )
+        in_flight = set()
+        housekeeping_at = 0
+        with pool:
+            while not self.stopping:
+                if time.monotonic() >= housekeeping_at:
+                    release_stale_tasks()
+                    housekeeping_at = time.monotonic() + HOUSEKEEPING_INTERVAL
+                in_flight.update(
+                    pool.submit(execute_task, task_id)
+                    for task_id in claim_tasks(processes - len(in_flight))
+                )
+                if not in_flight:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+                    continue
+                done, in_flight = wait(
+                    in_flight, timeout=options['interval'],
+                    return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    if future.exception() is not None:
+                        logger.error('Сбой обработчика задачи',
+                                     exc_info=future.exception())
+            wait(in_flight)
+        self.stdout.write('Обработчик остановлен.')
@@ -0,0 +1,116 @@
+import json
+import logging
+import traceback
+from datetime import timedelta
+from functools import update_wrapper
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+
+class TaskFunction:
+    """Функция, которую можно поставить в очередь через delay()"""
+
+    def __init__(self, func, max_attempts):
+        update_wrapper(self, func)
+        self.func = func
+        self.name = f'{func.__module__}.{func.__name__}'
+        self.max_attempts = max_attempts
+
+    def __call__(self, **kwargs):
+        return self.func(**kwargs)
+
+    def delay(self, **kwargs):
+        """Записывает задачу в очередь в текущей транзакции, так что
+        обработчик увидит её только после фиксации. В режиме TASKS_EAGER
+        задача выполняется сразу."""
+        task = Task.objects.create(
+            name=self.name,
+            payload=json.dumps(kwargs),
+            max_attempts=self.max_attempts,
+            run_at=timezone.now(),
+        )
+        if settings.TASKS_EAGER:
+            task.status = Task.RUNNING
+            task.attempts = 1
+            run_task(task, raise_errors=True)
+        return task
+
+
+def task(func=None, *, max_attempts=None):
+    """Декоратор задачи. Аргументы передаются только по имени
+    и должны сериализоваться в JSON."""
+    def decorator(func):
+        return TaskFunction(
+            func, max_attempts or settings.TASKS_MAX_ATTEMPTS
+        )
+    return decorator(func) if func is not None else decorator
+
+
+def get_retry_delay(attempts):
+    return timedelta(
+        seconds=settings.TASKS_RETRY_DELAY * 2 ** (attempts - 1)
+    )
+
+
+def run_task(task, raise_errors=False):
+    """Выполняет взятую задачу. При ошибке задача возвращается
+    в очередь с экспоненциальной задержкой, пока не кончатся попытки."""
+    try:
+        result = import_string(task.name)(**task.kwargs)
+    except Exception:
+        task.error = traceback.format_exc()
+        if task.attempts >= task.max_attempts:
+            task.status = Task.FAILED
+        else:
+            task.status = Task.PENDING
+            task.run_at = timezone.now() + get_retry_delay(task.attempts)
+        task.save(update_fields=('status', 'run_at', 'error', 'attempts'))
+        if raise_errors:
+            raise
+        logger.exception('Задача %s (%s) завершилась с ошибкой',
+                         task.id, task.name)
+        return
+    task.status = Task.DONE
+    task.result = json.dumps(result) if result is not None else ''
+    task.save(update_fields=('status', 'result', 'attempts'))
+
+
+def claim_tasks(limit):
+    """Берёт в работу до limit готовых к запуску задач. Задачу
+    получает тот обработчик, чей UPDATE её изменил."""
+    now = timezone.now()
+    task_ids = Task.objects.filter(
+        status=Task.PENDING, run_at__lte=now
+    ).order_by('run_at', 'id').values_list('id', flat=True)[:limit]
+    return [
+        task_id for task_id in list(task_ids)
+        if Task.objects.filter(pk=task_id, status=Task.PENDING).update(
+            status=Task.RUNNING, locked_at=now, attempts=F('attempts') + 1
+        )
+    ]
+
+
+def release_stale_tasks():
+    """Возвращает в очередь задачи, обработчик которых не ответил
+    за TASKS_LOCK_TIMEOUT, и удаляет завершённые и упавшие задачи
+    старше TASKS_KEEP_DAYS."""
+    now = timezone.now()
+    stale = Task.objects.filter(
+        status=Task.RUNNING,
+        locked_at__lt=now - timedelta(seconds=settings.TASKS_LOCK_TIMEOUT)
+    )
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Task.FAILED, error='Превышено время выполнения.'
+    )
+    stale.update(status=Task.PENDING, run_at=now)
+    Task.objects.filter(
+        status__in=(Task.DONE, Task.FAILED),
+        run_at__lt=now - timedelta(days=settings.TASKS_KEEP_DAYS)
+    ).delete()
@@ -0,0 +1,21 @@
+"""Функции процессов пула обработчика. Процессы запускаются через spawn,
+поэтому модуль не должен импортировать модели до django.setup()."""
+import signal
+
+import django
+from django.db import close_old_connections
+
+
+def init_process():
+    """Ctrl+C обрабатывает только основной процесс,
+    он дожидается текущих задач."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    django.setup()
+
+
+def execute_task(task_id):
+    from .models import Task
+    from .queue import run_task
+
+    close_old_connections()
+    run_task(Task.objects.get(pk=task_id))
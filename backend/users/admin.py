@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
 
-from .models import Follow
+from .models import AuthorStats, Follow
 
 
 class CustomUserAdmin(UserAdmin):
@@ -17,5 +17,11 @@ class FollowAdmin(admin.ModelAdmin):
     list_filter = ('user', 'author')
 
 
+@admin.register(AuthorStats)
+class AuthorStatsAdmin(admin.ModelAdmin):
+    list_display = ('author', 'recipes_count')
+    readonly_fields = ('recipes_count',)
+
+
 admin.site.unregister(User)
 admin.site.register(User, CustomUserAdmin)
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.27 on 2026-10-18 19:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_author_stats(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    AuthorStats = apps.get_model('users', 'AuthorStats')
+    AuthorStats.objects.bulk_create(
+        AuthorStats(author_id=item['author'], recipes_count=item['total'])
+        for item in Recipe.objects.values('author').order_by().annotate(
+            total=Count('id')
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('users', '0001_initial'),
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('recipes_count', models.PositiveIntegerField(default=0, verbose_name='Рецептов')),
+            ],
+            options={
+                'verbose_name': 'Счётчики автора',
+                'verbose_name_plural': 'Счётчики авторов',
+            },
+        ),
+        migrations.RunPython(fill_author_stats, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
 
 User = get_user_model()
 
@@ -32,3 +34,40 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'Подписчик {self.user} - автор {self.author}'
+
+
+class AuthorStatsManager(models.Manager):
+    """Изменение счётчиков автора без чтения строки"""
+
+    def change_recipes_count(self, author_id, delta):
+        if delta > 0:
+            self.bulk_create(
+                [self.model(author_id=author_id)], ignore_conflicts=True
+            )
+        self.filter(author_id=author_id).update(
+            recipes_count=Greatest(F('recipes_count') + delta, Value(0))
+        )
+
+
+class AuthorStats(models.Model):
+    """Счётчики автора, которые поддерживаются при записи"""
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Автор'
+    )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Рецептов',
+        default=0,
+    )
+
+    objects = AuthorStatsManager()
+
+    class Meta:
+        verbose_name = 'Счётчики автора'
+        verbose_name_plural = 'Счётчики авторов'
+
+    def __str__(self):
+        return f'{self.author}: рецептов {self.recipes_count}'